@@ -1,79 +1,142 @@
 import subprocess
 import sys
 import os
-
-def convert_intel_hex_to_vivado_mem(file_path):
-    memsize = 32768
-    hex_strings = []
-
-    # Fill with zeros
-    for i in range(memsize):
-        hex_strings.append('00000000')
-
-    # Base address
-    base_addr = 0x0
-
-    with open(file_path, 'r') as file:
-        for line in file:
-            if line.startswith(':'):
-                hex_data = line[1:].strip()
-
-                record_type = int(hex_data[6:8], 16)
-                if record_type != 0:
-                    if record_type == 2:
-                        #  Segment address record
-                        base_addr = int(hex_data[8:12], 16) << 4
-                    else:
-                        # Otherwise process data records
-                        continue
-
-                data_size = int(hex_data[0:2], 16)
-                record_addr = int(hex_data[2:6], 16)
-
-                # Loop through each byte in the record
-                for i in range(data_size):
-                    # Get the hex for that byte
-                    data = hex_data[8 + i*2:8 + i*2 + 2]
-
-                    addr = (record_addr + i) + base_addr
-
-                    # Write to the row floor(addr/4) at position (6-2*(addr%4)):(8-2*(addr%4))
-                    hex_strings[addr//4] = hex_strings[addr//4][0:(6-2*(addr%4))] + data + hex_strings[addr//4][(8-2*(addr%4)):]
-
-    return '\n'.join(hex_strings)
+import re
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared memory image tools live with the RTL scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "RTL"))
+from memimage import load_elf, write_images
+
+# Size of the RAM in bytes (RAM_SIZE words in RTL/source/ram.sv)
+MEM_SIZE = 32768 * 4
+
+BUILD_DIR = "build"
+# Objects are stored under the hash of everything that went into them, so
+# they can be shared between programs and survive switching back and forth
+OBJECT_DIR = os.path.join(BUILD_DIR, "objects")
+
+TOOLCHAIN = "wsl -e /opt/riscv/bin/riscv32-unknown-elf-"
+ARCH_FLAGS = "-march=rv32im_zicsr -mabi=ilp32"
+CC = f"{TOOLCHAIN}gcc {ARCH_FLAGS} -fdata-sections -ffunction-sections -c"
+AS = f"{TOOLCHAIN}as {ARCH_FLAGS}"
+LD = f"{TOOLCHAIN}gcc -Wl,--print-memory-usage -Wl,--gc-sections -nostartfiles -T linkerscript.ld"
+
+INCLUDE_RE = re.compile(rb'^\s*#\s*include\s+"([^"]+)"', re.MULTILINE)
+
+def read_bytes(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+# Local headers pulled in by a source file with #include "...", recursively.
+# System headers (<...>) come with the toolchain and aren't tracked.
+def find_includes(path, found=None):
+    if found is None:
+        found = set()
+    for name in INCLUDE_RE.findall(read_bytes(path)):
+        header = os.path.normpath(os.path.join(os.path.dirname(path), name.decode()))
+        if header not in found and os.path.exists(header):
+            found.add(header)
+            find_includes(header, found)
+    return found
+
+def hash_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+    return h.hexdigest()[:32]
+
+# Key for an object: the command that builds it, the source and its headers
+def object_key(tool, src):
+    parts = [tool, read_bytes(src)]
+    for header in sorted(find_includes(src)):
+        parts += [header, read_bytes(header)]
+    return hash_key(*parts)
+
+def compile_object(tool, src, obj):
+    tmp = obj + ".tmp"
+    result = subprocess.run(f"{tool} -o {tmp} {src}", shell=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    # Only a complete object ever gets the final name
+    os.replace(tmp, obj)
+    return True
+
+# Commands whose output is reused while the stamp next to it matches the key
+def is_up_to_date(output, key):
+    stamp = output + ".key"
+    if not os.path.exists(output) or not os.path.exists(stamp):
+        return False
+    with open(stamp, 'r') as file:
+        return file.read() == key
+
+def mark_up_to_date(output, key):
+    with open(output + ".key", 'w') as file:
+        file.write(key)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python compile.py <source_dir>")
-        sys.exit(1)
-
-    src_dir = sys.argv[1]
-    c_files_in_dir = [x for x in os.listdir(src_dir) if x.endswith('.c')]
-    c_files_out = [x + ".o" for x in c_files_in_dir]
-    S_files_in_dir = [x for x in os.listdir(src_dir) if x.endswith('.S')]
-    S_files_out = [x + ".o" for x in S_files_in_dir]
-
-    # Empty the output directory
-    build_files = [x for x in os.listdir("build")]
-    for f in build_files:
-        os.remove(f"build/{f}")
-
-    # Generate object files from C source files
-    for c_in, c_out in zip(c_files_in_dir, c_files_out):
-        subprocess.run(f"wsl -e /opt/riscv/bin/riscv32-unknown-elf-gcc -march=rv32im_zicsr -mabi=ilp32 -fdata-sections -ffunction-sections -c -o build/{c_out} {src_dir}/{c_in}", shell=True)
-
-    # Generate object files from ASM source files
-    for S_in, S_out in zip(S_files_in_dir, S_files_out):
-        subprocess.run(f"wsl -e /opt/riscv/bin/riscv32-unknown-elf-as -march=rv32im_zicsr -mabi=ilp32 -o build/{S_out} {src_dir}/{S_in}", shell=True)
-    
-    # Generate object files from startup files
-    subprocess.run("wsl -e /opt/riscv/bin/riscv32-unknown-elf-as -march=rv32im_zicsr -mabi=ilp32 -o build/startup.o startup.S", shell=True)
-    subprocess.run("wsl -e /opt/riscv/bin/riscv32-unknown-elf-gcc -fdata-sections -ffunction-sections -c -march=rv32im_zicsr -mabi=ilp32 -o build/syscalls.o syscalls.c", shell=True)
-
-    subprocess.run(f"wsl -e /opt/riscv/bin/riscv32-unknown-elf-gcc -Wl,--print-memory-usage -Wl,--gc-sections -nostartfiles -T linkerscript.ld {" ".join(["build/" + x for x in c_files_out])} {" ".join(["build/" + x for x in S_files_out])} build/syscalls.o build/startup.o -o build/program.elf", shell=True)
-    subprocess.run("wsl -e /opt/riscv/bin/riscv32-unknown-elf-objdump -D build/program.elf > build/program.S", shell=True)
-    subprocess.run("wsl -e /opt/riscv/bin/riscv32-unknown-elf-objcopy -O ihex build/program.elf build/program.hex", shell=True)
-
-    mem = convert_intel_hex_to_vivado_mem('build/program.hex')
-    with open('build/raminit.mem', 'w') as file:
-        file.write(mem)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compile a program in a source directory to build/raminit.mem")
+    parser.add_argument("source_dir", help="Directory with the .c and .S files of the program")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Compile this many files in parallel (default: all cores)")
+    parser.add_argument("--clean", action="store_true", help="Empty the build directory first")
+    parser.add_argument("--sim", action="store_true", help="Build for the Verilator simulation: stdout and exit go to its console device")
+    args = parser.parse_args()
+
+    src_dir = args.source_dir
+    c_files = sorted(f"{src_dir}/{x}" for x in os.listdir(src_dir) if x.endswith('.c'))
+    S_files = sorted(f"{src_dir}/{x}" for x in os.listdir(src_dir) if x.endswith('.S'))
+
+    if args.clean and os.path.exists(BUILD_DIR):
+        shutil.rmtree(BUILD_DIR)
+    os.makedirs(OBJECT_DIR, exist_ok=True)
+
+    # SIMULATOR selects the simulation console in syscalls.c. The objects are
+    # keyed on the command, so both builds stay in the object store.
+    cc = f"{CC} -DSIMULATOR" if args.sim else CC
+
+    # Program sources plus the startup files, in link order
+    sources = [(cc, x) for x in c_files] + [(AS, x) for x in S_files] + [(cc, "syscalls.c"), (AS, "startup.S")]
+
+    objects = []
+    dirty = []
+    for tool, src in sources:
+        obj = os.path.join(OBJECT_DIR, f"{os.path.basename(src)}.{object_key(tool, src)}.o").replace("\\", "/")
+        objects.append(obj)
+        if not os.path.exists(obj):
+            dirty.append((tool, src, obj))
+
+    # Only the objects whose inputs changed get rebuilt, in parallel
+    if dirty:
+        print(f"Compiling {len(dirty)} of {len(sources)} files")
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            results = list(pool.map(lambda x: compile_object(*x), dirty))
+        if not all(results):
+            print("Compilation failed")
+            sys.exit(1)
+
+    elf = f"{BUILD_DIR}/program.elf"
+    link_key = hash_key(LD, read_bytes("linkerscript.ld"), *objects)
+    if is_up_to_date(elf, link_key):
+        print("Program is up to date")
+    else:
+        subprocess.run(f"{LD} {' '.join(objects)} -o {elf}", shell=True, check=True)
+        mark_up_to_date(elf, link_key)
+
+    # Listing and image follow the ELF
+    elf_key = hash_key(read_bytes(elf))
+    if not is_up_to_date(f"{BUILD_DIR}/program.S", elf_key):
+        subprocess.run(f"{TOOLCHAIN}objdump -D {elf} > {BUILD_DIR}/program.S", shell=True, check=True)
+        mark_up_to_date(f"{BUILD_DIR}/program.S", elf_key)
+    if not is_up_to_date(f"{BUILD_DIR}/raminit.mem", elf_key):
+        # Every image format from one load of the ELF's segments
+        image = load_elf(elf, MEM_SIZE)
+        write_images(image, [f"{BUILD_DIR}/raminit.mem", f"{BUILD_DIR}/program.hex", f"{BUILD_DIR}/program.bin"])
+        mark_up_to_date(f"{BUILD_DIR}/raminit.mem", elf_key)
@@ -1,3 +1,4 @@
+#include <stddef.h>
 #include <stdint.h>
 
 #include "../include/riscv.h"
@@ -28,11 +29,14 @@ void UART_RXI_Handler(void) __attribute__((interrupt));
 
 void uart_init(void);
 void uart_send(char chr);
+#ifdef SIMULATOR
+int _write(int file, const void *ptr, size_t len);
+#endif
 void uart_send_str(char *str);
 void uart_receive(char *chr);
 uint32_t lfsr32_next(int *lfsr);
 
-void main(void)
+int main(void)
 {
     // Initialize UART
     uart_init();
@@ -45,8 +49,8 @@ void main(void)
     int result;
     int rem;
 
-    // Infinite loop
-    while (1)
+    // A fixed number of test cases, so the program ends
+    for (int n = 0; n < 100; n++)
     {
         a = lfsr32_next(&lfsr);
         b = lfsr32_next(&lfsr);
@@ -75,6 +79,8 @@ void main(void)
         }
         uart_send('\n');
     }
+
+    return 0;
 }
 
 // From GPT
@@ -100,6 +106,11 @@ void uart_init(void)
 
 void uart_send(char chr)
 {
+#ifdef SIMULATOR
+    // Straight to the simulation's console, waiting on the UART would make
+    // the benchmarks measure its baud rate instead of the core
+    _write(1, &chr, 1);
+#else
     // Wait for the UART to be ready
     while (UART->SR & 0x1) // Check if tx_busy (bit 0) is set
         ;
@@ -110,6 +121,7 @@ void uart_send(char chr)
     // Wait for the UART to be busy
     while (!(UART->SR & 0x1)) // Check if tx_busy (bit 0) is set
         ;
+#endif
 }
 
 void uart_send_str(char *str)
@@ -43,6 +43,14 @@
 #define EXIT_CRITICAL() \
     asm volatile("csrs mstatus, 0x8") // Enable interrupts
 
+// Performance counters, read with READ_CSR (add an h for the upper half)
+#define HPM_LOAD_USE mhpmcounter3 // Load-use bubbles
+#define HPM_MEMORY mhpmcounter4   // Stalls on data accesses to the shared memory
+#define HPM_BRANCH mhpmcounter5   // Branch mispredict flushes
+#define HPM_MULDIV mhpmcounter6   // Stalls on the multiplier or divider
+#define HPM_FETCH mhpmcounter7    // Stalls on instruction fetches
+#define HPM_CSR mhpmcounter8      // Bubbles behind CSR writes
+
 // Interrupt assignments
 #define UART_RXI 16 // UART RX interrupt
 
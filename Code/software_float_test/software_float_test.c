@@ -1,3 +1,4 @@
+#include <stddef.h>
 #include <stdint.h>
 #include <stdlib.h>
 #include <stdio.h>
@@ -30,6 +31,9 @@ void UART_RXI_Handler(void) __attribute__((interrupt));
 
 void uart_init(void);
 void uart_send(char chr);
+#ifdef SIMULATOR
+int _write(int file, const void *ptr, size_t len);
+#endif
 void uart_send_str(char *str);
 void uart_receive(char *chr);
 uint32_t lfsr32_next(int *lfsr);
@@ -100,6 +104,11 @@ void uart_init(void)
 
 void uart_send(char chr)
 {
+#ifdef SIMULATOR
+    // Straight to the simulation's console, waiting on the UART would make
+    // the benchmarks measure its baud rate instead of the core
+    _write(1, &chr, 1);
+#else
     // Wait for the UART to be ready
     while (UART->SR & 0x1) // Check if tx_busy (bit 0) is set
         ;
@@ -110,6 +119,7 @@ void uart_send(char chr)
     // Wait for the UART to be busy
     while (!(UART->SR & 0x1)) // Check if tx_busy (bit 0) is set
         ;
+#endif
 }
 
 void uart_send_str(char *str)
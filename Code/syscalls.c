@@ -3,6 +3,12 @@
 #include <errno.h>
 #include <stdint.h>
 
+#ifdef SIMULATOR
+/* Console of the simulation (ahb_sim_console_satellite), compile.py --sim */
+#define SIM_CONSOLE_TXDR (*(volatile uint32_t *)0x00020010)
+#define SIM_CONSOLE_EXIT (*(volatile uint32_t *)0x00020014)
+#endif
+
 /* Symbols from linker */
 extern char _end;
 extern char _heap_end;
@@ -31,13 +37,40 @@ void *_sbrk(ptrdiff_t incr)
     return (void *)prev_heap_ptr;
 }
 
-/* stdout/stderr write */
+/* stdout/stderr write, to the simulation console when built for it */
 int _write(int file, const void *ptr, size_t len)
 {
     (void)file;
+#ifdef SIMULATOR
+    const char *bytes = ptr;
+    for (size_t i = 0; i < len; i++)
+    {
+        SIM_CONSOLE_TXDR = (uint8_t)bytes[i];
+    }
+#else
+    (void)ptr;
+#endif
     return len;
 }
 
+/* exit, the status goes to the testbench when built for the simulation */
+void _exit(int status)
+{
+#ifdef SIMULATOR
+    /* The testbench ends the program on this write, an ebreak behind it
+       could halt the core before the write reaches the console */
+    SIM_CONSOLE_EXIT = status;
+#else
+    (void)status;
+    /* ebreak halts the core */
+    __asm__ volatile ("ebreak");
+#endif
+    /* Not reached, but _exit must not return */
+    for (;;)
+    {
+    }
+}
+
 /* stdin read */
 int _read(int file, void *ptr, size_t len)
 {
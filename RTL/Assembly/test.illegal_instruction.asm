@@ -29,5 +29,8 @@ _exception_handler:
     csrr x1, mcause
     sw x1, 0x108(x0)
 
-    # Return
+    # Return to the instruction after the one that trapped
+    csrr x11, mepc
+    addi x11, x11, 4
+    csrw mepc, x11
     mret
@@ -0,0 +1,27 @@
+.text
+
+_start:
+# Unit tests for the simulation console (ahb_sim_console_satellite)
+# Let x10 be used as a trace register
+    li      x10,    0
+    li      x11,    0x20010       # Console TXDR, EXIT at +4
+
+# Print "ok" to the console
+    li      x12,    'o'
+    sw      x12,    0(x11)
+    li      x12,    'k'
+    sw      x12,    0(x11)
+    li      x12,    '\n'
+    sw      x12,    0(x11)
+
+# Exiting ends the program, there is no ebreak so nothing else can
+    li      x10,    2
+    sw      x10,    0x100(zero)   # Trace 2 (pass)
+    li      x12,    3
+    sw      x12,    4(x11)        # Exit with status 3
+
+# Only reached when the exit didn't end the run, which then times out
+    li      x10,    1
+    sw      x10,    0x100(zero)   # Trace 1 (fail)
+_fail:
+    j       _fail
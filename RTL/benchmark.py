@@ -0,0 +1,207 @@
+# Cycle-count benchmarks over the programs in Code/: build each with
+# compile.py, run it to halt on the Verilator core and record the cycles,
+# retired instructions and simulation speed from system_tb's counter dump.
+#
+# Every run is appended to .bench/history.jsonl under the git revision of the
+# tree, so a change to the hazard unit, branch unit or mul/div units comes
+# with before and after numbers. A run is compared against a saved baseline
+# (--save-baseline) or any earlier revision in the history (--against), and
+# programs taking more cycles than the threshold allows are flagged as
+# regressions. A program retiring a different number of instructions was
+# changed itself (or its compiler), its cycles aren't comparable.
+#
+# The simulation speed is the program's cycles over the wall clock time of
+# its simulation process, model construction included.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import simulate_verilator
+from perfreport import load_counters
+from pipeline import ToolchainError, run_tool
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.join(SCRIPT_DIR, "..", "Code")
+BENCH_DIR = os.path.join("work", "bench")
+RESULTS_DIR = os.path.join(SCRIPT_DIR, ".bench")
+HISTORY_FILE = os.path.join(RESULTS_DIR, "history.jsonl")
+BASELINE_FILE = os.path.join(RESULTS_DIR, "baseline.json")
+
+# Cycles a program may grow by before it is a regression, in percent
+DEFAULT_THRESHOLD = 1.0
+DEFAULT_MAX_CYCLES = 100000000
+
+# Program directories in Code/: the ones with C or assembly sources
+def find_programs():
+    programs = []
+    for name in sorted(os.listdir(CODE_DIR)):
+        path = os.path.join(CODE_DIR, name)
+        if os.path.isdir(path) and name not in ("include", "build") and any(x.endswith((".c", ".S")) for x in os.listdir(path)):
+            programs.append(name)
+    return programs
+
+# Build a program with compile.py and copy its image and ELF into its
+# benchmark directory, as compile.py always builds into Code/build. The
+# simulation build's _exit ends the program through the console device, the
+# other one never halts the testbench.
+def build_program(name):
+    workdir = os.path.join(BENCH_DIR, name)
+    os.makedirs(workdir, exist_ok=True)
+    run_tool("compile", [sys.executable, "compile.py", "--sim", name], cwd=CODE_DIR)
+    for file in ("raminit.mem", "program.elf"):
+        shutil.copy(os.path.join(CODE_DIR, "build", file), workdir)
+    return workdir
+
+# Run a built program to halt on its own, returns its results. Another
+# simulation binary writes its files with suffix, so variants of the core can
+# run the same program side by side.
+def run_program(name, max_cycles, binary=simulate_verilator.SIM_BINARY, suffix=""):
+    workdir = os.path.join(BENCH_DIR, name)
+    counters_path = os.path.join(workdir, "counters{}.txt".format(suffix))
+    if os.path.exists(counters_path):
+        os.remove(counters_path)
+    manifest = os.path.join(workdir, "manifest{}.txt".format(suffix))
+    simulate_verilator.write_manifest([[os.path.join(workdir, "raminit.mem"), os.path.join(workdir, "ramcpu{}.bin".format(suffix)), "-", counters_path]], manifest)
+
+    start = time.time()
+    simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], binary, stdout=subprocess.DEVNULL)
+    seconds = time.time() - start
+
+    counters = load_counters(counters_path)
+    cycles = counters.get("cycles", 0)
+    return {
+        "halted": bool(counters.get("halted", 0)),
+        "cycles": cycles,
+        "instret": counters.get("minstret", 0),
+        "seconds": round(seconds, 3),
+        "cycles_per_second": round(cycles / seconds) if seconds else 0,
+    }
+
+# Revision of the tree, "-dirty" when there are uncommitted changes
+def git_revision():
+    try:
+        return run_tool("revision", ["git", "describe", "--always", "--dirty", "--abbrev=12"], cwd=SCRIPT_DIR).stdout.strip()
+    except ToolchainError:
+        return "unknown"
+
+def load_history():
+    history = []
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, 'r') as file:
+            for line in file:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    continue
+    return history
+
+def append_history(entry):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(HISTORY_FILE, 'a') as file:
+        file.write(json.dumps(entry) + "\n")
+
+# The latest run of a revision in the history, None if it was never run
+def find_revision(history, revision):
+    for entry in reversed(history):
+        if entry["revision"].startswith(revision):
+            return entry
+    return None
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+def save_baseline(path, entry):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(entry, file, indent=2)
+
+# Status of a program against the baseline: "" when within the threshold
+def compare(result, base, threshold):
+    if not result["halted"]:
+        return "NO HALT"
+    if base is None:
+        return "new"
+    if result["instret"] != base["instret"]:
+        return "program changed"
+    if base["cycles"] and 100 * (result["cycles"] - base["cycles"]) / base["cycles"] > threshold:
+        return "REGRESSION"
+    if base["cycles"] and 100 * (base["cycles"] - result["cycles"]) / base["cycles"] > threshold:
+        return "improved"
+    return ""
+
+def format_table(results, baseline, threshold):
+    header = "{:<24} {:>12} {:>12} {:>7} {:>12} {:>9} {:>10}  {}".format(
+        "program", "cycles", "instret", "CPI", "baseline", "change", "cycles/s", "status")
+    lines = [header, "-" * len(header)]
+    for name, result in results.items():
+        base = baseline["programs"].get(name) if baseline else None
+        change = ""
+        if base and base["cycles"]:
+            change = "{:+.2f}%".format(100 * (result["cycles"] - base["cycles"]) / base["cycles"])
+        lines.append("{:<24} {:>12} {:>12} {:>7.3f} {:>12} {:>9} {:>10}  {}".format(
+            name, result["cycles"], result["instret"], result["cycles"] / result["instret"] if result["instret"] else 0,
+            base["cycles"] if base else "", change, result["cycles_per_second"], compare(result, base, threshold)))
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Code/ programs on the Verilator core and compare the cycles against a baseline")
+    parser.add_argument("programs", nargs='*', default=None, help="Programs in Code/ to run (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Simulations at a time, more skews the simulation speed (default: 1)")
+    parser.add_argument("-b", "--baseline", default=BASELINE_FILE, help="Baseline to compare against (default: .bench/baseline.json)")
+    parser.add_argument("-a", "--against", default=None, help="Compare against the last run of this git revision in the history instead")
+    parser.add_argument("-s", "--save-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Cycle growth in percent flagged as a regression (default: {})".format(DEFAULT_THRESHOLD))
+    parser.add_argument("--no-build", action="store_true", help="Run the images already in work/bench instead of building the programs")
+    parser.add_argument("--no-record", action="store_true", help="Don't append this run to the history")
+    parser.add_argument("--max-cycles", type=int, default=DEFAULT_MAX_CYCLES, help="Give up on a program that hasn't halted after this many cycles (default: {})".format(DEFAULT_MAX_CYCLES))
+    args = parser.parse_args()
+
+    available = find_programs()
+    programs = args.programs or available
+    unknown = [x for x in programs if x not in available]
+    if unknown:
+        print("No program {} in {}".format(', '.join(unknown), os.path.normpath(CODE_DIR)))
+        sys.exit(1)
+
+    if args.against is not None:
+        baseline = find_revision(load_history(), args.against)
+        if baseline is None:
+            print("Revision {} is not in the history".format(args.against))
+            sys.exit(1)
+    else:
+        baseline = load_baseline(args.baseline)
+
+    try:
+        if not args.no_build:
+            for name in programs:
+                print("Building {}".format(name))
+                build_program(name)
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            results = dict(zip(programs, pool.map(lambda x: run_program(x, args.max_cycles), programs)))
+    except (ToolchainError, OSError) as e:
+        print(e)
+        sys.exit(1)
+
+    entry = {"revision": git_revision(), "time": int(time.time()), "programs": results}
+    if baseline is not None:
+        print("Against {}".format(baseline["revision"]))
+    print(format_table(results, baseline, args.threshold))
+
+    if not args.no_record:
+        append_history(entry)
+    if args.save_baseline:
+        save_baseline(args.baseline, entry)
+        print("Saved the baseline for {}".format(entry["revision"]))
+
+    statuses = [compare(result, baseline["programs"].get(name) if baseline else None, args.threshold) for name, result in results.items()]
+    if "REGRESSION" in statuses or "NO HALT" in statuses:
+        sys.exit(1)
@@ -0,0 +1,352 @@
+# Explore branch predictor designs by replaying retire traces (iss.py/emulate.py
+# --trace from the golden model, or system_tb's +trace from the RTL) through
+# Python models of them, so a change to branch_unit.sv can be sized up before
+# touching SystemVerilog.
+#
+# The "bimodal" predictor is branch_unit.sv as it is: 2^BTB_BITS 2-bit
+# counters and untagged targets, both indexed by pc[BTB_BITS+1:2], looked up
+# for every fetched word and updated by every control transfer (branches,
+# jal, jalr, mret). With no tags, an instruction that isn't a branch but
+# shares an entry with a taken one is predicted taken and flushed as well.
+# The alternatives:
+#   not-taken   ALWAYS_NOT_TAKEN
+#   gshare:H    2^H counters indexed by pc xor H bits of branch history
+#   +tagged     BTB entries only hit for the pc that wrote them
+#   +ras:N      N-entry return address stack, used for entries the BTB
+#               knows to be returns (jalr x0, 0(ra))
+# e.g. "gshare:8+tagged+ras:4".
+#
+# The models update in program order, while the RTL predicts at fetch and
+# updates when the branch reaches memory, so back to back branches on the
+# same entry come out slightly better here than in the pipeline. Every
+# mispredict is charged MISPREDICT_PENALTY cycles.
+
+import os
+import sys
+import argparse
+import tempfile
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from iss import run_program
+
+# A mispredict is resolved in memory and flushes fetch, decode and execute
+MISPREDICT_PENALTY = 3
+
+# branch_unit.sv's default
+DEFAULT_BTB_BITS = 5
+# Images that never halt are traced this far
+DEFAULT_MAX_STEPS = 100000000
+BASELINE = "bimodal"
+
+# Kinds of control transfer
+NONE, BRANCH, JUMP, CALL, RETURN = range(5)
+
+MRET = 0x30200073
+LINK_REGS = (1, 5)
+
+STRONG_NOT_TAKEN, WEAK_NOT_TAKEN, WEAK_TAKEN, STRONG_TAKEN = range(4)
+
+def count(counter, taken):
+    return min(counter + 1, STRONG_TAKEN) if taken else max(counter - 1, STRONG_NOT_TAKEN)
+
+# Kind of control transfer of each instruction word
+def control_kinds(insts):
+    opcode = insts & 0x7F
+    rd = (insts >> 7) & 0x1F
+    rs1 = (insts >> 15) & 0x1F
+    is_link = lambda reg: (reg == LINK_REGS[0]) | (reg == LINK_REGS[1])
+
+    kinds = np.full(len(insts), NONE, dtype=np.uint8)
+    kinds[opcode == 0x63] = BRANCH
+    kinds[(opcode == 0x6F) | (opcode == 0x67) | (insts == MRET)] = JUMP
+    kinds[(opcode == 0x67) & is_link(rs1) & (rd == 0)] = RETURN
+    kinds[((opcode == 0x6F) | (opcode == 0x67)) & is_link(rd)] = CALL
+    return kinds
+
+# Target of each conditional branch, taken or not
+def branch_targets(pcs, insts):
+    imm = (((insts >> 31) & 0x1) << 12) | (((insts >> 7) & 0x1) << 11) | (((insts >> 25) & 0x3F) << 5) | (((insts >> 8) & 0xF) << 1)
+    imm = imm.astype(np.int64) - ((imm & 0x1000) << 1).astype(np.int64)
+    return ((pcs.astype(np.int64) + imm) & 0xFFFFFFFF).astype(np.uint32)
+
+# (pcs, kinds, taken, targets) of every retired instruction of a trace. The
+# target is what branch_unit.sv stores: the branch target for conditional
+# branches, the pc that retired next for jumps.
+def load_trace(trace_path):
+    records = np.memmap(trace_path, dtype='<u4', mode='r')
+    records = records[:len(records) // 6 * 6].reshape(-1, 6)
+    pcs = np.array(records[:, 0])
+    insts = np.array(records[:, 1])
+    del records
+
+    next_pcs = np.append(pcs[1:], pcs[-1:] + 4) if len(pcs) else pcs
+    kinds = control_kinds(insts)
+    taken = (kinds != NONE) & ((kinds != BRANCH) | (next_pcs != pcs + 4))
+    targets = np.where(kinds == BRANCH, branch_targets(pcs, insts), next_pcs)
+    return pcs, kinds, taken, targets
+
+class BTB:
+    def __init__(self, bits, tagged=False):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.tagged = tagged
+        self.targets = [0] * (1 << bits)
+        self.returns = [False] * (1 << bits)
+        self.tags = [None] * (1 << bits)
+
+    # Entry of pc, or None on a miss
+    def lookup(self, pc):
+        idx = (pc >> 2) & self.mask
+        if self.tagged and self.tags[idx] != pc >> (self.bits + 2):
+            return None
+        return idx
+
+    def update(self, pc, target, is_return):
+        idx = (pc >> 2) & self.mask
+        self.targets[idx] = target
+        self.returns[idx] = is_return
+        self.tags[idx] = pc >> (self.bits + 2)
+
+    # Target, return flag and tag (with a valid bit) per entry
+    def state_bits(self, with_returns):
+        return (1 << self.bits) * (32 + with_returns + ((30 - self.bits + 1) if self.tagged else 0))
+
+class NotTaken:
+    def predict(self, pc):
+        return False
+
+    def update(self, pc, taken, is_branch):
+        pass
+
+    def state_bits(self):
+        return 0
+
+class Bimodal:
+    def __init__(self, bits):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.counters = [STRONG_NOT_TAKEN] * (1 << bits)
+
+    def predict(self, pc):
+        return self.counters[(pc >> 2) & self.mask] >= WEAK_TAKEN
+
+    def update(self, pc, taken, is_branch):
+        idx = (pc >> 2) & self.mask
+        self.counters[idx] = count(self.counters[idx], taken)
+
+    def state_bits(self):
+        return 2 << self.bits
+
+class GShare:
+    def __init__(self, bits):
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.counters = [STRONG_NOT_TAKEN] * (1 << bits)
+        self.history = 0
+
+    def predict(self, pc):
+        return self.counters[((pc >> 2) ^ self.history) & self.mask] >= WEAK_TAKEN
+
+    def update(self, pc, taken, is_branch):
+        idx = ((pc >> 2) ^ self.history) & self.mask
+        self.counters[idx] = count(self.counters[idx], taken)
+        # Only conditional branches go into the history
+        if is_branch:
+            self.history = ((self.history << 1) | taken) & self.mask
+
+    def state_bits(self):
+        return (2 << self.bits) + self.bits
+
+class RAS:
+    def __init__(self, depth):
+        self.depth = depth
+        self.stack = []
+
+    def push(self, address):
+        if len(self.stack) == self.depth:
+            self.stack.pop(0)
+        self.stack.append(address)
+
+    def pop(self):
+        return self.stack.pop() if self.stack else None
+
+    def state_bits(self):
+        return self.depth * 32 + max(1, (self.depth - 1).bit_length())
+
+class Predictor:
+    def __init__(self, spec, btb_bits):
+        self.spec = spec
+        self.ras = None
+        tagged = False
+        direction = None
+
+        for part in spec.split('+'):
+            name, _, arg = part.partition(':')
+            if name == "bimodal":
+                direction = Bimodal(btb_bits)
+            elif name == "not-taken":
+                direction = NotTaken()
+            elif name == "gshare":
+                direction = GShare(int(arg) if arg else btb_bits)
+            elif name == "tagged":
+                tagged = True
+            elif name == "ras":
+                self.ras = RAS(int(arg) if arg else 4)
+            else:
+                raise ValueError("Unknown predictor part \"{}\" in \"{}\"".format(part, spec))
+        if direction is None:
+            raise ValueError("Predictor \"{}\" needs bimodal, gshare or not-taken".format(spec))
+
+        self.direction = direction
+        self.btb = BTB(btb_bits, tagged)
+
+    def state_bits(self):
+        if isinstance(self.direction, NotTaken):
+            return 0
+        bits = self.btb.state_bits(self.ras is not None) + self.direction.state_bits()
+        return bits + (self.ras.state_bits() if self.ras is not None else 0)
+
+    # Replay one program and return (control transfers, mispredicts)
+    def replay(self, pcs, kinds, taken, targets):
+        btb = self.btb
+        ras = self.ras
+        predict = self.direction.predict
+        update = self.direction.update
+        transfers = 0
+        misses = 0
+
+        for pc, kind, is_taken, target in zip(pcs.tolist(), kinds.tolist(), taken.tolist(), targets.tolist()):
+            # Fetch: taken to the BTB's (or the RAS's) target, or not taken
+            idx = btb.lookup(pc)
+            predicted = None
+            if idx is not None and predict(pc):
+                predicted = btb.targets[idx]
+                if ras is not None and btb.returns[idx] and ras.stack:
+                    predicted = ras.stack[-1]
+
+            if kind == NONE:
+                misses += predicted is not None
+                continue
+
+            # Memory: resolve and train
+            transfers += 1
+            if is_taken:
+                misses += predicted != target
+            else:
+                misses += predicted is not None
+            update(pc, is_taken, kind == BRANCH)
+            btb.update(pc, target, kind == RETURN)
+
+            if ras is not None:
+                if kind == RETURN:
+                    ras.pop()
+                elif kind == CALL:
+                    ras.push(pc + 4)
+
+        return transfers, misses
+
+# Retire trace of an image from the golden model, for programs without one
+def trace_image(image, trace_path, max_steps=None):
+    run_program(image, None, max_steps, trace_path=trace_path)
+    return trace_path
+
+# Traces under the given paths: trace files as they are, images (.mem, .hex)
+# run on the golden model first, and directories searched for trace_name.
+# Returns [(name, path, image or None)].
+def find_traces(paths, trace_name):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                if trace_name in files:
+                    found.append((os.path.relpath(root, path), os.path.join(root, trace_name), None))
+        elif os.path.splitext(path)[1] in (".mem", ".hex"):
+            found.append((path, None, path))
+        else:
+            found.append((os.path.splitext(os.path.basename(path))[0], path, None))
+    return found
+
+def run_one(job):
+    trace_path, spec, btb_bits = job
+    predictor = Predictor(spec, btb_bits)
+    transfers, misses = predictor.replay(*load_trace(trace_path))
+    return transfers, misses, predictor.state_bits()
+
+def format_table(specs, bits, programs, results, per_program=False):
+    header = "{:<28} {:>4} {:>10} {:>10} {:>10} {:>8} {:>12} {:>8}".format(
+        "predictor", "bits", "state", "transfers", "mispred", "rate", "flush cyc", "vs rtl")
+    lines = [header, "-" * len(header)]
+
+    def total(spec, btb_bits):
+        rows = [results[(name, spec, btb_bits)] for name in programs]
+        return sum(x[0] for x in rows), sum(x[1] for x in rows), rows[0][2]
+
+    baseline = None
+    if (BASELINE, DEFAULT_BTB_BITS) in itertools.product(specs, bits):
+        baseline = total(BASELINE, DEFAULT_BTB_BITS)[1] * MISPREDICT_PENALTY
+
+    def row(label, btb_bits, transfers, misses, state, compare=True):
+        flush = misses * MISPREDICT_PENALTY
+        delta = "{:+.1f}%".format(100 * (flush - baseline) / baseline) if compare and baseline else ""
+        return "{:<28} {:>4} {:>10} {:>10} {:>10} {:>7.2f}% {:>12} {:>8}".format(
+            label, btb_bits, state, transfers, misses, 100 * misses / transfers if transfers else 0, flush, delta)
+
+    for spec, btb_bits in itertools.product(specs, bits):
+        lines.append(row(spec, btb_bits, *total(spec, btb_bits)))
+        if per_program:
+            for name in programs:
+                lines.append(row("  " + name, btb_bits, *results[(name, spec, btb_bits)], compare=False))
+    return '\n'.join(lines)
+
+def write_csv(csv_path, specs, bits, programs, results):
+    import csv
+    with open(csv_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["predictor", "btb_bits", "program", "state_bits", "transfers", "mispredicts", "flush_cycles"])
+        for spec, btb_bits, name in itertools.product(specs, bits, programs):
+            transfers, misses, state = results[(name, spec, btb_bits)]
+            writer.writerow([spec, btb_bits, name, state, transfers, misses, misses * MISPREDICT_PENALTY])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay retire traces through branch predictor models and compare mispredicts")
+    parser.add_argument("paths", nargs='*', default=["work"], help="Retire traces, program images (.mem/.hex, traced on the golden model) or directories of traces (default: work)")
+    parser.add_argument("-p", "--predictor", nargs='+', default=["not-taken", "bimodal", "bimodal+tagged", "gshare:8+tagged", "bimodal+tagged+ras:4"],
+                        help="Predictors to model, e.g. bimodal, not-taken, gshare:8+tagged+ras:4 (default: a selection)")
+    parser.add_argument("-b", "--btb-bits", type=int, nargs='+', default=[DEFAULT_BTB_BITS], help="BTB_BITS values to sweep (default: {})".format(DEFAULT_BTB_BITS))
+    parser.add_argument("-t", "--trace-name", default="memsim.trace", help="Trace looked for in directories, ramcpu.trace for the RTL's (default: memsim.trace)")
+    parser.add_argument("-n", "--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="Stop tracing images after this many instructions (default: {})".format(DEFAULT_MAX_STEPS))
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Models run in parallel (default: all cores)")
+    parser.add_argument("--per-program", action="store_true", help="List every program under each predictor")
+    parser.add_argument("-o", "--csv", default=None, help="Also write every predictor, BTB_BITS and program to this CSV file")
+    args = parser.parse_args()
+
+    for spec in args.predictor:
+        try:
+            Predictor(spec, DEFAULT_BTB_BITS)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+
+    found = find_traces(args.paths, args.trace_name)
+    if not found:
+        print("No traces found.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        # Trace the images first
+        images = [(idx, image) for idx, (_, _, image) in enumerate(found) if image is not None]
+        traced = pool.map(trace_image, [image for _, image in images], [os.path.join(tmp, "{}.trace".format(idx)) for idx, _ in images], [args.max_steps] * len(images))
+        for (idx, image), trace_path in zip(images, traced):
+            found[idx] = (found[idx][0], trace_path, image)
+
+        programs = [name for name, _, _ in found]
+        keys = [(name, spec, btb_bits) for (name, _, _), spec, btb_bits in itertools.product(found, args.predictor, args.btb_bits)]
+        jobs = [(path, spec, btb_bits) for (_, path, _), spec, btb_bits in itertools.product(found, args.predictor, args.btb_bits)]
+        results = dict(zip(keys, pool.map(run_one, jobs)))
+
+    print(format_table(args.predictor, args.btb_bits, programs, results, args.per_program))
+    if args.csv is not None:
+        write_csv(args.csv, args.predictor, args.btb_bits, programs, results)
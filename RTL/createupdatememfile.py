@@ -1,32 +1,67 @@
-def create_mem():
-    diff_lines = []
-
-    with open('raminit.mem', 'r') as f:
-        lines_old = f.readlines()
-
-    with open('ramnew.mem', 'r') as f:
-        lines_new = f.readlines()
-
-    with open('ramupd.mem', 'w') as f:
-        for idx, line in enumerate(lines_new):
-            if line.strip() != lines_old[idx].strip():
-                diff_lines.append((idx, line.strip()))
-
-                # If this line starts at an address non-contiguous to the previous set, pop those and write to the final mem file
-                if len(diff_lines) >= 2 and diff_lines[-2][0] + 1 != diff_lines[-1][0]:
-                    f.write("@{:08X}\n".format(diff_lines[0][0]*4))
-                    for i in range(len(diff_lines) - 1):
-                        f.write("{} ".format(diff_lines[i][1]))
-                    f.write("\n")
-                    diff_lines = [diff_lines[-1]]
-
- 
-        # Write any remaining differences
-        f.write("@{:08X}\n".format(diff_lines[0][0]*4))
-        for i in range(len(diff_lines)):
-            f.write("{} ".format(diff_lines[i][1]))
-        f.write("\n")
+# Create an update memory file holding only the words of ramnew.mem that
+# differ from raminit.mem, for patching a bitstream with updatemem.
+#
+# Each block of the update file is an "@XXXXXXXX" address line followed by a
+# line of "XXXXXXXX " words. Starting a new block costs the address line plus
+# a newline, so a gap between two changed runs is filled with the (unchanged)
+# words in between whenever writing them is shorter than a new block. Every
+# gap is decided on its own, which gives the smallest file.
+
+import sys
+import argparse
+import numpy as np
+
+from memimage import DEFAULT_MEM_SIZE, load_vivado_mem
+
+# "@XXXXXXXX\n" plus the newline ending the block's data line
+BLOCK_COST = 10 + 1
+# "XXXXXXXX "
+WORD_COST = 9
+
+def load_words(file_path, mem_size=DEFAULT_MEM_SIZE):
+    return np.frombuffer(load_vivado_mem(file_path, mem_size), dtype='<u4')
+
+# Start and end (exclusive) word indices of the blocks to write
+def find_blocks(old_words, new_words):
+    changed = np.flatnonzero(old_words != new_words)
+    if changed.size == 0:
+        return []
+
+    # Gaps between consecutive changed words, split where bridging costs more
+    gaps = np.diff(changed) - 1
+    split = np.flatnonzero(gaps * WORD_COST >= BLOCK_COST)
+    starts = np.concatenate(([changed[0]], changed[split + 1]))
+    ends = np.concatenate((changed[split], [changed[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def format_update(new_words, blocks):
+    lines = []
+    for start, end in blocks:
+        lines.append("@{:08X}\n".format(start*4))
+        lines.append(new_words[start:end].astype('>u4').tobytes().hex(' ', 4).upper() + " \n")
+    return ''.join(lines)
+
+def create_mem(old_file="raminit.mem", new_file="ramnew.mem", out_file="ramupd.mem"):
+    old_words = load_words(old_file)
+    new_words = load_words(new_file)
+    blocks = find_blocks(old_words, new_words)
+
+    with open(out_file, 'w') as f:
+        f.write(format_update(new_words, blocks))
+
+    return blocks
 
 if __name__ == "__main__":
-    create_mem()
-    print("Memory file created from differences.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create an update memory file from the differences between two memory files")
+    parser.add_argument("old_file", nargs='?', default="raminit.mem", help="Memory file in the bitstream (default: raminit.mem)")
+    parser.add_argument("new_file", nargs='?', default="ramnew.mem", help="Memory file to change to (default: ramnew.mem)")
+    parser.add_argument("out_file", nargs='?', default="ramupd.mem", help="Update memory file (default: ramupd.mem)")
+    args = parser.parse_args()
+
+    blocks = create_mem(args.old_file, args.new_file, args.out_file)
+    if not blocks:
+        print("No differences, the update memory file is empty.")
+        sys.exit(0)
+
+    num_words = sum(end - start for start, end in blocks)
+    print("Memory file created from differences: {} word(s) in {} block(s).".format(num_words, len(blocks)))
@@ -0,0 +1,131 @@
+# Minimal reader for the little-endian ELF32 files the RISC-V toolchain
+# produces. Only what the build, test and analysis scripts need: program and
+# section headers, the symbol table and the memory image of the program.
+
+from struct import Struct
+from collections import namedtuple
+
+ELF_HEADER = Struct('<16sHHIIIIIHHHHHH')
+SECTION_HEADER = Struct('<IIIIIIIIII')
+PROGRAM_HEADER = Struct('<IIIIIIII')
+SYMBOL = Struct('<IIIBBH')
+
+# Segment types
+PT_LOAD = 1
+
+# Section types
+SHT_NOBITS = 8
+SHT_SYMTAB = 2
+
+# Section flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# Symbol types (low nibble of st_info)
+STT_OBJECT = 1
+STT_FUNC = 2
+
+Section = namedtuple('Section', ['name', 'type', 'flags', 'addr', 'offset', 'size'])
+Symbol = namedtuple('Symbol', ['name', 'value', 'size', 'type', 'shndx'])
+Segment = namedtuple('Segment', ['type', 'offset', 'vaddr', 'paddr', 'filesz', 'memsz', 'flags'])
+
+def read_cstring(data, offset):
+    end = data.index(b'\0', offset)
+    return data[offset:end].decode()
+
+class ELF32:
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as file:
+            self.data = file.read()
+
+        header = ELF_HEADER.unpack_from(self.data, 0)
+        ident = header[0]
+        if ident[:4] != b'\x7fELF' or ident[4] != 1 or ident[5] != 1:
+            raise ValueError("{} is not a little-endian ELF32 file".format(file_path))
+
+        (_, self.type, self.machine, _, self.entry, self.phoff, self.shoff, _,
+         _, self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = header
+
+        self.sections = self.read_sections()
+        self.segments = self.read_segments()
+        self.symbols = self.read_symbols()
+
+    def read_segments(self):
+        segments = []
+        for idx in range(self.phnum):
+            p_type, offset, vaddr, paddr, filesz, memsz, flags, _ = PROGRAM_HEADER.unpack_from(self.data, self.phoff + idx * self.phentsize)
+            segments.append(Segment(p_type, offset, vaddr, paddr, filesz, memsz, flags))
+        return segments
+
+    def read_sections(self):
+        raw = [SECTION_HEADER.unpack_from(self.data, self.shoff + idx * self.shentsize) for idx in range(self.shnum)]
+        if not raw:
+            return []
+
+        names_offset = raw[self.shstrndx][4]
+        sections = []
+        for name, sh_type, flags, addr, offset, size, _, _, _, _ in raw:
+            sections.append(Section(read_cstring(self.data, names_offset + name), sh_type, flags, addr, offset, size))
+        return sections
+
+    def read_symbols(self):
+        symbols = []
+        for idx in range(self.shnum):
+            header = SECTION_HEADER.unpack_from(self.data, self.shoff + idx * self.shentsize)
+            if header[1] != SHT_SYMTAB:
+                continue
+            offset, size, link, entsize = header[4], header[5], header[6], header[9]
+            strings = SECTION_HEADER.unpack_from(self.data, self.shoff + link * self.shentsize)[4]
+            for sym_offset in range(offset, offset + size, entsize or SYMBOL.size):
+                name, value, sym_size, info, _, shndx = SYMBOL.unpack_from(self.data, sym_offset)
+                if name == 0:
+                    continue
+                symbols.append(Symbol(read_cstring(self.data, strings + name), value, sym_size, info & 0xF, shndx))
+        return symbols
+
+    # Sections that take up memory when the program runs, ordered by address
+    def alloc_sections(self):
+        return sorted((x for x in self.sections if x.flags & SHF_ALLOC and x.size > 0), key=lambda x: x.addr)
+
+    def section(self, name):
+        for section in self.sections:
+            if section.name == name:
+                return section
+        return None
+
+    def symbol(self, name):
+        for symbol in self.symbols:
+            if symbol.name == name:
+                return symbol
+        return None
+
+    # (address, bytes) of what the program puts in memory: the file contents
+    # of every PT_LOAD segment at its load address, followed by zeros up to
+    # its memory size (.bss). An object file that was never linked has no
+    # segments, its allocated sections are placed at their addresses instead.
+    def load_regions(self):
+        regions = []
+        loads = [x for x in self.segments if x.type == PT_LOAD and x.memsz > 0]
+        for segment in loads:
+            data = self.data[segment.offset:segment.offset + segment.filesz]
+            regions.append((segment.paddr, data + bytes(segment.memsz - segment.filesz)))
+        if not loads:
+            for section in self.alloc_sections():
+                data = bytes(section.size) if section.type == SHT_NOBITS else self.data[section.offset:section.offset + section.size]
+                regions.append((section.addr, data))
+        return regions
+
+    # Memory image of mem_size bytes holding the program
+    def load_image(self, mem_size, image=None):
+        if image is None:
+            image = bytearray(mem_size)
+        for addr, data in self.load_regions():
+            if addr + len(data) > len(image):
+                raise ValueError("0x{:08X}-0x{:08X} is outside of the {} byte memory".format(addr, addr + len(data) - 1, len(image)))
+            image[addr:addr + len(data)] = data
+        return image
+
+    # {name: value} of the symbols
+    def symbol_values(self):
+        return {x.name: x.value for x in self.symbols}
@@ -1,28 +1,34 @@
-# Script to run the RARS emulator
+# Script to run the golden model on an assembly file
 
-import subprocess
 import sys
 import os
+import argparse
 
-def run_emulator(asm_file):
+from pipeline import ToolchainError, assemble, load_image, emulate
+
+def run_emulator(asm_file, trace_file=None, dump_file="memsim.hex"):
     # subprocess.run("java -jar \"RISC-V Emulator/rars.jar\" {asm_file} mc Custom smc dump .text HEX ramsim.hex eeb ic".format(asm_file=asm_file), shell=True)
     # Link to start at 0x80000000
     # subprocess.run("wsl -e /opt/riscv/bin/riscv32-unknown-elf-ld -T /mnt/d/github_repos/RISC-V-Core/RTL/linkerscript_spike.ld {asm_file_start}.o -o {asm_file_start}.l".format(asm_file_start='.'.join(asm_file.split('.')[:-1])), shell=True)
     # subprocess.run("wsl -e /opt/riscv/bin/spike --isa=RV32IMA /opt/riscv/riscv32-unknown-elf/bin/pk {asm_file_start}.l".format(asm_file_start='.'.join(asm_file.split('.')[:-1])), shell=True)
-    march = "rv32im_zicsr"
-    subprocess.run("riscv-none-elf-as -march={march} -mabi=ilp32 -o {asm_file_start}.o {asm_file}".format(march=march, asm_file_start='.'.join(sys.argv[1].split('.')[:-1]), asm_file=asm_file), shell=True)
-    subprocess.run("riscv-none-elf-ld -T linkerscript.ld -o {asm_file_start}.elf {asm_file_start}.o".format(asm_file_start='.'.join(sys.argv[1].split('.')[:-1])), shell=True)
-    subprocess.run("riscv-none-elf-objcopy -O ihex {asm_file_start}.elf meminit.hex".format(asm_file_start='.'.join(sys.argv[1].split('.')[:-1])), shell=True)
-    subprocess.run(".\\RISC-V-Emulator\\build\\Debug\\RISCV_Emulator.exe", shell=True)
+    # Run the in-tree instruction set simulator on the ELF and dump memory for
+    # testasm.py
+    try:
+        emulate(load_image(assemble(asm_file)), dump_file, trace_file)
+    except ToolchainError as e:
+        print(e)
+        sys.exit(1)
 
 if __name__ == "__main__":
-    if(len(sys.argv) < 2):
-        print("Usage: python emulate.py <asm_file>")
-        sys.exit(1)
-    
-    if not os.path.exists(sys.argv[1]):
-        print("Assembly file \"{}\" does not exist".format(sys.argv[1]))
+    parser = argparse.ArgumentParser(description="Run an assembly file on the golden model")
+    parser.add_argument("asm_file", help="Assembly file")
+    parser.add_argument("-o", "--output", default="memsim.hex", help="Memory dump output, .hex, .bin or .pages (default: memsim.hex)")
+    parser.add_argument("-t", "--trace", default=None, help="Write the retire trace to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.asm_file):
+        print("Assembly file \"{}\" does not exist".format(args.asm_file))
         sys.exit(1)
 
-    run_emulator(sys.argv[1])
+    run_emulator(args.asm_file, args.trace, args.output)
     print("Emulation complete.")
\ No newline at end of file
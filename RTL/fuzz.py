@@ -0,0 +1,376 @@
+# Differential fuzzer: constrained-random RV32IM_Zicsr programs run on the
+# golden model (iss.py) and on the Verilator build of the core, comparing the
+# final memory (every register is stored to memory before the ebreak) and the
+# retire traces. A failing program is shrunk to a minimal reproducer and
+# saved as Assembly/test.fuzz_<seed>.asm so testasm.py keeps checking it.
+#
+# Programs are lists of blocks, each self-contained (branches only jump
+# forward inside their block, loops count down a register of their own), so
+# any subset of the blocks is still a program that halts. The blocks are
+# biased towards what the directed tests cover least: back to back
+# dependencies, load-use pairs, branches with mul/div in their shadow and
+# CSR accesses.
+#
+# Programs are built and run on the golden model in a process pool, then
+# simulated in batches, one simulation process per job, like testasm.py.
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import simulate_verilator
+from pipeline import ToolchainError, build_test, emulate
+from memcompare import compare_dumps
+from perfreport import halt_error
+from tracecmp import compare_traces
+
+FUZZ_DIR = os.path.join("work", "fuzz")
+
+# Register holding the data area, the loop counter, and the ones the blocks
+# are free to use
+DATA_REG = 31
+LOOP_REG = 30
+FREE_REGS = list(range(1, 30))
+
+# Data area and the registers stored at the end, relative to DATA_REG. The
+# assembly tests are linked at 0 and the code stays well below DATA_BASE.
+DATA_BASE = 0x2000
+DATA_SIZE = 0x700
+REG_DUMP = 0x700
+
+# Golden model instructions before a program is thrown away as not halting
+MAX_STEPS = 100000
+
+ALU_RR = ["add", "sub", "sll", "slt", "sltu", "xor", "srl", "sra", "or", "and"]
+ALU_RI = ["addi", "slti", "sltiu", "xori", "ori", "andi"]
+SHIFT_RI = ["slli", "srli", "srai"]
+MULDIV = ["mul", "mulh", "mulhsu", "mulhu", "div", "divu", "rem", "remu"]
+BRANCHES = ["beq", "bne", "blt", "bge", "bltu", "bgeu"]
+LOADS = [("lb", 1), ("lh", 2), ("lw", 4), ("lbu", 1), ("lhu", 2)]
+STORES = [("sb", 1), ("sh", 2), ("sw", 4)]
+CSRS = ["mscratch", "mepc", "mcause"]
+CSR_OPS = ["csrrw", "csrrs", "csrrc"]
+CSR_IMM_OPS = ["csrrwi", "csrrsi", "csrrci"]
+
+# Values that hit the corners of mul/div and the comparisons
+INTERESTING = [0, 1, -1, 2, -2, 0x7FFFFFFF, -0x80000000, 0x80000000 - 1, 0xFFFF, 0x8000, 0xFF, 0x80]
+
+class ProgramGenerator:
+    def __init__(self, rng):
+        self.rng = rng
+        self.recent = []
+        self.labels = 0
+
+    def label(self):
+        self.labels += 1
+        return "L{}".format(self.labels)
+
+    # Destination, and sources biased towards the last few destinations so
+    # most instructions depend on the one before
+    def rd(self, exclude=(), allow_zero=True):
+        if allow_zero and self.rng.random() < 0.05:
+            reg = 0
+        else:
+            reg = self.rng.choice([x for x in FREE_REGS if x not in exclude])
+        self.recent = ([reg] + self.recent)[:3]
+        return reg
+
+    def rs(self):
+        if self.recent and self.rng.random() < 0.6:
+            return self.rng.choice(self.recent)
+        return self.rng.choice(FREE_REGS + [0])
+
+    def alu(self, exclude=()):
+        kind = self.rng.random()
+        if kind < 0.45:
+            return "{} x{}, x{}, x{}".format(self.rng.choice(ALU_RR), self.rd(exclude), self.rs(), self.rs())
+        if kind < 0.75:
+            return "{} x{}, x{}, {}".format(self.rng.choice(ALU_RI), self.rd(exclude), self.rs(), self.rng.randint(-2048, 2047))
+        if kind < 0.9:
+            return "{} x{}, x{}, {}".format(self.rng.choice(SHIFT_RI), self.rd(exclude), self.rs(), self.rng.randint(0, 31))
+        return "lui x{}, {}".format(self.rd(exclude), self.rng.randint(0, 0xFFFFF))
+
+    def muldiv(self, exclude=()):
+        return "{} x{}, x{}, x{}".format(self.rng.choice(MULDIV), self.rd(exclude), self.rs(), self.rs())
+
+    def load(self, exclude=()):
+        op, size = self.rng.choice(LOADS)
+        return "{} x{}, {}(x{})".format(op, self.rd(exclude), self.rng.randrange(0, DATA_SIZE, size), DATA_REG)
+
+    def store(self):
+        op, size = self.rng.choice(STORES)
+        return "{} x{}, {}(x{})".format(op, self.rs(), self.rng.randrange(0, DATA_SIZE, size), DATA_REG)
+
+    def csr(self, exclude=()):
+        if self.rng.random() < 0.7:
+            return "{} x{}, {}, x{}".format(self.rng.choice(CSR_OPS), self.rd(exclude), self.rng.choice(CSRS), self.rs())
+        return "{} x{}, {}, {}".format(self.rng.choice(CSR_IMM_OPS), self.rd(exclude), self.rng.choice(CSRS), self.rng.randint(0, 31))
+
+    # A single instruction of any kind but control flow
+    def simple(self, exclude=()):
+        kind = self.rng.random()
+        if kind < 0.4:
+            return self.alu(exclude)
+        if kind < 0.6:
+            return self.muldiv(exclude)
+        if kind < 0.75:
+            return self.load(exclude)
+        if kind < 0.9:
+            return self.store()
+        return self.csr(exclude)
+
+    def block_load_use(self):
+        load = self.load()
+        rd = self.recent[0]
+        use = self.rng.choice([
+            "{} x{}, x{}, x{}".format(self.rng.choice(ALU_RR + MULDIV), self.rd(), rd, self.rs()),
+            "sw x{}, {}(x{})".format(rd, self.rng.randrange(0, DATA_SIZE, 4), DATA_REG),
+            "addi x{}, x{}, 1".format(self.rd(), rd),
+        ])
+        return [load, use]
+
+    def block_dependent_chain(self):
+        return [self.simple() for _ in range(self.rng.randint(2, 5))]
+
+    # Forward branch over a few instructions, with mul/div right after it on
+    # both paths
+    def block_branch(self):
+        target = self.label()
+        lines = ["{} x{}, x{}, {}".format(self.rng.choice(BRANCHES), self.rs(), self.rs(), target)]
+        lines += [self.muldiv()] + [self.simple() for _ in range(self.rng.randint(0, 2))]
+        lines += ["{}:".format(target), self.muldiv()]
+        return lines
+
+    def block_jump(self):
+        target = self.label()
+        if self.rng.random() < 0.5:
+            return ["jal x{}, {}".format(self.rd(), target), self.simple(), "{}:".format(target)]
+        # auipc/jalr over the next instruction
+        reg = self.rd(allow_zero=False)
+        return ["auipc x{}, 0".format(reg), "jalr x{}, 12(x{})".format(self.rd(exclude=(reg,)), reg), self.simple()]
+
+    # A short counted loop, to give the branch predictor a history
+    def block_loop(self):
+        top = self.label()
+        lines = ["li x{}, {}".format(LOOP_REG, self.rng.randint(1, 6)), "{}:".format(top)]
+        lines += [self.simple() for _ in range(self.rng.randint(1, 4))]
+        lines += ["addi x{0}, x{0}, -1".format(LOOP_REG), "bnez x{}, {}".format(LOOP_REG, top)]
+        return lines
+
+    def block_csr(self):
+        lines = [self.csr(), self.csr()]
+        # Use the value read straight away
+        lines.append("add x{}, x{}, x{}".format(self.rd(), self.recent[1], self.rs()))
+        return lines
+
+    def block(self):
+        kinds = [
+            (0.2, self.block_dependent_chain),
+            (0.2, self.block_load_use),
+            (0.2, self.block_branch),
+            (0.1, self.block_jump),
+            (0.1, self.block_loop),
+            (0.1, self.block_csr),
+            (0.1, lambda: [self.simple()]),
+        ]
+        pick = self.rng.random() * sum(x[0] for x in kinds)
+        for weight, make in kinds:
+            pick -= weight
+            if pick < 0:
+                return make()
+        return kinds[-1][1]()
+
+    def preamble(self):
+        lines = ["li x{}, {}".format(DATA_REG, DATA_BASE)]
+        for reg in FREE_REGS:
+            value = self.rng.choice(INTERESTING) if self.rng.random() < 0.5 else self.rng.randint(-0x80000000, 0x7FFFFFFF)
+            lines.append("li x{}, {}".format(reg, value))
+        # Something other than zero to load
+        for offset in range(0, DATA_SIZE, 64):
+            lines.append("sw x{}, {}(x{})".format(self.rng.choice(FREE_REGS), offset, DATA_REG))
+        return lines
+
+    def generate(self, num_blocks):
+        return self.preamble(), [self.block() for _ in range(num_blocks)]
+
+# Every register goes to memory so comparing the dumps compares them too
+def epilogue():
+    lines = ["sw x{}, {}(x{})".format(reg, REG_DUMP + 4 * reg, DATA_REG) for reg in range(1, 32)]
+    return lines + ["ebreak"]
+
+def format_program(preamble, blocks, header=()):
+    lines = ["# " + x for x in header] + [".text", "", "_start:"]
+    lines += ["    " + x for x in preamble]
+    for block in blocks:
+        lines.append("")
+        lines += [x if x.endswith(":") else "    " + x for x in block]
+    lines.append("")
+    lines += ["    " + x for x in epilogue()]
+    return '\n'.join(lines) + "\n"
+
+# Assemble a program in its own directory and run it on the golden model.
+# Returns (workdir, error), the error empty when both worked and the program
+# halted.
+def build_program(name, text, trace=True):
+    workdir = os.path.join(FUZZ_DIR, name)
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    with open(os.path.join(workdir, name + ".asm"), 'w') as file:
+        file.write(text)
+
+    try:
+        image = build_test(os.path.join(workdir, name + ".asm"), workdir)
+        emulate(image, os.path.join(workdir, "memsim.bin"), os.path.join(workdir, "memsim.trace") if trace else None, MAX_STEPS)
+    except ToolchainError as e:
+        return workdir, str(e)
+    return workdir, ""
+
+def simulate(shard_idx, workdirs, trace=True, max_cycles=0):
+    entries = [[os.path.join(x, "raminit.mem"), os.path.join(x, "ramcpu.bin"), os.path.join(x, "ramcpu.trace") if trace else "-",
+                os.path.join(x, "counters.txt")] for x in workdirs]
+    manifest = os.path.join(FUZZ_DIR, "manifest.{}.txt".format(shard_idx))
+    simulate_verilator.write_manifest(entries, manifest)
+    try:
+        simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        return "Error simulating: {}".format(e)
+    return ""
+
+# Report of how the RTL differs from the golden model, None if it doesn't
+def check(workdir, trace=True, max_cycles=0):
+    if not os.path.exists(os.path.join(workdir, "ramcpu.bin")):
+        return "Simulation produced no memory dump"
+    error = halt_error(os.path.join(workdir, "counters.txt"), max_cycles)
+    if error:
+        return error
+    name = os.path.basename(workdir)
+    match, report = compare_dumps(os.path.join(workdir, "memsim.bin"), os.path.join(workdir, "ramcpu.bin"), os.path.join(workdir, name + ".elf"))
+    if trace:
+        divergence = compare_traces(os.path.join(workdir, "memsim.trace"), os.path.join(workdir, "ramcpu.trace"))
+        if divergence is not None:
+            match = False
+            report = report + "\n\n" + divergence if report else divergence
+    return None if match else report
+
+# Build, simulate and check one program on its own. Returns the report, None
+# when it passes, or "" when it isn't a usable program.
+def run_single(name, preamble, blocks, trace=True, max_cycles=0):
+    workdir, error = build_program(name, format_program(preamble, blocks), trace)
+    if error:
+        return ""
+    error = simulate(name, [workdir], trace, max_cycles)
+    if error:
+        return error
+    return check(workdir, trace, max_cycles)
+
+# Delta debugging over the blocks: drop ever smaller chunks while the program
+# still fails, down to single blocks, then the same for the preamble's lines
+def shrink(seed, preamble, blocks, trace=True, max_cycles=0):
+    runs = [0]
+    def fails(candidate_preamble, candidate_blocks):
+        runs[0] += 1
+        return bool(run_single("shrink_{}".format(seed), candidate_preamble, candidate_blocks, trace, max_cycles))
+
+    def reduce(items, still_fails):
+        chunks = 2
+        while len(items) >= 2:
+            size = -(-len(items) // chunks)
+            for start in range(0, len(items), size):
+                candidate = items[:start] + items[start + size:]
+                if still_fails(candidate):
+                    items = candidate
+                    chunks = max(chunks - 1, 2)
+                    break
+            else:
+                if size == 1:
+                    break
+                chunks = min(chunks * 2, len(items))
+        return items
+
+    blocks = reduce(blocks, lambda x: fails(preamble, x))
+    # The data register has to stay, the epilogue stores through it
+    preamble = preamble[:1] + reduce(preamble[1:], lambda x: fails(preamble[:1] + x, blocks))
+    return preamble, blocks, runs[0]
+
+def save_reproducer(seed, preamble, blocks, report):
+    path = os.path.join("Assembly", "test.fuzz_{}.asm".format(seed))
+    header = ["Found by fuzz.py, seed {}".format(seed)] + report.splitlines()[:1]
+    with open(path, 'w') as file:
+        file.write(format_program(preamble, blocks, header))
+    return path
+
+def generate_and_build(seed, num_blocks, trace):
+    preamble, blocks = ProgramGenerator(random.Random(seed)).generate(num_blocks)
+    workdir, error = build_program("p{}".format(seed), format_program(preamble, blocks), trace)
+    return seed, workdir, error
+
+def fuzz():
+    parser = argparse.ArgumentParser(description="Differential random instruction fuzzing of the core against the golden model")
+    parser.add_argument("-n", "--programs", type=int, default=1000, help="Programs to run (default: 1000)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Worker processes and simulations at a time (default: all cores)")
+    parser.add_argument("-s", "--seed", type=int, default=None, help="First seed, program k uses seed + k (default: from the time)")
+    parser.add_argument("-b", "--blocks", type=int, default=60, help="Blocks per program (default: 60)")
+    parser.add_argument("--batch", type=int, default=32, help="Programs per simulation process (default: 32)")
+    parser.add_argument("--max-cycles", type=int, default=200000, help="Give up on a simulation after this many cycles (default: 200000)")
+    parser.add_argument("--no-trace", action="store_true", help="Only compare the final memory, not the retire traces")
+    parser.add_argument("--no-shrink", action="store_true", help="Save failing programs as they are")
+    parser.add_argument("--keep-going", action="store_true", help="Carry on after the first failure")
+    args = parser.parse_args()
+
+    trace = not args.no_trace
+    first_seed = args.seed if args.seed is not None else int(time.time())
+    jobs = max(1, args.jobs)
+    os.makedirs(FUZZ_DIR, exist_ok=True)
+
+    start = time.time()
+    passed = skipped = 0
+    failures = []
+    seeds = iter(range(first_seed, first_seed + args.programs))
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool, ThreadPoolExecutor(max_workers=jobs) as sims:
+        while True:
+            round_seeds = [x for _, x in zip(range(jobs * args.batch), seeds)]
+            if not round_seeds:
+                break
+
+            built = list(pool.map(generate_and_build, round_seeds, [args.blocks] * len(round_seeds), [trace] * len(round_seeds)))
+            usable = [(seed, workdir) for seed, workdir, error in built if not error]
+            skipped += len(built) - len(usable)
+
+            shards = [usable[idx::jobs] for idx in range(jobs) if usable[idx::jobs]]
+            errors = list(sims.map(lambda idx: simulate(idx, [x for _, x in shards[idx]], trace, args.max_cycles), range(len(shards))))
+
+            for shard, error in zip(shards, errors):
+                for seed, workdir in shard:
+                    report = error or check(workdir, trace, args.max_cycles)
+                    if report is None:
+                        passed += 1
+                        shutil.rmtree(workdir)
+                    else:
+                        failures.append((seed, report))
+
+            elapsed = time.time() - start
+            print("{} passed, {} failed, {} skipped, {:.0f} programs/hour".format(passed, len(failures), skipped, (passed + len(failures)) / elapsed * 3600))
+            if failures and not args.keep_going:
+                break
+
+    for seed, report in failures:
+        print("-" * 66)
+        print("Seed {} failed:".format(seed))
+        print(report)
+        preamble, blocks = ProgramGenerator(random.Random(seed)).generate(args.blocks)
+        if not args.no_shrink:
+            preamble, blocks, attempts = shrink(seed, preamble, blocks, trace, args.max_cycles)
+            print("Shrunk to {} block(s) in {} runs".format(len(blocks), attempts))
+        print("Saved {}".format(save_reproducer(seed, preamble, blocks, report)))
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    fuzz()
@@ -16,6 +16,9 @@ package common_types_pkg;
     parameter IMM_W_I = 12;
     parameter IMM_W_U_J = 20;
 
+    // Event counters mhpmcounter3 and up, one per hazard unit event
+    parameter HPM_EVENTS = 6;
+
     /*********/
     /* Types */
     /*********/
@@ -207,7 +210,19 @@ package common_types_pkg;
         MIE         = 12'h304,
         MEPC        = 12'h341,
         MCAUSE      = 12'h342,
-        MSCRATCH    = 12'h340
+        MSCRATCH    = 12'h340,
+        MCYCLE      = 12'hB00,
+        MINSTRET    = 12'hB02,
+        MHPMCOUNTER3 = 12'hB03,
+        MCYCLEH     = 12'hB80,
+        MINSTRETH   = 12'hB82,
+        MHPMCOUNTER3H = 12'hB83,
+        CYCLE       = 12'hC00,
+        INSTRET     = 12'hC02,
+        HPMCOUNTER3 = 12'hC03,
+        CYCLEH      = 12'hC80,
+        INSTRETH    = 12'hC82,
+        HPMCOUNTER3H = 12'hC83
     } csr_addr_t;
 
     // CSR bit assignments
@@ -22,6 +22,12 @@ interface csr_if;
   word_t csr_exception_cause;
   word_t csr_exception_pc;
 
+  // Performance counter inputs: the counters stop while halted, minstret
+  // counts retired instructions and mhpmcounter3+i the cycles event i is high
+  logic csr_halt;
+  logic csr_retire;
+  logic [HPM_EVENTS-1:0] csr_hpm_event;
+
   // CSR output control signals
   logic csr_interrupt_en;
   word_t csr_mie; // Interrupt enable register
@@ -34,6 +40,7 @@ interface csr_if;
     input   csr_write, csr_waddr, csr_wdata,
             csr_raddr,
             csr_exception, csr_mret, csr_exception_cause, csr_exception_pc,
+            csr_halt, csr_retire, csr_hpm_event,
     output  csr_rdata,
             csr_interrupt_en,
             csr_mie,
@@ -50,7 +57,8 @@ interface csr_if;
             csr_mepc,
     output  csr_write, csr_waddr, csr_wdata,
             csr_raddr,
-            csr_exception, csr_mret, csr_exception_cause, csr_exception_pc
+            csr_exception, csr_mret, csr_exception_cause, csr_exception_pc,
+            csr_halt, csr_retire, csr_hpm_event
   );
 endinterface
 
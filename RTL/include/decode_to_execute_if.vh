@@ -15,11 +15,22 @@ interface decode_to_execute_if;
 
   // Latched stuff
 
+  // Holds an instruction rather than a bubble
+  logic valid;
+
   /*******************/
   /* Program Counter */
   /*******************/
   word_t pc;
 
+`ifdef SIMULATOR
+  /***************/
+  /* Instruction */
+  /***************/
+  // Only carried for the retire trace
+  word_t inst;
+`endif
+
   /****************/
   /* Control Unit */
   /****************/
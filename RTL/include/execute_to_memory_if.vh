@@ -15,11 +15,22 @@ interface execute_to_memory_if;
 
   // Latched stuff
 
+  // Holds an instruction rather than a bubble
+  logic valid;
+
   /*******************/
   /* Program Counter */
   /*******************/
   word_t pc;
 
+`ifdef SIMULATOR
+  /***************/
+  /* Instruction */
+  /***************/
+  // Only carried for the retire trace
+  word_t inst;
+`endif
+
   /****************/
   /* Control Unit */
   /****************/
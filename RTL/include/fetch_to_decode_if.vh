@@ -15,6 +15,9 @@ interface fetch_to_decode_if;
 
   // Latched stuff
 
+  // Holds an instruction rather than a bubble
+  logic valid;
+
   /*******************/
   /* Program Counter */
   /*******************/
@@ -34,6 +34,15 @@ interface hazard_unit_if;
   logic mem_csr;        // CSR instruction in memory stage
   logic wb_csr;         // CSR instruction in writeback stage
 
+  // Performance counter events, high for every cycle lost to the cause
+  // (branch_flush_event for every flush)
+  logic mem_stall_event;        // Waiting on a data access (shared I/D memory)
+  logic fetch_stall_event;      // Waiting on an instruction fetch
+  logic load_use_event;         // Load-use bubble
+  logic muldiv_stall_event;     // Waiting on the multiplier or divider
+  logic csr_stall_event;        // Bubble behind a CSR write
+  logic branch_flush_event;     // Branch mispredict flush
+
   // hazard ports
   modport hazard_unit (
     input   halt,             // Input from control unit
@@ -58,7 +67,13 @@ interface hazard_unit_if;
             f2dif_flush,      // Output to pipeline
             d2eif_flush,      // Output to pipeline
             e2mif_flush,      // Output to pipeline
-            m2wif_flush       // Output to pipeline
+            m2wif_flush,      // Output to pipeline
+            mem_stall_event,      // Output to performance counters
+            fetch_stall_event,    // Output to performance counters
+            load_use_event,       // Output to performance counters
+            muldiv_stall_event,   // Output to performance counters
+            csr_stall_event,      // Output to performance counters
+            branch_flush_event    // Output to performance counters
   );
   // control tb
   modport tb (
@@ -70,6 +85,12 @@ interface hazard_unit_if;
             d2eif_flush,
             e2mif_flush,
             m2wif_flush,
+            mem_stall_event,
+            fetch_stall_event,
+            load_use_event,
+            muldiv_stall_event,
+            csr_stall_event,
+            branch_flush_event,
     output  halt,
             dread, dwrite,
             branch_flush,
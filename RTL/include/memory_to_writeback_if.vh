@@ -15,11 +15,22 @@ interface memory_to_writeback_if;
 
   // Latched stuff
 
+  // Holds an instruction rather than a bubble
+  logic valid;
+
   /*******************/
   /* Program Counter */
   /*******************/
   word_t pc;
 
+`ifdef SIMULATOR
+  /***************/
+  /* Instruction */
+  /***************/
+  // Only carried for the retire trace
+  word_t inst;
+`endif
+
   /****************/
   /* Control Unit */
   /****************/
@@ -47,6 +58,11 @@ interface memory_to_writeback_if;
   /* MEMORY */
   /**********/
   word_t dload;
+`ifdef SIMULATOR
+  // The store, for the retire trace
+  logic [1:0] dwrite;
+  word_t dstore;
+`endif
 endinterface
 
 `endif // MEMORY_TO_WRITEBACK_IF_VH
@@ -0,0 +1,701 @@
+# RV32IM_Zicsr instruction set simulator used as the golden model for the core
+#
+# Every instruction word is decoded once into a small Python closure that is
+# cached by word address, and the run loop only dispatches through that cache.
+# Stores into a cached word throw the decoded closure away again so self
+# modifying code still works.
+#
+# The model follows the behaviour of the RTL rather than the full privileged
+# spec:
+#   - ebreak halts the core, and nothing else does: a jump to itself loops
+#     like on the core until the step limit
+#   - ecall is a NOP
+#   - anything control_unit flags as illegal (fence included) traps to the
+#     mtvec base with mcause = 2 and mepc = the pc of the instruction
+#   - only the CSRs implemented in csr.sv exist, others read 0 and ignore writes
+#   - the cycle, instret and event counters depend on the pipeline's timing
+#     and aren't modelled: reading one stops the model without halting, so a
+#     test that reads them fails instead of comparing a 0 against the core
+#   - the memory map follows ahb_multiplexor: RAM, the UART, and a default
+#     satellite that reads 0 everywhere else
+#   - the SIMULATOR build's console is there too: a byte stored to its TXDR
+#     is printed, and a store to its EXIT halts on the store itself (it
+#     doesn't retire) with that exit status
+
+import os
+import sys
+import argparse
+from struct import Struct
+
+from memimage import DEFAULT_MEM_SIZE, load_program, load_vivado_mem, write_dump
+
+MASK = 0xFFFFFFFF
+
+# Memory map (see ahb_multiplexor.sv)
+UART_BASE = 0x00020000
+UART_END = 0x00020010
+SIM_CONSOLE_TXDR = 0x00020010
+SIM_CONSOLE_EXIT = 0x00020014
+
+# CSR addresses (see common_types.vh)
+MSTATUS = 0x300
+MSTATUSH = 0x310
+MTVEC = 0x305
+MIP = 0x344
+MIE = 0x304
+MEPC = 0x341
+MCAUSE = 0x342
+MSCRATCH = 0x340
+
+# Counters csr.sv implements: mcycle, minstret and the HPM_EVENTS event
+# counters from mhpmcounter3 (see common_types.vh), their high halves and
+# the user read-only copies
+HPM_EVENTS = 6
+COUNTER_CSRS = frozenset(base + offset for base in (0xB00, 0xB80, 0xC00, 0xC80)
+                         for offset in [0, 2] + list(range(3, 3 + HPM_EVENTS)))
+
+# Exception causes
+CAUSE_ILLEGAL_INST = 2
+
+# mstatus bits
+MSTATUS_MIE = 1 << 3
+MSTATUS_MPIE = 1 << 7
+
+WORD = Struct('<I')
+HALF = Struct('<H')
+
+# Retire trace record, same layout system_tb writes (see tracecmp.py)
+TRACE_RECORD = Struct('<6I')
+
+# Opcodes that write rd
+RD_OPCODES = (0x33, 0x13, 0x03, 0x6F, 0x67, 0x37, 0x17)
+
+class HaltError(Exception):
+    pass
+
+# Something the model doesn't cover, it stops without halting
+class UnmodelledError(Exception):
+    pass
+
+def sext(value, bits):
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+def signed(value):
+    return (value ^ 0x80000000) - 0x80000000
+
+class ISS:
+    def __init__(self, image, mem_size=DEFAULT_MEM_SIZE, pc=0, console=False):
+        self.mem = bytearray(mem_size)
+        self.mem[:len(image)] = image
+        self.mem_size = mem_size
+
+        # x0-x31 plus a scratch slot that rd=x0 writes go to
+        self.regs = [0] * 33
+        self.pc = pc
+
+        self.csrs = {
+            MSTATUS: 0,
+            MSTATUSH: 0,
+            MTVEC: 0x8000,  # Same reset value as csr.sv
+            MIP: 0,
+            MIE: 0,
+            MEPC: 0,
+            MCAUSE: 0,
+            MSCRATCH: 0,
+        }
+
+        # UART state
+        self.uart_cfgr = 0
+        self.uart_txdr = 0
+        self.uart_tx_busy = False
+        self.uart_tx_done = False
+        self.console = console
+        self.uart_output = bytearray()
+        self.sim_console_output = bytearray()
+        self.exit_code = None
+
+        # Decoded instruction cache, one slot per RAM word
+        self.cache = [None] * (mem_size // 4)
+        # What the retire trace needs to know about each cached instruction
+        self.trace_info = [None] * (mem_size // 4)
+
+        self.instret = 0
+        self.halted = False
+        self.halt_reason = None
+
+    #########################
+    # Memory mapped devices #
+    #########################
+
+    def io_load(self, addr):
+        if UART_BASE <= addr < UART_END:
+            offset = addr - UART_BASE
+            if offset == 0x0:
+                return self.uart_cfgr
+            elif offset == 0x4:
+                return self.uart_txdr
+            elif offset == 0xC:
+                # The transmitter reads busy once after each write then done,
+                # which is all the polling loops in the Code/ programs look at
+                status = (self.uart_tx_done << 1) | self.uart_tx_busy
+                if self.uart_tx_busy:
+                    self.uart_tx_busy = False
+                    self.uart_tx_done = True
+                return status
+        return 0
+
+    def io_store(self, addr, value, wmask):
+        if UART_BASE <= addr < UART_END:
+            offset = addr - UART_BASE
+            if offset == 0x0:
+                self.uart_cfgr = value & 0xFFFF
+            elif offset == 0x4:
+                self.uart_txdr = value & 0xFF
+                self.uart_tx_busy = True
+                self.uart_tx_done = False
+                self.uart_output.append(self.uart_txdr)
+                if self.console:
+                    sys.stdout.write(chr(self.uart_txdr))
+                    sys.stdout.flush()
+            elif offset == 0xC:
+                if value & 0x2:
+                    self.uart_tx_done = False
+        elif addr == SIM_CONSOLE_TXDR:
+            self.sim_console_output.append(value & 0xFF)
+            if self.console:
+                sys.stdout.write(chr(value & 0xFF))
+                sys.stdout.flush()
+        elif addr == SIM_CONSOLE_EXIT:
+            # The testbench stops the core as soon as the store reaches the
+            # console, before it retires, so the model halts on the store
+            # itself and leaves it out of the trace
+            self.exit_code = sext(value, 32)
+            raise HaltError("exit {}".format(self.exit_code))
+
+    ########
+    # CSRs #
+    ########
+
+    def csr_read(self, csr):
+        return self.csrs.get(csr, 0)
+
+    def csr_write(self, csr, value):
+        if csr in self.csrs:
+            self.csrs[csr] = value & MASK
+
+    def trap(self, pc, cause):
+        csrs = self.csrs
+        mstatus = csrs[MSTATUS]
+        mstatus = (mstatus & ~MSTATUS_MPIE) | (MSTATUS_MPIE if mstatus & MSTATUS_MIE else 0)
+        csrs[MSTATUS] = mstatus & ~MSTATUS_MIE
+        csrs[MCAUSE] = cause
+        # mepc holds the instruction that trapped, like exception_unit
+        csrs[MEPC] = pc
+        # Exceptions always go to the base, even in vectored mode
+        return csrs[MTVEC] & ~0x3
+
+    def illegal(self, pc):
+        return self.trap(pc, CAUSE_ILLEGAL_INST)
+
+    def mret(self):
+        csrs = self.csrs
+        mstatus = csrs[MSTATUS]
+        mstatus = (mstatus & ~MSTATUS_MIE) | (MSTATUS_MIE if mstatus & MSTATUS_MPIE else 0)
+        csrs[MSTATUS] = mstatus | MSTATUS_MPIE
+        return csrs[MEPC]
+
+    ##########
+    # Decode #
+    ##########
+
+    def decode(self, inst):
+        regs = self.regs
+        mem = self.mem
+        cache = self.cache
+        ram_size = self.mem_size
+        io_load = self.io_load
+        io_store = self.io_store
+        unpack_word = WORD.unpack_from
+        unpack_half = HALF.unpack_from
+        pack_word = WORD.pack_into
+        pack_half = HALF.pack_into
+
+        opcode = inst & 0x7F
+        rd = (inst >> 7) & 0x1F
+        funct3 = (inst >> 12) & 0x7
+        rs1 = (inst >> 15) & 0x1F
+        rs2 = (inst >> 20) & 0x1F
+        funct7 = inst >> 25
+        imm_i = sext(inst >> 20, 12)
+        imm_s = sext(((inst >> 25) << 5) | ((inst >> 7) & 0x1F), 12)
+        imm_b = sext(((inst >> 31) << 12) | (((inst >> 7) & 0x1) << 11) | (((inst >> 25) & 0x3F) << 5) | (((inst >> 8) & 0xF) << 1), 13)
+        imm_u = inst & 0xFFFFF000
+        imm_j = sext(((inst >> 31) << 20) | (((inst >> 12) & 0xFF) << 12) | (((inst >> 20) & 0x1) << 11) | (((inst >> 21) & 0x3FF) << 1), 21)
+
+        # Writes to x0 land in the scratch slot
+        if rd == 0:
+            rd = 32
+
+        illegal = self.illegal
+
+        if opcode == 0x33:
+            # R-type
+            op = (funct3, funct7)
+            if op == (0, 0x00):
+                def fn(pc):
+                    regs[rd] = (regs[rs1] + regs[rs2]) & MASK
+                    return pc + 4
+            elif op == (0, 0x20):
+                def fn(pc):
+                    regs[rd] = (regs[rs1] - regs[rs2]) & MASK
+                    return pc + 4
+            elif op == (1, 0x00):
+                def fn(pc):
+                    regs[rd] = (regs[rs1] << (regs[rs2] & 0x1F)) & MASK
+                    return pc + 4
+            elif op == (5, 0x00):
+                def fn(pc):
+                    regs[rd] = regs[rs1] >> (regs[rs2] & 0x1F)
+                    return pc + 4
+            elif op == (5, 0x20):
+                def fn(pc):
+                    regs[rd] = (signed(regs[rs1]) >> (regs[rs2] & 0x1F)) & MASK
+                    return pc + 4
+            elif op == (7, 0x00):
+                def fn(pc):
+                    regs[rd] = regs[rs1] & regs[rs2]
+                    return pc + 4
+            elif op == (6, 0x00):
+                def fn(pc):
+                    regs[rd] = regs[rs1] | regs[rs2]
+                    return pc + 4
+            elif op == (4, 0x00):
+                def fn(pc):
+                    regs[rd] = regs[rs1] ^ regs[rs2]
+                    return pc + 4
+            elif op == (2, 0x00):
+                def fn(pc):
+                    regs[rd] = 1 if signed(regs[rs1]) < signed(regs[rs2]) else 0
+                    return pc + 4
+            elif op == (3, 0x00):
+                def fn(pc):
+                    regs[rd] = 1 if regs[rs1] < regs[rs2] else 0
+                    return pc + 4
+            elif op == (0, 0x01):
+                # MUL
+                def fn(pc):
+                    regs[rd] = (regs[rs1] * regs[rs2]) & MASK
+                    return pc + 4
+            elif op == (1, 0x01):
+                # MULH
+                def fn(pc):
+                    regs[rd] = ((signed(regs[rs1]) * signed(regs[rs2])) >> 32) & MASK
+                    return pc + 4
+            elif op == (2, 0x01):
+                # MULHSU
+                def fn(pc):
+                    regs[rd] = ((signed(regs[rs1]) * regs[rs2]) >> 32) & MASK
+                    return pc + 4
+            elif op == (3, 0x01):
+                # MULHU
+                def fn(pc):
+                    regs[rd] = ((regs[rs1] * regs[rs2]) >> 32) & MASK
+                    return pc + 4
+            elif op == (4, 0x01):
+                # DIV
+                def fn(pc):
+                    a = signed(regs[rs1])
+                    b = signed(regs[rs2])
+                    if b == 0:
+                        regs[rd] = MASK
+                    elif a == -0x80000000 and b == -1:
+                        regs[rd] = 0x80000000
+                    else:
+                        q = abs(a) // abs(b)
+                        regs[rd] = (-q if (a < 0) != (b < 0) else q) & MASK
+                    return pc + 4
+            elif op == (5, 0x01):
+                # DIVU
+                def fn(pc):
+                    b = regs[rs2]
+                    regs[rd] = regs[rs1] // b if b else MASK
+                    return pc + 4
+            elif op == (6, 0x01):
+                # REM
+                def fn(pc):
+                    a = signed(regs[rs1])
+                    b = signed(regs[rs2])
+                    if b == 0:
+                        regs[rd] = a & MASK
+                    elif a == -0x80000000 and b == -1:
+                        regs[rd] = 0
+                    else:
+                        r = abs(a) % abs(b)
+                        regs[rd] = (-r if a < 0 else r) & MASK
+                    return pc + 4
+            elif op == (7, 0x01):
+                # REMU
+                def fn(pc):
+                    b = regs[rs2]
+                    regs[rd] = regs[rs1] % b if b else regs[rs1]
+                    return pc + 4
+            else:
+                fn = illegal
+
+        elif opcode == 0x13:
+            # I-type ALU
+            imm = imm_i & MASK
+            shamt = rs2
+            if funct3 == 0:
+                def fn(pc):
+                    regs[rd] = (regs[rs1] + imm) & MASK
+                    return pc + 4
+            elif funct3 == 4:
+                def fn(pc):
+                    regs[rd] = regs[rs1] ^ imm
+                    return pc + 4
+            elif funct3 == 6:
+                def fn(pc):
+                    regs[rd] = regs[rs1] | imm
+                    return pc + 4
+            elif funct3 == 7:
+                def fn(pc):
+                    regs[rd] = regs[rs1] & imm
+                    return pc + 4
+            elif funct3 == 1:
+                def fn(pc):
+                    regs[rd] = (regs[rs1] << shamt) & MASK
+                    return pc + 4
+            elif funct3 == 5 and inst & (1 << 30):
+                def fn(pc):
+                    regs[rd] = (signed(regs[rs1]) >> shamt) & MASK
+                    return pc + 4
+            elif funct3 == 5:
+                def fn(pc):
+                    regs[rd] = regs[rs1] >> shamt
+                    return pc + 4
+            elif funct3 == 2:
+                def fn(pc):
+                    regs[rd] = 1 if signed(regs[rs1]) < imm_i else 0
+                    return pc + 4
+            else:
+                def fn(pc):
+                    regs[rd] = 1 if regs[rs1] < imm else 0
+                    return pc + 4
+
+        elif opcode == 0x03:
+            # Loads, the RAM ignores the low address bits below the access size
+            if funct3 == 2:
+                def fn(pc):
+                    addr = (regs[rs1] + imm_i) & MASK
+                    regs[rd] = unpack_word(mem, addr & ~0x3)[0] if addr < ram_size else io_load(addr & ~0x3)
+                    return pc + 4
+            elif funct3 in (1, 5):
+                is_signed = funct3 == 1
+                def fn(pc):
+                    addr = (regs[rs1] + imm_i) & MASK
+                    if addr < ram_size:
+                        value = unpack_half(mem, addr & ~0x1)[0]
+                    else:
+                        value = (io_load(addr & ~0x3) >> ((addr & 0x2) * 8)) & 0xFFFF
+                    regs[rd] = (sext(value, 16) & MASK) if is_signed else value
+                    return pc + 4
+            elif funct3 in (0, 4):
+                is_signed = funct3 == 0
+                def fn(pc):
+                    addr = (regs[rs1] + imm_i) & MASK
+                    if addr < ram_size:
+                        value = mem[addr]
+                    else:
+                        value = (io_load(addr & ~0x3) >> ((addr & 0x3) * 8)) & 0xFF
+                    regs[rd] = (sext(value, 8) & MASK) if is_signed else value
+                    return pc + 4
+            else:
+                fn = illegal
+
+        elif opcode == 0x23:
+            # Stores
+            if funct3 == 2:
+                def fn(pc):
+                    addr = ((regs[rs1] + imm_s) & MASK) & ~0x3
+                    if addr < ram_size:
+                        pack_word(mem, addr, regs[rs2])
+                        cache[addr >> 2] = None
+                    else:
+                        io_store(addr, regs[rs2], 0xF)
+                    return pc + 4
+            elif funct3 == 1:
+                def fn(pc):
+                    addr = ((regs[rs1] + imm_s) & MASK) & ~0x1
+                    if addr < ram_size:
+                        pack_half(mem, addr, regs[rs2] & 0xFFFF)
+                        cache[addr >> 2] = None
+                    else:
+                        shift = (addr & 0x2) * 8
+                        io_store(addr & ~0x3, (regs[rs2] & 0xFFFF) << shift, 0x3 << (addr & 0x2))
+                    return pc + 4
+            elif funct3 == 0:
+                def fn(pc):
+                    addr = (regs[rs1] + imm_s) & MASK
+                    if addr < ram_size:
+                        mem[addr] = regs[rs2] & 0xFF
+                        cache[addr >> 2] = None
+                    else:
+                        shift = (addr & 0x3) * 8
+                        io_store(addr & ~0x3, (regs[rs2] & 0xFF) << shift, 0x1 << (addr & 0x3))
+                    return pc + 4
+            else:
+                fn = illegal
+
+        elif opcode == 0x63:
+            # Branches
+            if funct3 == 0:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if regs[rs1] == regs[rs2] else pc + 4
+            elif funct3 == 1:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if regs[rs1] != regs[rs2] else pc + 4
+            elif funct3 == 4:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if signed(regs[rs1]) < signed(regs[rs2]) else pc + 4
+            elif funct3 == 5:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if signed(regs[rs1]) >= signed(regs[rs2]) else pc + 4
+            elif funct3 == 6:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if regs[rs1] < regs[rs2] else pc + 4
+            elif funct3 == 7:
+                def fn(pc):
+                    return (pc + imm_b) & MASK if regs[rs1] >= regs[rs2] else pc + 4
+            else:
+                fn = illegal
+
+        elif opcode == 0x6F:
+            # JAL
+            def fn(pc):
+                regs[rd] = (pc + 4) & MASK
+                return (pc + imm_j) & MASK
+
+        elif opcode == 0x67:
+            # JALR
+            def fn(pc):
+                target = (regs[rs1] + imm_i) & MASK & ~0x1
+                regs[rd] = (pc + 4) & MASK
+                return target
+
+        elif opcode == 0x37:
+            # LUI
+            def fn(pc):
+                regs[rd] = imm_u
+                return pc + 4
+
+        elif opcode == 0x17:
+            # AUIPC
+            def fn(pc):
+                regs[rd] = (pc + imm_u) & MASK
+                return pc + 4
+
+        elif opcode == 0x73:
+            # System
+            csr = inst >> 20
+            if funct3 == 0:
+                if csr == 0x000:
+                    # ECALL does nothing on this core
+                    def fn(pc):
+                        return pc + 4
+                elif csr == 0x001:
+                    def fn(pc):
+                        raise HaltError("ebreak")
+                elif csr == 0x302:
+                    def fn(pc):
+                        return self.mret()
+                else:
+                    fn = illegal
+            elif funct3 in (1, 2, 3, 5, 6, 7) and csr in COUNTER_CSRS and rd != 32:
+                def fn(pc):
+                    raise UnmodelledError("read of counter CSR 0x{:03X} at pc 0x{:08X}".format(csr, pc))
+            elif funct3 in (1, 2, 3, 5, 6, 7):
+                # CSR instructions always write the CSR back, like the core does
+                use_imm = funct3 & 0x4
+                op = funct3 & 0x3
+                csr_read = self.csr_read
+                csr_write = self.csr_write
+                def fn(pc):
+                    old = csr_read(csr)
+                    src = rs1 if use_imm else regs[rs1]
+                    if op == 1:
+                        csr_write(csr, src)
+                    elif op == 2:
+                        csr_write(csr, old | src)
+                    else:
+                        csr_write(csr, old & ~src)
+                    regs[rd] = old
+                    return pc + 4
+            else:
+                fn = illegal
+
+        else:
+            fn = illegal
+
+        return fn
+
+    #######
+    # Run #
+    #######
+
+    def step_decode(self, pc):
+        if pc >= self.mem_size or pc & 0x3:
+            raise HaltError("pc 0x{:08X} outside of RAM".format(pc))
+        fn = self.decode(WORD.unpack_from(self.mem, pc)[0])
+        self.cache[pc >> 2] = fn
+        return fn
+
+    # (inst, rd, store funct3 or None, rs1, rs2, store offset, traps) for the
+    # retire trace, rd is 0 when the instruction doesn't write a register
+    def decode_trace_info(self, pc, fn):
+        inst = WORD.unpack_from(self.mem, pc)[0]
+        opcode = inst & 0x7F
+        funct3 = (inst >> 12) & 0x7
+        writes_rd = opcode in RD_OPCODES or (opcode == 0x73 and funct3 != 0)
+        rd = (inst >> 7) & 0x1F if writes_rd else 0
+        store = funct3 if opcode == 0x23 else None
+        imm_s = sext(((inst >> 25) << 5) | ((inst >> 7) & 0x1F), 12)
+        info = (inst, rd, store, (inst >> 15) & 0x1F, (inst >> 20) & 0x1F, imm_s, fn == self.illegal)
+        self.trace_info[pc >> 2] = info
+        return info
+
+    # Same as run() but writes a retire record for every instruction that
+    # completes. Instructions that trap and the halting one are not recorded,
+    # the core never retires those either.
+    def run_traced(self, trace_file, max_steps=None):
+        cache = self.cache
+        trace_info = self.trace_info
+        regs = self.regs
+        step_decode = self.step_decode
+        decode_trace_info = self.decode_trace_info
+        pack = TRACE_RECORD.pack
+        write = trace_file.write
+        pc = self.pc
+        steps = 0
+        limit = -1 if max_steps is None else max_steps
+
+        try:
+            while steps != limit:
+                fn = cache[pc >> 2]
+                if fn is None:
+                    fn = step_decode(pc)
+                    info = decode_trace_info(pc, fn)
+                else:
+                    info = trace_info[pc >> 2]
+                inst, rd, store, rs1, rs2, imm_s, traps = info
+
+                if store is not None:
+                    addr = (regs[rs1] + imm_s) & MASK
+                    data = regs[rs2]
+
+                next_pc = fn(pc)
+                steps += 1
+
+                if not traps:
+                    wstrb = 0
+                    maddr = 0
+                    mdata = 0
+                    if store == 0:
+                        shift = addr & 0x3
+                        wstrb = 0x1 << shift
+                        mdata = (data & 0xFF) << (shift * 8)
+                    elif store == 1:
+                        shift = addr & 0x2
+                        wstrb = 0x3 << shift
+                        mdata = (data & 0xFFFF) << (shift * 8)
+                    elif store == 2:
+                        wstrb = 0xF
+                        mdata = data
+                    if wstrb:
+                        maddr = addr & ~0x3
+                    write(pack(pc, inst, rd | (wstrb << 8), regs[rd] if rd else 0, maddr, mdata))
+
+                pc = next_pc
+            self.halt_reason = "limit"
+        except IndexError:
+            # Fetch past the end of the decode cache, the core wouldn't halt
+            # there either, so emulate reports it like an UnmodelledError
+            self.halt_reason = "pc 0x{:08X} outside of RAM".format(pc)
+        except HaltError as e:
+            self.halted = True
+            self.halt_reason = str(e)
+        except UnmodelledError as e:
+            self.halt_reason = str(e)
+
+        self.pc = pc
+        self.instret += steps
+        return self.halt_reason
+
+    def run(self, max_steps=None):
+        cache = self.cache
+        step_decode = self.step_decode
+        pc = self.pc
+        steps = 0
+        limit = -1 if max_steps is None else max_steps
+
+        try:
+            while steps != limit:
+                fn = cache[pc >> 2]
+                if fn is None:
+                    fn = step_decode(pc)
+                pc = fn(pc)
+                steps += 1
+            self.halt_reason = "limit"
+        except IndexError:
+            # Fetch past the end of the decode cache, the core wouldn't halt
+            # there either, so emulate reports it like an UnmodelledError
+            self.halt_reason = "pc 0x{:08X} outside of RAM".format(pc)
+        except HaltError as e:
+            self.halted = True
+            self.halt_reason = str(e)
+        except UnmodelledError as e:
+            self.halt_reason = str(e)
+
+        self.pc = pc
+        self.instret += steps
+        return self.halt_reason
+
+def load_image(file_path, mem_size=DEFAULT_MEM_SIZE):
+    if file_path.endswith(".mem"):
+        return load_vivado_mem(file_path, mem_size)
+    return load_program(file_path, mem_size)
+
+# Run a program image to completion and write the memory dump testasm.py
+# compares against the RTL (.hex, .bin or .pages like system_tb), and
+# optionally the retire trace
+def run_program(file_path, dump_path="memsim.hex", max_steps=None, console=False, trace_path=None):
+    return run_image(load_image(file_path), dump_path, max_steps, console, trace_path)
+
+# The same for an image already in memory
+def run_image(image, dump_path="memsim.hex", max_steps=None, console=False, trace_path=None):
+    iss = ISS(image, console=console)
+    if trace_path is not None:
+        with open(trace_path, 'wb') as trace_file:
+            iss.run_traced(trace_file, max_steps)
+    else:
+        iss.run(max_steps)
+    if dump_path is not None:
+        write_dump(iss.mem, dump_path)
+    return iss
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a program image on the RV32IM_Zicsr golden model")
+    parser.add_argument("image", help="Program image (.elf, .hex Intel HEX or .mem Vivado memory file)")
+    parser.add_argument("-o", "--output", default="memsim.hex", help="Memory dump output, .hex, .bin or .pages (default: memsim.hex)")
+    parser.add_argument("-n", "--max-steps", type=int, default=None, help="Stop after this many instructions")
+    parser.add_argument("-c", "--console", action="store_true", help="Echo UART and simulation console output to stdout")
+    parser.add_argument("-t", "--trace", default=None, help="Write the retire trace to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.image):
+        print("Image file \"{}\" does not exist".format(args.image))
+        sys.exit(1)
+
+    iss = run_program(args.image, args.output, args.max_steps, args.console, args.trace)
+    print("Stopped on {} after {} instructions at pc 0x{:08X}".format(iss.halt_reason, iss.instret, iss.pc))
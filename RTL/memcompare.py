@@ -0,0 +1,108 @@
+# Compare two RAM dumps (the golden model's memsim.hex against the CPU's
+# ramcpu.hex) as word arrays and report the differing address ranges, with the
+# section of the program each range falls in.
+
+import os
+import sys
+import argparse
+import numpy as np
+
+from ramdump import load_dump
+from elf32 import ELF32
+
+# Words listed per differing range before the rest are summarised
+MAX_WORDS_PER_RANGE = 8
+
+# The Code/ linker script reserves this much for the stack below __stack
+DEFAULT_STACK_SIZE = 4096
+
+# Start and end (exclusive) word indices of each run of differing words
+def diff_ranges(expected, actual):
+    differ = np.flatnonzero(expected != actual)
+    if differ.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(differ) != 1)
+    starts = np.concatenate(([differ[0]], differ[breaks + 1]))
+    ends = np.concatenate((differ[breaks], [differ[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+# (start, end, name) address regions of the program, from its ELF
+def program_regions(elf_path):
+    elf = ELF32(elf_path)
+    regions = [(x.addr, x.addr + x.size, x.name) for x in elf.alloc_sections()]
+
+    # The stack grows down from __stack, which is past the end of the sections
+    stack = elf.symbol("__stack")
+    if stack is not None:
+        reserved = elf.section(".stack")
+        size = reserved.size if reserved is not None else DEFAULT_STACK_SIZE
+        regions.append((stack.value - size, stack.value, "stack"))
+
+    return regions
+
+def region_names(start, end, regions):
+    names = [name for r_start, r_end, name in regions if r_start < end and start < r_end]
+    return ", ".join(names) if names else "unmapped"
+
+def format_report(expected, actual, ranges, regions=(), expected_words=None, actual_words=None):
+    lines = []
+    # A dump that is shorter than the other one is missing its tail
+    if expected_words is not None and expected_words != actual_words:
+        start, end = sorted((expected_words, actual_words))
+        lines.append("expected {} word(s), actual {} word(s)".format(expected_words, actual_words))
+        lines.append("0x{:08X}-0x{:08X} ({}, {} word(s)) missing from the {} dump".format(
+            start * 4, end * 4 - 1, region_names(start * 4, end * 4, regions), end - start,
+            "actual" if actual_words < expected_words else "expected"))
+    if ranges:
+        num_words = sum(end - start for start, end in ranges)
+        lines.append("{} differing word(s) in {} range(s)".format(num_words, len(ranges)))
+
+    for start, end in ranges:
+        lines.append("0x{:08X}-0x{:08X} ({}, {} word(s))".format(start * 4, end * 4 - 1, region_names(start * 4, end * 4, regions), end - start))
+        for idx in range(start, min(end, start + MAX_WORDS_PER_RANGE)):
+            lines.append("    0x{:08X}: expected {:08X} actual {:08X}".format(idx * 4, int(expected[idx]), int(actual[idx])))
+        if end - start > MAX_WORDS_PER_RANGE:
+            lines.append("    ... {} more".format(end - start - MAX_WORDS_PER_RANGE))
+
+    return '\n'.join(lines)
+
+# Compare expected and actual dumps, in any of the formats ramdump.py reads
+# (dumps of different lengths don't match, the words both hold are compared
+# as well). Returns (match, report), the report is empty when they match.
+# With elf_path the ranges are labelled with the section they fall in, with
+# log_file the report is written there too.
+def compare_dumps(expected_path, actual_path, elf_path=None, log_file=None):
+    expected = load_dump(expected_path)
+    actual = load_dump(actual_path)
+    expected_words = len(expected)
+    actual_words = len(actual)
+    num_words = min(expected_words, actual_words)
+    expected = expected[:num_words]
+    actual = actual[:num_words]
+    ranges = diff_ranges(expected, actual)
+    match = not ranges and expected_words == actual_words
+
+    report = ""
+    if not match:
+        regions = program_regions(elf_path) if elf_path is not None and os.path.exists(elf_path) else ()
+        report = format_report(expected, actual, ranges, regions, expected_words, actual_words)
+
+    if log_file is not None:
+        with open(log_file, 'w') as file:
+            file.write(report)
+
+    return match, report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two RAM dumps and report the differing ranges")
+    parser.add_argument("expected", help="Expected dump (e.g. memsim.hex)")
+    parser.add_argument("actual", help="Actual dump (e.g. ramcpu.hex)")
+    parser.add_argument("-e", "--elf", default=None, help="ELF of the program, to name the sections the ranges fall in")
+    args = parser.parse_args()
+
+    match, report = compare_dumps(args.expected, args.actual, args.elf)
+    if match:
+        print("Memory matches.")
+    else:
+        print(report)
+        sys.exit(1)
@@ -0,0 +1,228 @@
+# Memory image conversion shared by the RTL and Code build scripts
+#
+# A linked ELF (or an Intel HEX file) is loaded into a byte buffer the size of
+# the RAM, which is then written out in one go as a Vivado .mem file (one
+# big-endian word per line), Intel HEX, a raw little-endian binary, or a
+# sparse @address file of the nonzero words.
+
+import os
+import sys
+import argparse
+from array import array
+
+from elf32 import ELF32
+
+# 32768 words, same as RAM_SIZE in source/ram.sv
+DEFAULT_MEM_SIZE = 32768 * 4
+
+def load_intel_hex(file_path, mem_size=DEFAULT_MEM_SIZE, image=None):
+    if image is None:
+        image = bytearray(mem_size)
+
+    # Base address from extended segment (02) / linear (04) address records
+    base_addr = 0x0
+
+    with open(file_path, 'r') as file:
+        for line_num, line in enumerate(file, 1):
+            if not line.startswith(':'):
+                continue
+
+            record = bytes.fromhex(line[1:].strip())
+            if sum(record) & 0xFF != 0:
+                raise ValueError("{}:{}: bad checksum".format(file_path, line_num))
+
+            data_size = record[0]
+            record_addr = (record[1] << 8) | record[2]
+            record_type = record[3]
+            data = record[4:4 + data_size]
+
+            if record_type == 0:
+                # Data record
+                addr = base_addr + record_addr
+                if addr + data_size > len(image):
+                    raise ValueError("{}:{}: address 0x{:08X} is outside of the {} byte memory".format(file_path, line_num, addr, len(image)))
+                image[addr:addr + data_size] = data
+            elif record_type == 1:
+                # End of file
+                break
+            elif record_type == 2:
+                # Extended segment address record
+                base_addr = int.from_bytes(data, 'big') << 4
+            elif record_type == 4:
+                # Extended linear address record
+                base_addr = int.from_bytes(data, 'big') << 16
+            # Start address records (03, 05) don't touch memory
+
+    return image
+
+# Load the segments of an ELF straight into an image, .bss zeroed
+def load_elf(file_path, mem_size=DEFAULT_MEM_SIZE, image=None):
+    return ELF32(file_path).load_image(mem_size, image)
+
+# Read a Vivado .mem file (one big-endian hex word per line) back into an image
+def load_vivado_mem(file_path, mem_size=DEFAULT_MEM_SIZE, image=None):
+    if image is None:
+        image = bytearray(mem_size)
+
+    with open(file_path, 'r') as file:
+        words = array('I', bytes.fromhex(file.read()))
+    if sys.byteorder == 'little':
+        words.byteswap()
+
+    data = words.tobytes()
+    if len(data) > len(image):
+        raise ValueError("{} holds {} bytes, more than the {} byte memory".format(file_path, len(data), len(image)))
+    image[:len(data)] = data
+
+    return image
+
+# View the image as 32-bit words with the byte order of the RAM (little-endian)
+def image_to_words(image):
+    if len(image) % 4 != 0:
+        raise ValueError("Memory image size must be a multiple of 4 bytes")
+    words = array('I', bytes(image))
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words
+
+# Vivado .mem text: one big-endian hex word per line
+def format_vivado_mem(image):
+    words = image_to_words(image)
+    words.byteswap()
+    return words.tobytes().hex('\n', 4).upper()
+
+# Sparse .mem text: runs of nonzero words, each preceded by its @byte address
+def format_sparse_mem(image):
+    words = image_to_words(image)
+    lines = []
+    run_start = None
+    for idx in range(len(words) + 1):
+        nonzero = idx < len(words) and words[idx] != 0
+        if nonzero and run_start is None:
+            run_start = idx
+        elif not nonzero and run_start is not None:
+            lines.append("@{:08X}".format(run_start*4))
+            lines.append(' '.join("{:08X}".format(w) for w in words[run_start:idx]))
+            run_start = None
+    return '\n'.join(lines)
+
+# RAM dump in the Intel HEX flavour written by dump_memory() in system_tb:
+# one record per nonzero word, data as a big-endian word, 16-bit address
+def format_ram_dump(image, num_words=16384):
+    words = image_to_words(image)
+    lines = []
+    for idx in range(min(num_words, len(words))):
+        word = words[idx]
+        if word != 0:
+            addr = (idx << 2) & 0xFFFF
+            chksum = (0x04 + (addr >> 8) + (addr & 0xFF) + (word >> 24) + ((word >> 16) & 0xFF) + ((word >> 8) & 0xFF) + (word & 0xFF)) & 0xFF
+            lines.append(":04{:04X}00{:08X}{:02X}\n".format(addr, word, (0x100 - chksum) & 0xFF))
+    lines.append(":00000001FF\n")
+    return ''.join(lines)
+
+def write_ram_dump(image, file_path, num_words=16384):
+    with open(file_path, 'w') as file:
+        file.write(format_ram_dump(image, num_words))
+
+# Nonzero pages of the image, each as its little-endian byte address followed
+# by its words, the same layout dump_image in source/ram.sv writes
+RAM_PAGE_SIZE = 256 * 4
+
+def format_ram_pages(image):
+    pages = []
+    zero_page = bytes(RAM_PAGE_SIZE)
+    for addr in range(0, len(image), RAM_PAGE_SIZE):
+        page = bytes(image[addr:addr + RAM_PAGE_SIZE])
+        if page != zero_page[:len(page)]:
+            pages.append(addr.to_bytes(4, 'little') + page)
+    return b''.join(pages)
+
+def write_ram_pages(image, file_path):
+    with open(file_path, 'wb') as file:
+        file.write(format_ram_pages(image))
+
+# Intel HEX of the nonzero 16 byte rows of the image, what iss.py and
+# objcopy -O ihex read and write
+def format_intel_hex(image):
+    lines = []
+    zero_row = bytes(16)
+    base_addr = None
+    for addr in range(0, len(image), 16):
+        row = bytes(image[addr:addr + 16])
+        if row == zero_row[:len(row)]:
+            continue
+        if addr >> 16 != base_addr:
+            base_addr = addr >> 16
+            record = bytes([2, 0, 0, 4]) + base_addr.to_bytes(2, 'big')
+            lines.append(":{}{:02X}\n".format(record.hex().upper(), -sum(record) & 0xFF))
+        record = bytes([len(row), (addr >> 8) & 0xFF, addr & 0xFF, 0]) + row
+        lines.append(":{}{:02X}\n".format(record.hex().upper(), -sum(record) & 0xFF))
+    lines.append(":00000001FF\n")
+    return ''.join(lines)
+
+def write_intel_hex(image, file_path):
+    with open(file_path, 'w') as file:
+        file.write(format_intel_hex(image))
+
+def write_vivado_mem(image, file_path):
+    with open(file_path, 'w') as file:
+        file.write(format_vivado_mem(image))
+
+def write_sparse_mem(image, file_path):
+    with open(file_path, 'w') as file:
+        file.write(format_sparse_mem(image))
+
+def write_binary(image, file_path):
+    with open(file_path, 'wb') as file:
+        file.write(image)
+
+WRITERS = {
+    "mem": write_vivado_mem,
+    "sparse": write_sparse_mem,
+    "bin": write_binary,
+    "hex": write_intel_hex,
+}
+
+# RAM dump writers by file extension, matching what system_tb picks
+DUMP_WRITERS = {
+    ".hex": write_ram_dump,
+    ".bin": write_binary,
+    ".pages": write_ram_pages,
+}
+
+def write_dump(image, file_path):
+    ext = os.path.splitext(file_path)[1]
+    DUMP_WRITERS.get(ext, write_ram_dump)(image, file_path)
+
+# Program images by extension: .elf (or .o) as linked, anything else Intel HEX
+def load_program(file_path, mem_size=DEFAULT_MEM_SIZE):
+    if os.path.splitext(file_path)[1] in (".elf", ".o"):
+        return load_elf(file_path, mem_size)
+    return load_intel_hex(file_path, mem_size)
+
+def format_from_extension(file_path):
+    ext = os.path.splitext(file_path)[1][1:]
+    return ext if ext in WRITERS else "mem"
+
+# Write the image to every output, each in the format of its extension
+# (.mem, .hex, .bin, .sparse), or of fmt when given
+def write_images(image, out_paths, fmt=None):
+    for out_path in out_paths:
+        WRITERS[fmt or format_from_extension(out_path)](image, out_path)
+
+def convert_intel_hex(file_path, out_path, fmt="mem", mem_size=DEFAULT_MEM_SIZE):
+    image = load_intel_hex(file_path, mem_size)
+    WRITERS[fmt](image, out_path)
+    return image
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an ELF or Intel HEX file to memory images")
+    parser.add_argument("in_file", help="Linked ELF (.elf) or Intel HEX input file")
+    parser.add_argument("out_files", nargs='+', help="Memory image output files, all written from one load")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), default=None,
+                        help="Output format (default: from each output file extension, else mem)")
+    parser.add_argument("-s", "--size", type=lambda x: int(x, 0), default=DEFAULT_MEM_SIZE,
+                        help="Memory size in bytes (default: {})".format(DEFAULT_MEM_SIZE))
+    args = parser.parse_args()
+
+    write_images(load_program(args.in_file, args.size), args.out_files, args.format)
@@ -0,0 +1,261 @@
+# Estimate how many cycles programs would take with slower memory, split
+# instruction/data ports or I and D caches, from their retire traces, to size
+# the memory system before writing RTL.
+#
+# The fetch stream is the pc of every retired instruction and the data stream
+# the stores' addresses from the trace plus the loads', which the trace
+# doesn't hold but follow from the register values it does. Each instruction
+# is charged:
+#   single  the current RAM: the fetch and any data access share the one
+#           port, one transfer after the other
+#   split   separate instruction and data ports, the slower of the two
+#   cache   one cycle on a hit, plus a line fill from the single port RAM on
+#           a miss (and a line write back when a dirty line is evicted)
+# where a transfer from the RAM takes LAT + BUS_CYCLES cycles (ram.sv's count
+# FSM and the AHB-Lite data phase) and every further word of a line fill
+# BEAT_CYCLES more. Load-use bubbles and branch flushes (modelled with
+# bpexplore.py's model of branch_unit.sv) are the same in every setup and
+# added to all of them, multiplier and divider stalls are left out.
+
+import os
+import sys
+import argparse
+import tempfile
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from bpexplore import MISPREDICT_PENALTY, DEFAULT_BTB_BITS, DEFAULT_MAX_STEPS, Predictor, load_trace, find_traces, trace_image
+
+# Cycles of a RAM transfer at LAT 0
+BUS_CYCLES = 2
+# Cycles per further word of a burst
+BEAT_CYCLES = 1
+
+# Accesses from here up go to the UART and the default satellite, never cached
+IO_BASE = 0x00020000
+
+# Trace records converted to Python integers at a time
+CHUNK_RECORDS = 1 << 16
+
+# Opcodes reading rs1, and rs1 and rs2
+RS1_OPCODES = (0x13, 0x03, 0x67, 0x73)
+RS2_OPCODES = (0x33, 0x23, 0x63)
+
+# Per retired instruction: the data address (or -1 for none), whether it is a
+# store, plus the number of load-use bubbles of the whole trace
+def data_accesses(trace_path):
+    records = np.memmap(trace_path, dtype='<u4', mode='r')
+    records = records[:len(records) // 6 * 6].reshape(-1, 6)
+
+    regs = [0] * 32
+    addresses = np.full(len(records), -1, dtype=np.int64)
+    is_store = np.zeros(len(records), dtype=bool)
+    load_use = 0
+    last_load_rd = 0
+
+    for idx, (pc, inst, rd_wstrb, wdata, maddr, mdata) in enumerate(itertools.chain.from_iterable(
+            records[x:x + CHUNK_RECORDS].tolist() for x in range(0, len(records), CHUNK_RECORDS))):
+        opcode = inst & 0x7F
+        rs1 = (inst >> 15) & 0x1F
+        rs2 = (inst >> 20) & 0x1F
+
+        if last_load_rd and ((opcode in RS1_OPCODES or opcode in RS2_OPCODES) and rs1 == last_load_rd or opcode in RS2_OPCODES and rs2 == last_load_rd):
+            load_use += 1
+        last_load_rd = 0
+
+        if opcode == 0x03:
+            imm = (inst >> 20) - ((inst >> 20) & 0x800) * 2
+            addresses[idx] = (regs[rs1] + imm) & 0xFFFFFFFC
+            last_load_rd = rd_wstrb & 0x1F
+        elif rd_wstrb >> 8:
+            addresses[idx] = maddr
+            is_store[idx] = True
+
+        rd = rd_wstrb & 0x1F
+        if rd:
+            regs[rd] = wdata
+
+    return addresses, is_store, load_use
+
+def parse_size(text):
+    text = text.lower()
+    if text.endswith("k"):
+        return int(text[:-1]) * 1024
+    return int(text)
+
+class Cache:
+    # SIZE[:LINE[:WAYS[:wb|wt]]], sizes in bytes (k for kB), e.g. 4k:16:2.
+    # Write back caches allocate on a write miss, write through ones don't.
+    def __init__(self, spec):
+        fields = spec.split(':')
+        self.spec = spec
+        self.size = parse_size(fields[0])
+        self.line = parse_size(fields[1]) if len(fields) > 1 else 16
+        self.ways = int(fields[2]) if len(fields) > 2 else 1
+        self.write_back = (fields[3] if len(fields) > 3 else "wb") == "wb"
+        self.num_sets = self.size // (self.line * self.ways)
+        if self.num_sets < 1 or self.num_sets & (self.num_sets - 1) or self.line & (self.line - 1) or self.line < 4:
+            raise ValueError("Cache \"{}\" needs a power of two number of sets and line size".format(spec))
+
+        self.line_shift = self.line.bit_length() - 1
+        # Tags of each set, least recently used first
+        self.sets = [[] for _ in range(self.num_sets)]
+        self.dirty = set()
+
+    # Returns (hit, evicted a dirty line)
+    def access(self, address, write=False):
+        line = address >> self.line_shift
+        ways = self.sets[line & (self.num_sets - 1)]
+        if line in ways:
+            ways.remove(line)
+            ways.append(line)
+            if write and self.write_back:
+                self.dirty.add(line)
+            return True, False
+
+        if write and not self.write_back:
+            return False, False
+
+        evicted_dirty = False
+        if len(ways) == self.ways:
+            victim = ways.pop(0)
+            if victim in self.dirty:
+                self.dirty.remove(victim)
+                evicted_dirty = True
+        ways.append(line)
+        if write:
+            self.dirty.add(line)
+        return False, evicted_dirty
+
+# Cycles the memory system costs each instruction, summed over the trace
+def memory_cycles(setup, lat, pcs, addresses, is_store, icache_spec=None, dcache_spec=None):
+    transfer = lat + BUS_CYCLES
+
+    if setup == "single":
+        return len(pcs) * transfer + int(np.count_nonzero(addresses >= 0)) * transfer
+    if setup == "split":
+        return len(pcs) * transfer
+
+    icache = Cache(icache_spec) if icache_spec else None
+    dcache = Cache(dcache_spec) if dcache_spec else None
+    ifill = transfer + (icache.line // 4 - 1) * BEAT_CYCLES if icache else 0
+    dfill = transfer + (dcache.line // 4 - 1) * BEAT_CYCLES if dcache else 0
+
+    cycles = 0
+    for pc, address, store in zip(pcs.tolist(), addresses.tolist(), is_store.tolist()):
+        if icache is None:
+            cycles += transfer
+        else:
+            cycles += 1 if icache.access(pc)[0] else 1 + ifill
+
+        if address < 0:
+            continue
+        if dcache is None or address >= IO_BASE:
+            cycles += transfer
+            continue
+        hit, evicted_dirty = dcache.access(address, store)
+        if not hit:
+            # Write through: the store itself goes to the RAM
+            cycles += dfill if not store or dcache.write_back else transfer
+        elif store and not dcache.write_back:
+            cycles += transfer
+        if evicted_dirty:
+            cycles += dfill
+    return cycles
+
+def setup_name(setup, icache_spec, dcache_spec):
+    if setup != "cache":
+        return setup
+    return "I {} D {}".format(icache_spec or "-", dcache_spec or "-")
+
+def run_one(job):
+    trace_path, setup, lat, icache_spec, dcache_spec = job
+    pcs, kinds, taken, targets = load_trace(trace_path)
+    addresses, is_store, load_use = data_accesses(trace_path)
+    _, misses = Predictor("bimodal", DEFAULT_BTB_BITS).replay(pcs, kinds, taken, targets)
+
+    memory = memory_cycles(setup, lat, pcs, addresses, is_store, icache_spec, dcache_spec)
+    return len(pcs), memory + load_use + misses * MISPREDICT_PENALTY
+
+def format_table(configs, programs, results):
+    header = "{:<36} {:>4} {:>12} {:>12} {:>7} {:>8}".format("setup", "LAT", "instret", "cycles", "CPI", "speedup")
+    lines = [header, "-" * len(header)]
+
+    totals = {}
+    for config in configs:
+        rows = [results[(name,) + config] for name in programs]
+        totals[config] = (sum(x[0] for x in rows), sum(x[1] for x in rows))
+
+    for config in configs:
+        setup, lat, icache_spec, dcache_spec = config
+        instret, cycles = totals[config]
+        # Against the current single port RAM at the same latency
+        baseline = totals.get(("single", lat, None, None))
+        speedup = "{:.2f}x".format(baseline[1] / cycles) if baseline and cycles else ""
+        lines.append("{:<36} {:>4} {:>12} {:>12} {:>7.3f} {:>8}".format(
+            setup_name(setup, icache_spec, dcache_spec), lat, instret, cycles, cycles / instret if instret else 0, speedup))
+    return '\n'.join(lines)
+
+def write_csv(csv_path, configs, programs, results):
+    import csv
+    with open(csv_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["setup", "lat", "icache", "dcache", "program", "instret", "cycles"])
+        for config, name in itertools.product(configs, programs):
+            setup, lat, icache_spec, dcache_spec = config
+            writer.writerow([setup, lat, icache_spec or "", dcache_spec or "", name] + list(results[(name,) + config]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate the cycles of programs with other memory latencies, split ports or caches")
+    parser.add_argument("paths", nargs='*', default=["work"], help="Retire traces, program images (.mem/.hex, traced on the golden model) or directories of traces (default: work)")
+    parser.add_argument("-l", "--lat", type=int, nargs='+', default=[0], help="RAM latencies (ram.sv LAT) to sweep (default: 0)")
+    parser.add_argument("-s", "--setup", choices=["single", "split", "cache"], nargs='+', default=["single", "split", "cache"], help="Setups to model (default: all)")
+    parser.add_argument("-I", "--icache", nargs='+', default=["2k:16:1", "4k:16:2"], help="Instruction caches, SIZE[:LINE[:WAYS[:wb|wt]]] or none (default: 2k:16:1 4k:16:2)")
+    parser.add_argument("-D", "--dcache", nargs='+', default=["2k:16:1", "4k:16:2"], help="Data caches, as --icache (default: 2k:16:1 4k:16:2)")
+    parser.add_argument("-t", "--trace-name", default="memsim.trace", help="Trace looked for in directories (default: memsim.trace)")
+    parser.add_argument("-n", "--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="Stop tracing images after this many instructions (default: {})".format(DEFAULT_MAX_STEPS))
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Models run in parallel (default: all cores)")
+    parser.add_argument("--per-program", action="store_true", help="Print a table per program as well")
+    parser.add_argument("-o", "--csv", default=None, help="Also write every setup and program to this CSV file")
+    args = parser.parse_args()
+
+    icaches = [None if x == "none" else x for x in args.icache]
+    dcaches = [None if x == "none" else x for x in args.dcache]
+    try:
+        for spec in icaches + dcaches:
+            if spec is not None:
+                Cache(spec)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    configs = []
+    for lat in args.lat:
+        configs += [(setup, lat, None, None) for setup in ("single", "split") if setup in args.setup]
+        if "cache" in args.setup:
+            configs += [("cache", lat, i, d) for i, d in itertools.product(icaches, dcaches) if i or d]
+
+    found = find_traces(args.paths, args.trace_name)
+    if not found:
+        print("No traces found.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        images = [(idx, image) for idx, (_, _, image) in enumerate(found) if image is not None]
+        traced = pool.map(trace_image, [image for _, image in images], [os.path.join(tmp, "{}.trace".format(idx)) for idx, _ in images], [args.max_steps] * len(images))
+        for (idx, image), trace_path in zip(images, traced):
+            found[idx] = (found[idx][0], trace_path, image)
+
+        programs = [name for name, _, _ in found]
+        keys = [(name,) + config for (name, _, _), config in itertools.product(found, configs)]
+        jobs = [(path,) + config for (_, path, _), config in itertools.product(found, configs)]
+        results = dict(zip(keys, pool.map(run_one, jobs)))
+
+    print(format_table(configs, programs, results))
+    if args.per_program:
+        for name in programs:
+            print("\n" + name)
+            print(format_table(configs, [name], results))
+    if args.csv is not None:
+        write_csv(args.csv, configs, programs, results)
@@ -0,0 +1,204 @@
+# Symbolize the pc profile system_tb writes with +profile=<file> against the
+# program's ELF, to see which functions and instructions the cycles go to.
+#
+# The profile holds, for every pc, the times it retired and the cycles
+# charged to it: its own plus the cycles in which nothing retired before it
+# (stalls on it, the refill after a flush that led to it). Prints a flat
+# profile per function and a per-line one per instruction, annotated from the
+# objdump listing compile.py writes next to the ELF.
+#
+# A folded stack file for flamegraph.pl / speedscope needs call stacks, which
+# the profile doesn't have: they are rebuilt by replaying a retire trace of
+# the same run (system_tb's +trace or the golden model's), charging every
+# executed instruction its pc's average cycles.
+
+import os
+import sys
+import bisect
+import argparse
+import tempfile
+import subprocess
+
+import simulate_verilator
+from elf32 import ELF32, STT_FUNC, SHF_EXECINSTR
+from tracecmp import read_records
+from perfreport import DEFAULT_MAX_CYCLES
+
+# Lines of the per-line profile by default
+DEFAULT_LINES = 40
+
+# Opcodes of jal and jalr, and the link registers that make them calls
+JAL = 0x6F
+JALR = 0x67
+LINK_REGS = (1, 5)
+
+# {pc: (retired, cycles)}
+def load_profile(profile_path):
+    profile = {}
+    with open(profile_path, 'r') as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) == 3:
+                profile[int(fields[0], 16)] = (int(fields[1]), int(fields[2]))
+    return profile
+
+# Run an image with +profile and return the profile's path, next to the image
+def simulate_image(image, max_cycles=DEFAULT_MAX_CYCLES):
+    profile_path = os.path.splitext(image)[0] + ".profile.txt"
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        manifest = os.path.join(tmp, "manifest.txt")
+        simulate_verilator.write_manifest([[image, os.path.join(tmp, "ramcpu.bin"), "-", "-", profile_path]], manifest)
+        simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], stdout=subprocess.DEVNULL)
+    return profile_path
+
+class Symbolizer:
+    def __init__(self, elf):
+        text = [x for x in elf.sections if x.flags & SHF_EXECINSTR]
+        in_text = lambda value: any(x.addr <= value < x.addr + x.size for x in text)
+
+        # Functions, and labels in code where the toolchain gave no function
+        # symbols (startup.S)
+        symbols = [x for x in elf.symbols if x.type == STT_FUNC]
+        symbols += [x for x in elf.symbols if x.type != STT_FUNC and in_text(x.value) and not x.name.startswith(".")
+                    and not any(y.value == x.value for y in symbols)]
+        symbols.sort(key=lambda x: x.value)
+        self.starts = [x.value for x in symbols]
+        self.symbols = symbols
+        self.cache = {}
+
+    # Name of the function holding pc, "?" if none
+    def function(self, pc):
+        name = self.cache.get(pc)
+        if name is None:
+            idx = bisect.bisect_right(self.starts, pc) - 1
+            symbol = self.symbols[idx] if idx >= 0 else None
+            if symbol is None or (symbol.size and pc >= symbol.value + symbol.size):
+                name = "?"
+            else:
+                name = symbol.name
+            self.cache[pc] = name
+        return name
+
+    def location(self, pc):
+        idx = bisect.bisect_right(self.starts, pc) - 1
+        name = self.function(pc)
+        if name == "?":
+            return "0x{:08X}".format(pc)
+        return "{}+0x{:X}".format(name, pc - self.symbols[idx].value)
+
+# {address: instruction text} from an objdump -D listing
+def load_listing(listing_path):
+    listing = {}
+    if listing_path is None or not os.path.exists(listing_path):
+        return listing
+    with open(listing_path, 'r') as file:
+        for line in file:
+            address, sep, rest = line.partition(":\t")
+            if not sep:
+                continue
+            try:
+                address = int(address.strip(), 16)
+            except ValueError:
+                continue
+            # Drop the instruction word
+            listing[address] = ' '.join(rest.split("\t")[1:]).strip() or rest.strip()
+    return listing
+
+def flat_profile(profile, symbolizer):
+    functions = {}
+    for pc, (retired, cycles) in profile.items():
+        name = symbolizer.function(pc)
+        total = functions.setdefault(name, [0, 0])
+        total[0] += retired
+        total[1] += cycles
+    return sorted(((name, retired, cycles) for name, (retired, cycles) in functions.items()), key=lambda x: -x[2])
+
+def format_flat(profile, symbolizer):
+    total_cycles = sum(x[1] for x in profile.values()) or 1
+    header = "{:>7} {:>12} {:>12} {:>12} {:>6}  {}".format("%", "cycles", "retired", "stalls", "CPI", "function")
+    lines = [header, "-" * len(header)]
+    for name, retired, cycles in flat_profile(profile, symbolizer):
+        lines.append("{:>6.2f}% {:>12} {:>12} {:>12} {:>6.2f}  {}".format(
+            100 * cycles / total_cycles, cycles, retired, cycles - retired, cycles / retired if retired else 0, name))
+    return '\n'.join(lines)
+
+def format_lines(profile, symbolizer, listing, num_lines):
+    total_cycles = sum(x[1] for x in profile.values()) or 1
+    header = "{:>7} {:>12} {:>12} {:>12}  {:<10} {:<28} {}".format("%", "cycles", "retired", "stalls", "pc", "location", "instruction")
+    lines = [header, "-" * len(header)]
+    hottest = sorted(profile.items(), key=lambda x: -x[1][1])
+    for pc, (retired, cycles) in hottest[:num_lines]:
+        lines.append("{:>6.2f}% {:>12} {:>12} {:>12}  {:08X}   {:<28} {}".format(
+            100 * cycles / total_cycles, cycles, retired, cycles - retired, pc, symbolizer.location(pc), listing.get(pc, "")))
+    return '\n'.join(lines)
+
+# Replay a retire trace keeping a call stack of function names, and return
+# {stack: cycles}, every instruction charged its pc's average cycles
+def folded_stacks(trace_path, profile, symbolizer):
+    average = {pc: cycles / retired for pc, (retired, cycles) in profile.items() if retired}
+    stacks = {}
+    stack = []
+    calling = False
+
+    for pc, inst, _, _, _, _ in read_records(trace_path):
+        name = symbolizer.function(pc)
+        if calling or not stack:
+            stack.append(name)
+        else:
+            # Jumps and tail calls carry on in the same frame
+            stack[-1] = name
+        key = tuple(stack)
+        stacks[key] = stacks.get(key, 0.0) + average.get(pc, 1.0)
+
+        opcode = inst & 0x7F
+        rd = (inst >> 7) & 0x1F
+        rs1 = (inst >> 15) & 0x1F
+        calling = opcode in (JAL, JALR) and rd in LINK_REGS
+        if opcode == JALR and rd == 0 and rs1 in LINK_REGS and len(stack) > 1:
+            stack.pop()
+            # The caller carries on from its call
+            stack[-1] = None
+    return stacks
+
+def write_folded(folded_path, stacks):
+    with open(folded_path, 'w') as file:
+        for stack, cycles in sorted(stacks.items()):
+            if round(cycles) > 0:
+                file.write("{} {}\n".format(';'.join(x or "?" for x in stack), round(cycles)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flat and per-line profiles of a system_tb pc profile, symbolized from the program's ELF")
+    parser.add_argument("profile", nargs='?', default=None, help="Profile written with +profile=<file>")
+    parser.add_argument("-e", "--elf", default="../Code/build/program.elf", help="ELF of the program (default: ../Code/build/program.elf)")
+    parser.add_argument("-l", "--listing", default=None, help="objdump listing for the per-line profile (default: program.S next to the ELF)")
+    parser.add_argument("-i", "--image", default=None, help="Memory image to simulate with +profile first, instead of giving a profile")
+    parser.add_argument("-n", "--lines", type=int, default=DEFAULT_LINES, help="Hottest instructions listed (default: {})".format(DEFAULT_LINES))
+    parser.add_argument("-f", "--folded", default=None, help="Write folded stacks to this file (needs --trace)")
+    parser.add_argument("-t", "--trace", default=None, help="Retire trace of the same run, for --folded")
+    parser.add_argument("--max-cycles", type=int, default=DEFAULT_MAX_CYCLES, help="Give up on an image that hasn't halted after this many cycles, 0 for no limit (default: {})".format(DEFAULT_MAX_CYCLES))
+    args = parser.parse_args()
+
+    if args.image is not None:
+        profile_path = simulate_image(args.image, args.max_cycles)
+    elif args.profile is not None:
+        profile_path = args.profile
+    else:
+        print("Give a profile or an image to simulate.")
+        sys.exit(1)
+    if args.folded is not None and args.trace is None:
+        print("--folded needs the retire trace of the run (--trace).")
+        sys.exit(1)
+
+    profile = load_profile(profile_path)
+    if not profile:
+        print("The profile is empty.")
+        sys.exit(1)
+    symbolizer = Symbolizer(ELF32(args.elf))
+    listing = load_listing(args.listing if args.listing is not None else os.path.join(os.path.dirname(args.elf), "program.S"))
+
+    print(format_flat(profile, symbolizer))
+    print()
+    print(format_lines(profile, symbolizer, listing, args.lines))
+
+    if args.folded is not None:
+        write_folded(args.folded, folded_stacks(args.trace, profile, symbolizer))
@@ -0,0 +1,171 @@
+# Report where the cycles of each program went, from the performance counter
+# dumps system_tb writes at halt: counters.txt in every testasm.py work
+# directory, +counters=<file> for a single run, or the images given with
+# --image (e.g. a Code/ program's build/raminit.mem), which are simulated
+# here in one batch.
+#
+# Each dump holds "<name> <value>" lines. mhpmcounter3-8 count the cycles lost
+# to each cause the hazard unit knows of, except the branch counter, which
+# counts flushes. Whatever the counters don't explain (pipeline fill, the
+# halt, hazards without a counter) is reported as "other".
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+import simulate_verilator
+
+# Name of the dumps looked for in directories
+COUNTERS_FILE = "counters.txt"
+
+# (counter, label) of the events, in the order of csr_hpm_event in datapath.sv
+EVENTS = [
+    ("mhpmcounter3", "load-use"),
+    ("mhpmcounter4", "memory"),
+    ("mhpmcounter5", "branch"),
+    ("mhpmcounter6", "mul/div"),
+    ("mhpmcounter7", "fetch"),
+    ("mhpmcounter8", "csr"),
+]
+
+# Cycles an --image gets before it counts as not halting. Code/ programs
+# built without --sim end in a loop the core never leaves.
+DEFAULT_MAX_CYCLES = 100000000
+
+# A mispredicted branch is resolved in memory and flushes the instructions in
+# fetch, decode and execute
+BRANCH_PENALTY = 3
+
+def load_counters(path):
+    counters = {}
+    with open(path, 'r') as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) == 2:
+                counters[fields[0]] = int(fields[1])
+    return counters
+
+# Why the program of a counter dump didn't halt, empty when it did. A
+# simulation stopped by +max_cycles still writes its dumps, so a test is only
+# judged by them when this is empty.
+def halt_error(counters_path, max_cycles):
+    if not os.path.exists(counters_path):
+        return "Simulation produced no performance counters"
+    if load_counters(counters_path).get("halted", 0):
+        return ""
+    return "Did not halt within {} cycles".format(max_cycles)
+
+# (name, path) of the counter dumps under the given files and directories,
+# named after the directory they are in
+def find_counter_files(paths):
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append((os.path.splitext(os.path.basename(path))[0], path))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            if COUNTERS_FILE in files:
+                name = os.path.relpath(root, path)
+                found.append((os.path.basename(os.path.abspath(path)) if name == "." else name, os.path.join(root, COUNTERS_FILE)))
+    return found
+
+# Simulate the images in one batch and return (name, path) of their counter
+# dumps, written next to each image as <image>.counters.txt
+def simulate_images(images, max_cycles=DEFAULT_MAX_CYCLES):
+    entries = []
+    found = []
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        for idx, image in enumerate(images):
+            counters = os.path.splitext(image)[0] + ".counters.txt"
+            if os.path.exists(counters):
+                os.remove(counters)
+            entries.append([image, os.path.join(tmp, "ramcpu{}.bin".format(idx)), "-", counters])
+            found.append((image, counters))
+
+        manifest = os.path.join(tmp, "manifest.txt")
+        simulate_verilator.write_manifest(entries, manifest)
+        simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], stdout=subprocess.DEVNULL)
+
+    return found
+
+# Cycles lost to each event (label, cycles, count), plus the unexplained rest
+def stall_breakdown(counters):
+    cycles = counters.get("mcycle", counters.get("cycles", 0))
+    instret = counters.get("minstret", 0)
+    breakdown = []
+    for counter, label in EVENTS:
+        count = counters.get(counter, 0)
+        breakdown.append((label, count * BRANCH_PENALTY if label == "branch" else count, count))
+    breakdown.append(("other", max(0, cycles - instret - sum(x[1] for x in breakdown)), None))
+    return breakdown
+
+def format_row(name, counters):
+    cycles = counters.get("mcycle", counters.get("cycles", 0))
+    instret = counters.get("minstret", 0)
+    cpi = "{:6.3f}".format(cycles / instret) if instret else "     -"
+    fields = ["{:<28}".format(name), "{:>10}".format(cycles), "{:>10}".format(instret), cpi]
+    for label, lost, _ in stall_breakdown(counters):
+        fields.append("{:>6.1f}%".format(100 * lost / cycles if cycles else 0))
+    if not counters.get("halted", 1):
+        fields.append("(did not halt)")
+    return ' '.join(fields)
+
+def format_report(results):
+    header = ["{:<28}".format("program"), "{:>10}".format("cycles"), "{:>10}".format("instret"), "{:>6}".format("CPI")]
+    header += ["{:>7}".format(label) for label, _, _ in stall_breakdown({})]
+    lines = [' '.join(header), "-" * len(' '.join(header))]
+    for name, counters in results:
+        lines.append(format_row(name, counters))
+
+    # Totals over every program, so CPI is weighted by cycles
+    if len(results) > 1:
+        total = {}
+        for _, counters in results:
+            for key, value in counters.items():
+                total[key] = total.get(key, 0) + value
+        total["halted"] = 1
+        lines.append("-" * len(lines[0]))
+        lines.append(format_row("total", total))
+
+    return '\n'.join(lines)
+
+# Cycles and event counts of a single program, in more detail than the table
+def format_detail(name, counters):
+    cycles = counters.get("mcycle", counters.get("cycles", 0))
+    instret = counters.get("minstret", 0)
+    lines = ["{}: {} cycles, {} instructions, CPI {}{}".format(name, cycles, instret, "{:.3f}".format(cycles / instret) if instret else "-",
+                                                             "" if counters.get("halted", 1) else " (did not halt)")]
+    for label, lost, count in stall_breakdown(counters):
+        share = 100 * lost / cycles if cycles else 0
+        if label == "branch":
+            lines.append("    {:<10} {:>10} cycles {:>6.1f}%  ({} flushes)".format(label, lost, share, count))
+        else:
+            lines.append("    {:<10} {:>10} cycles {:>6.1f}%".format(label, lost, share))
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print CPI and the stall breakdown of programs from their performance counter dumps")
+    parser.add_argument("paths", nargs='*', help="Counter dumps, or directories searched for {} (default: the testasm.py work directory)".format(COUNTERS_FILE))
+    parser.add_argument("-i", "--image", nargs='+', default=[], help="Memory images to simulate first (e.g. ../Code/build/raminit.mem)")
+    parser.add_argument("--max-cycles", type=int, default=DEFAULT_MAX_CYCLES, help="Give up on an image that hasn't halted after this many cycles, 0 for no limit (default: {})".format(DEFAULT_MAX_CYCLES))
+    parser.add_argument("-d", "--detail", action="store_true", help="Print every program's breakdown in full instead of a table")
+    args = parser.parse_args()
+
+    found = []
+    if args.image:
+        found += simulate_images(args.image, args.max_cycles)
+    paths = args.paths if args.paths or args.image else ["work"]
+    found += find_counter_files(paths)
+
+    results = [(name, load_counters(path)) for name, path in found if os.path.exists(path)]
+    if not results:
+        print("No counter dumps found.")
+        sys.exit(1)
+
+    if args.detail:
+        print('\n\n'.join(format_detail(name, counters) for name, counters in results))
+    else:
+        print(format_report(results))
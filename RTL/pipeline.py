@@ -0,0 +1,96 @@
+# The steps from an assembly test to the files testasm.py compares, as
+# functions: assemble and link once, write the RAM images from the ELF and
+# run the golden model on the image in memory. assemble.py, emulate.py,
+# testasm.py and fuzz.py all go through here instead of starting Python
+# processes for each other.
+#
+# A step that fails raises ToolchainError, which says which step it was, the
+# command and its exit code and output.
+
+import os
+import subprocess
+
+from memimage import load_elf, write_images
+from iss import run_image
+
+MARCH = "rv32im_zicsr"
+MABI = "ilp32"
+AS = "riscv-none-elf-as"
+LD = "riscv-none-elf-ld"
+
+# Assembly tests only use the lower 64kB of the RAM
+MEM_SIZE = 16384 * 4
+
+# Golden model steps before a test counts as not halting, it has no other
+# way out of a program that loops forever
+MAX_STEPS = 10000000
+
+# Linker script lives next to this script so it can be run from any directory
+LINKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linkerscript.ld")
+
+class ToolchainError(Exception):
+    def __init__(self, step, message, command=None, returncode=None, output=""):
+        super().__init__(message)
+        self.step = step
+        self.message = message
+        self.command = command
+        self.returncode = returncode
+        self.output = output
+
+    def __str__(self):
+        text = "{} failed: {}".format(self.step, self.message)
+        if self.command:
+            text += "\n  $ " + ' '.join(self.command)
+        if self.output:
+            text += "\n" + '\n'.join("  " + x for x in self.output.splitlines())
+        return text
+
+# Run a tool without a shell, raising ToolchainError if it can't be started or
+# exits with an error
+def run_tool(step, command, cwd=None):
+    try:
+        result = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+    except OSError as e:
+        raise ToolchainError(step, "could not run {}: {}".format(command[0], e), command)
+    if result.returncode != 0:
+        raise ToolchainError(step, "{} exited with code {}".format(command[0], result.returncode), command,
+                             result.returncode, (result.stdout + result.stderr).strip())
+    return result
+
+# Assemble and link an assembly file, the object and ELF next to it or in
+# out_dir. Returns the ELF's path.
+def assemble(asm_path, out_dir=None):
+    if out_dir is None:
+        out_dir = os.path.dirname(asm_path)
+    base = os.path.join(out_dir, os.path.splitext(os.path.basename(asm_path))[0])
+
+    run_tool("assemble", [AS, "-march={}".format(MARCH), "-mabi={}".format(MABI), "-o", base + ".o", asm_path])
+    run_tool("link", [LD, "-T", LINKER_SCRIPT, "-o", base + ".elf", base + ".o"])
+    return base + ".elf"
+
+# The RAM image of a linked test
+def load_image(elf_path):
+    try:
+        return load_elf(elf_path, MEM_SIZE)
+    except (OSError, ValueError) as e:
+        raise ToolchainError("image", "could not load {}: {}".format(elf_path, e))
+
+# raminit.mem for the RTL and meminit.hex for the FPGA in out_dir, straight
+# from the ELF. Returns the image.
+def write_ram_images(elf_path, out_dir):
+    image = load_image(elf_path)
+    write_images(image, [os.path.join(out_dir, "raminit.mem"), os.path.join(out_dir, "meminit.hex")])
+    return image
+
+# Run the golden model on an image and write the expected dump and
+# optionally the retire trace. Returns the ISS.
+def emulate(image, dump_path, trace_path=None, max_steps=MAX_STEPS):
+    iss = run_image(image, dump_path, max_steps, trace_path=trace_path)
+    if not iss.halted:
+        raise ToolchainError("emulate", "golden model stopped without halting: {}".format(iss.halt_reason))
+    return iss
+
+# Assemble a test in its work directory and write its RAM images. Returns
+# the image.
+def build_test(asm_path, workdir):
+    return write_ram_images(assemble(asm_path, workdir), workdir)
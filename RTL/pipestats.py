@@ -0,0 +1,161 @@
+# Pipeline occupancy, stall and bus statistics from a system_tb waveform
+# (VCD, or FST with GTKWave's fst2vcd), streamed cycle by cycle through
+# wavestream.py so the memory used doesn't depend on the length of the trace.
+#
+# Writes three CSV files:
+#   <prefix>_occupancy.csv  per pipeline register, the cycles it held an
+#                           instruction, was stalled holding one and was
+#                           flushed
+#   <prefix>_stalls.csv     per pipeline register, how many stalls lasted
+#                           each number of cycles
+#   <prefix>_bus.csv        AHB-Lite transfers and utilization of the bus per
+#                           window of cycles, and the CPU's share of them
+
+import sys
+import csv
+import argparse
+
+from wavestream import WaveError, stream_cycles
+
+CLOCK = "system_tb.clk"
+RESET = "system_tb.nrst"
+DATAPATH = "cpu_inst.datapath_inst"
+STAGES = ["f2dif", "d2eif", "e2mif", "m2wif"]
+
+# The multiplexor's side of the bus carries the transfers of both the CPU and
+# the debug controller
+HTRANS = "system_inst.multiplexor_abif.htrans"
+HREADY = "system_inst.multiplexor_abif.hready"
+OVERRIDE = "system_tb.cpu_ram_if.override_ctrl"
+HTRANS_NONSEQ = 2
+
+DEFAULT_WINDOW = 1000
+
+def stage_signals(stage):
+    return ["{}.{}.{}".format(DATAPATH, stage, x) for x in ("valid", "en", "flush")]
+
+def signal_names():
+    names = [RESET, HTRANS, HREADY, OVERRIDE]
+    for stage in STAGES:
+        names += stage_signals(stage)
+    return names
+
+class PipelineStats:
+    def __init__(self, window=DEFAULT_WINDOW, bus_writer=None):
+        self.cycles = 0
+        self.valid = {x: 0 for x in STAGES}
+        self.stalled = {x: 0 for x in STAGES}
+        self.flushed = {x: 0 for x in STAGES}
+        # Run length -> number of stalls, per stage
+        self.stall_runs = {x: {} for x in STAGES}
+        self.current_run = {x: 0 for x in STAGES}
+
+        self.window = window
+        self.bus_writer = bus_writer
+        self.window_cycles = 0
+        self.window_transfers = 0
+        self.window_cpu_transfers = 0
+        self.transfers = 0
+        self.cpu_transfers = 0
+
+    def end_run(self, stage):
+        run = self.current_run[stage]
+        if run:
+            self.stall_runs[stage][run] = self.stall_runs[stage].get(run, 0) + 1
+            self.current_run[stage] = 0
+
+    def flush_window(self):
+        if self.window_cycles and self.bus_writer is not None:
+            self.bus_writer.writerow([self.cycles - self.window_cycles, self.window_cycles, self.window_transfers,
+                                      "{:.4f}".format(self.window_transfers / self.window_cycles), self.window_cpu_transfers])
+        self.window_cycles = 0
+        self.window_transfers = 0
+        self.window_cpu_transfers = 0
+
+    # Account for one clock cycle, values as sampled by stream_cycles
+    def add_cycle(self, values):
+        self.cycles += 1
+
+        for stage in STAGES:
+            valid, en, flush = (values[x] for x in stage_signals(stage))
+            if valid:
+                self.valid[stage] += 1
+            if flush and en:
+                self.flushed[stage] += 1
+            if valid and not en:
+                self.stalled[stage] += 1
+                self.current_run[stage] += 1
+            else:
+                self.end_run(stage)
+
+        # An address phase is accepted when hready is high
+        if values[HTRANS] is not None and values[HTRANS] >= HTRANS_NONSEQ and values[HREADY]:
+            self.transfers += 1
+            self.window_transfers += 1
+            if not values[OVERRIDE]:
+                self.cpu_transfers += 1
+                self.window_cpu_transfers += 1
+        self.window_cycles += 1
+        if self.window_cycles == self.window:
+            self.flush_window()
+
+    def finish(self):
+        for stage in STAGES:
+            self.end_run(stage)
+        self.flush_window()
+
+    def write_occupancy(self, writer):
+        writer.writerow(["stage", "cycles", "valid", "stalled", "flushed", "valid_pct", "stalled_pct", "flushed_pct"])
+        for stage in STAGES:
+            row = [self.valid[stage], self.stalled[stage], self.flushed[stage]]
+            writer.writerow([stage, self.cycles] + row + ["{:.2f}".format(100 * x / self.cycles if self.cycles else 0) for x in row])
+
+    def write_stall_runs(self, writer):
+        writer.writerow(["stage", "run_length", "count", "cycles"])
+        for stage in STAGES:
+            for run, count in sorted(self.stall_runs[stage].items()):
+                writer.writerow([stage, run, count, run * count])
+
+    def format_summary(self):
+        lines = ["{} cycles, bus utilization {:.1f}% ({} transfers, {} from the CPU)".format(
+            self.cycles, 100 * self.transfers / self.cycles if self.cycles else 0, self.transfers, self.cpu_transfers)]
+        for stage in STAGES:
+            runs = self.stall_runs[stage]
+            longest = max(runs) if runs else 0
+            lines.append("  {}: valid {:>5.1f}%  stalled {:>5.1f}%  flushed {:>5.1f}%  longest stall {} cycles".format(
+                stage, *(100 * x / self.cycles if self.cycles else 0 for x in (self.valid[stage], self.stalled[stage], self.flushed[stage])), longest))
+        return '\n'.join(lines)
+
+# Stream the waveform through a PipelineStats. Cycles in reset are skipped.
+def analyze(wave_path, prefix, window=DEFAULT_WINDOW):
+    with open(prefix + "_bus.csv", 'w', newline='') as bus_file:
+        bus_writer = csv.writer(bus_file)
+        bus_writer.writerow(["start_cycle", "cycles", "transfers", "utilization", "cpu_transfers"])
+        stats = PipelineStats(window, bus_writer)
+
+        for values in stream_cycles(wave_path, CLOCK, signal_names()):
+            if values[RESET]:
+                stats.add_cycle(values)
+        stats.finish()
+
+    with open(prefix + "_occupancy.csv", 'w', newline='') as file:
+        stats.write_occupancy(csv.writer(file))
+    with open(prefix + "_stalls.csv", 'w', newline='') as file:
+        stats.write_stall_runs(csv.writer(file))
+
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline occupancy, stall run lengths and bus utilization of a system_tb waveform, as CSV")
+    parser.add_argument("wave", help="Waveform of a system_tb simulation (.vcd or .fst)")
+    parser.add_argument("-o", "--output", default="pipestats", help="Prefix of the CSV files (default: pipestats)")
+    parser.add_argument("-w", "--window", type=int, default=DEFAULT_WINDOW, help="Cycles per bus utilization sample (default: {})".format(DEFAULT_WINDOW))
+    args = parser.parse_args()
+
+    try:
+        stats = analyze(args.wave, args.output, max(1, args.window))
+    except WaveError as e:
+        print(e)
+        sys.exit(1)
+
+    print(stats.format_summary())
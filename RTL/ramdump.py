@@ -0,0 +1,60 @@
+# Load a RAM dump written by system_tb or iss.py as an array of 32-bit words.
+#
+# The format follows the file extension:
+#   .bin    every RAM word, raw little-endian, memory-mapped without copying
+#   .pages  nonzero pages only, each a little-endian byte address followed by
+#           PAGE_WORDS words (dump_image in source/ram.sv)
+#   other   the Intel HEX flavour of dump_memory() in system_tb, one
+#           big-endian word per record, first DUMP_WORDS words only
+
+import os
+import argparse
+import numpy as np
+
+from memimage import load_intel_hex
+
+# RAM_SIZE in source/ram.sv
+RAM_WORDS = 32768
+# Words in a .hex dump
+DUMP_WORDS = 16384
+# PAGE_WORDS in source/ram.sv
+PAGE_WORDS = 256
+
+def load_bin(file_path):
+    if os.path.getsize(file_path) == 0:
+        return np.zeros(0, dtype=np.uint32)
+    return np.memmap(file_path, dtype='<u4', mode='r')
+
+def load_pages(file_path, num_words=RAM_WORDS):
+    words = np.zeros(num_words, dtype=np.uint32)
+    if os.path.getsize(file_path) == 0:
+        return words
+
+    pages = np.memmap(file_path, dtype='<u4', mode='r').reshape(-1, PAGE_WORDS + 1)
+    for page in pages:
+        start = int(page[0]) // 4
+        if start + PAGE_WORDS > num_words:
+            raise ValueError("{}: page at 0x{:08X} is outside of the RAM".format(file_path, start * 4))
+        words[start:start + PAGE_WORDS] = page[1:]
+    return words
+
+def load_hex(file_path, num_words=DUMP_WORDS):
+    image = load_intel_hex(file_path, num_words * 4)
+    return np.frombuffer(image, dtype='>u4').astype(np.uint32)
+
+def load_dump(file_path):
+    ext = os.path.splitext(file_path)[1]
+    if ext == ".bin":
+        return load_bin(file_path)
+    elif ext == ".pages":
+        return load_pages(file_path)
+    return load_hex(file_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the nonzero words of a RAM dump")
+    parser.add_argument("dump", help="RAM dump (.bin, .pages or .hex)")
+    args = parser.parse_args()
+
+    words = load_dump(args.dump)
+    for idx in np.flatnonzero(words):
+        print("{:08X}: {:08X}".format(idx * 4, int(words[idx])))
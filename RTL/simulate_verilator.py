@@ -1,24 +1,94 @@
 # Simulate using Verilator
+import os
 import sys
 import subprocess
 
+from pipeline import ToolchainError
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The simulation binary built by the "build" action, next to this script
+SIM_BINARY = os.path.join(SCRIPT_DIR, "obj_dir", "sim")
+
+# Object directory and binary of a variant built with other defines, see
+# sweep.py
+def variant_dir(name):
+    return os.path.join(SCRIPT_DIR, "obj_dir_{}".format(name))
+
+def variant_binary(name):
+    return os.path.join(variant_dir(name), "sim")
+
+# Path to a simulation binary relative to the current directory, so it can be
+# handed to WSL from the per-test work directories as well as from here
+def sim_binary_path(binary=SIM_BINARY):
+    return os.path.relpath(binary).replace("\\", "/")
+
+# Run a command under WSL, raising ToolchainError if it fails
+def run_wsl(step, command, **kwargs):
+    command = ["wsl", "-e"] + command
+    try:
+        subprocess.run(command, check=True, **kwargs)
+    except OSError as e:
+        raise ToolchainError(step, "could not run {}: {}".format(command[0], e), command)
+    except subprocess.CalledProcessError as e:
+        raise ToolchainError(step, "{} exited with code {}".format(command[2], e.returncode), command, e.returncode)
+
+# Build the simulation, by default into obj_dir. defines are extra
+# "NAME=value" or "NAME" macros, mdir another object directory for them and
+# jobs the compiler processes of the build.
+def build(top, defines=(), mdir=None, threads=4, jobs=None, include_dirs=(), **kwargs):
+    command = ["verilator", "--cc", "--binary", top, "--trace", "--threads", str(threads), "-o", "sim", "-Isource", "-Itestbench", "-Iinclude", "-sv", "--clk", "clk", "-DSIMULATOR"]
+    command += ["-I{}".format(os.path.relpath(x).replace("\\", "/")) for x in include_dirs]
+    command += ["-D{}".format(x) for x in defines]
+    if mdir is not None:
+        command += ["--Mdir", os.path.relpath(mdir).replace("\\", "/")]
+    if jobs is not None:
+        command += ["-j", str(jobs)]
+    run_wsl("build", command, **kwargs)
+
+# Run the simulation once on raminit.mem in the current directory
+def run(plusargs=(), binary=SIM_BINARY, **kwargs):
+    run_wsl("simulate", [sim_binary_path(binary)] + list(plusargs), **kwargs)
+
+# Manifest for batch mode, one program per line: image, dump and optionally
+# the retire trace, the performance counter dump, the pc profile and the
+# console output ("-" for none, see run_manifest in system_tb.sv)
+def write_manifest(entries, manifest_file):
+    with open(manifest_file, 'w') as file:
+        for entry in entries:
+            file.write(' '.join(x.replace("\\", "/") for x in entry) + "\n")
+
+# Run every program in the manifest in one simulation process, so the model
+# is only constructed once
+def run_batch(manifest_file, plusargs=(), binary=SIM_BINARY, **kwargs):
+    run(["+manifest={}".format(manifest_file.replace("\\", "/"))] + list(plusargs), binary, **kwargs)
+
 if __name__ == "__main__":
     if(len(sys.argv) < 2):
         print("Usage: python simulate_verilator.py <action>")
         print("Actions:")
         print("  build <top_level>: Build the Verilator simulation")
-        print("  run: Run the Verilator simulation")
+        print("  run [+plusargs]: Run the Verilator simulation, e.g. +trace=<file> for the retire trace, +counters=<file> for the performance counters, +profile=<file> for the pc profile, +wave=<file> for a waveform, +console=<file> for the simulation console's output instead of stdout")
+        print("  batch <manifest> [+plusargs]: Run every \"<raminit.mem> <dump.hex> [<trace> [<counters> [<profile> [<console>]]]]\" line of the manifest in one simulation")
         sys.exit(1)
 
     action = sys.argv[1]
-    if action == "build":
-        if(len(sys.argv) < 3):
-            print("Usage: python simulate_verilator.py build <top_level>")
+    try:
+        if action == "build":
+            if(len(sys.argv) < 3):
+                print("Usage: python simulate_verilator.py build <top_level>")
+                sys.exit(1)
+            build(sys.argv[2])
+        elif action == "run":
+            run(sys.argv[2:])
+        elif action == "batch":
+            if(len(sys.argv) < 3):
+                print("Usage: python simulate_verilator.py batch <manifest> [+plusargs]")
+                sys.exit(1)
+            run_batch(sys.argv[2], sys.argv[3:])
+        else:
+            print("Invalid action: {}".format(action))
             sys.exit(1)
-        subprocess.run("wsl -e verilator --cc --binary {top} --trace --threads 4 -o sim -Isource -Itestbench -Iinclude -sv --clk clk -DSIMULATOR".format(top=sys.argv[2]), shell=True, check=True)
-    elif action == "run":
-        subprocess.run("wsl -e obj_dir/sim", shell=True, check=True)
-    else:
-        print("Invalid action: {}".format(action))
+    except ToolchainError as e:
+        print(e)
         sys.exit(1)
-    
@@ -14,6 +14,10 @@ module ahb_multiplexor (
     ahb_bus_if.mux_to_satellite abif_to_def,
     ahb_bus_if.mux_to_satellite abif_to_ram,
     ahb_bus_if.mux_to_satellite abif_to_uart
+`ifdef SIMULATOR
+    ,
+    ahb_bus_if.mux_to_satellite abif_to_console
+`endif
 );
 
     integer sel_i;
@@ -45,6 +49,9 @@ module ahb_multiplexor (
         abif_to_def.hsel = 1'b0;
         abif_to_ram.hsel = 1'b0;
         abif_to_uart.hsel = 1'b0;
+    `ifdef SIMULATOR
+        abif_to_console.hsel = 1'b0;
+    `endif
 
         // RAM address range = 0x0000_0000 to 0x0001_FFFF
         if (abif_to_controller.htrans != HTRANS_IDLE && abif_to_controller.haddr < 32'h0002_0000) begin
@@ -54,6 +61,12 @@ module ahb_multiplexor (
         end else if (abif_to_controller.htrans != HTRANS_IDLE && abif_to_controller.haddr >= 32'h0002_0000 && abif_to_controller.haddr < 32'h0002_0010) begin
             abif_to_uart.hsel = 1'b1;
             sel_i = 2;
+    `ifdef SIMULATOR
+        // Simulation console address range = 0x0002_0010 to 0x0002_0017 (TXDR at 0x0002_0010, EXIT at 0x0002_0014)
+        end else if (abif_to_controller.htrans != HTRANS_IDLE && abif_to_controller.haddr >= 32'h0002_0010 && abif_to_controller.haddr < 32'h0002_0018) begin
+            abif_to_console.hsel = 1'b1;
+            sel_i = 3;
+    `endif
         end else begin
             abif_to_def.hsel = 1'b1;
             sel_i = 0;
@@ -80,6 +93,14 @@ module ahb_multiplexor (
                 abif_to_controller.hresp = abif_to_uart.hresp;
             end
 
+        `ifdef SIMULATOR
+            3: begin // Simulation console satellite
+                abif_to_controller.hrdata = abif_to_console.hrdata;
+                readyout = abif_to_console.hreadyout;
+                abif_to_controller.hresp = abif_to_console.hresp;
+            end
+        `endif
+
             default: begin // Invalid address, default to default satellite
                 abif_to_controller.hrdata = abif_to_def.hrdata;
                 readyout = abif_to_def.hreadyout;
@@ -117,5 +138,15 @@ module ahb_multiplexor (
         abif_to_uart.htrans = abif_to_controller.htrans;
         abif_to_uart.hwrite = abif_to_controller.hwrite;
         abif_to_uart.hready = readyout;
+
+    `ifdef SIMULATOR
+        abif_to_console.hwdata = abif_to_controller.hwdata;
+        abif_to_console.haddr = abif_to_controller.haddr;
+        abif_to_console.hburst = abif_to_controller.hburst;
+        abif_to_console.hsize = abif_to_controller.hsize;
+        abif_to_console.htrans = abif_to_controller.htrans;
+        abif_to_console.hwrite = abif_to_controller.hwrite;
+        abif_to_console.hready = readyout;
+    `endif
     end
 endmodule
\ No newline at end of file
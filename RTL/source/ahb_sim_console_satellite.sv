@@ -0,0 +1,97 @@
+/*****************************************/
+/*  AHB-Lite Simulation Console Satellite  */
+/*****************************************/
+`timescale 1ns/1ns
+
+`include "ahb_bus_if.vh"
+
+`include "common_types.vh"
+import common_types_pkg::*;
+
+// Console for the Verilator build only: a byte written to TXDR is handed to
+// the testbench in the cycle it is written, without the bit timing of
+// uart_tx, and a write to EXIT ends the program with the written status.
+// Without SIMULATOR the module doesn't exist and ahb_multiplexor sends its
+// addresses to the default satellite.
+`ifdef SIMULATOR
+module ahb_sim_console_satellite #(
+    parameter BASE_ADDR = 32'h0002_0010
+)
+(
+    input logic clk, nrst,
+    output logic tx_valid,      // A byte was written to TXDR
+    output logic [7:0] tx_data, // The byte
+    output logic exited,        // EXIT was written
+    output word_t exit_code,    // The status written to EXIT
+    ahb_bus_if.satellite_to_mux abif
+);
+
+    /********************************************/
+    /*              Register File               */
+    /* 0x00: TXDR - Transmit Data Register - WO */
+    /*       - Bits [7:0]: Byte to print        */
+    /* 0x04: EXIT - Exit Register          - WO */
+    /*       - Bits [31:0]: Exit status         */
+    /********************************************/
+
+    // Address decoder
+    logic [1:0] wen;
+    logic [1:0] wen_n;
+    always_ff @(posedge clk) begin
+        if (~nrst) begin
+            wen <= 2'b00;
+        end else begin
+            wen <= wen_n;
+        end
+    end
+
+    always_comb begin
+        // Default response, reads return 0
+        abif.hrdata = '0;
+        abif.hreadyout = 1'b1;
+        abif.hresp = 1'b0;
+
+        // Decoder outputs
+        wen_n = 2'b00;
+
+        if (abif.hsel && abif.hready) begin
+            if (abif.htrans == HTRANS_NONSEQ) begin
+                if (abif.hwrite) begin
+                    casez (abif.haddr)
+                        BASE_ADDR + 32'h00: begin
+                            // Transmit Data Register
+                            wen_n = 2'b01;
+                        end
+                        BASE_ADDR + 32'h04: begin
+                            // Exit Register
+                            wen_n = 2'b10;
+                        end
+                        default: begin
+                            // Invalid address, set error response
+                            abif.hresp = 1'b1;
+                        end
+                    endcase
+                end
+            end else if (abif.htrans != HTRANS_IDLE) begin
+                // Other modes not supported
+                abif.hresp = 1'b1;
+            end
+        end
+    end
+
+    // The write data comes in the data phase, the cycle after the address
+    assign tx_valid = wen[0];
+    assign tx_data = abif.hwdata[7:0];
+
+    always_ff @(posedge clk) begin
+        if (~nrst) begin
+            exited <= 1'b0;
+            exit_code <= '0;
+        end else if (wen[1]) begin
+            exited <= 1'b1;
+            exit_code <= abif.hwdata;
+        end
+    end
+
+endmodule
+`endif // SIMULATOR
@@ -12,8 +12,13 @@ import common_types_pkg::*;
 // Switch to always not taken for comparison
 // `define ALWAYS_NOT_TAKEN
 
+// Buffer size, can be set with +define+BTB_BITS=<n> for parameter sweeps
+`ifndef BTB_BITS
+`define BTB_BITS 5
+`endif
+
 module branch_unit #(
-    parameter BTB_BITS=5            // 32 entry buffers
+    parameter BTB_BITS=`BTB_BITS    // 32 entry buffers by default
 ) (
     input logic clk, nrst,
     branch_unit_if.branch_unit buif
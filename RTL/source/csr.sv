@@ -23,6 +23,11 @@ word_t mepc;
 word_t mcause;
 word_t mscratch;
 
+// Performance counters
+logic [63:0] mcycle;
+logic [63:0] minstret;
+logic [63:0] mhpmcounter [HPM_EVENTS];
+
 csr_mstatus_t mstatus_n;
 word_t mstatush_n;
 csr_mtvec_t mtvec_n;
@@ -32,6 +37,15 @@ word_t mepc_n;
 word_t mcause_n;
 word_t mscratch_n;
 
+logic [63:0] mcycle_n;
+logic [63:0] minstret_n;
+logic [63:0] mhpmcounter_n [HPM_EVENTS];
+
+// Counter index of an mhpmcounter/hpmcounter address (3 and up)
+logic [11:0] hpm_raddr, hpm_waddr;
+assign hpm_raddr = csr_if.csr_raddr - MHPMCOUNTER3;
+assign hpm_waddr = csr_if.csr_waddr - MHPMCOUNTER3;
+
 // FF
 always_ff @(posedge clk) begin
     if (~nrst) begin
@@ -43,6 +57,11 @@ always_ff @(posedge clk) begin
         mepc <= 0;
         mcause <= 0;
         mscratch <= 0;
+        mcycle <= 0;
+        minstret <= 0;
+        for (int i = 0; i < HPM_EVENTS; i++) begin
+            mhpmcounter[i] <= 0;
+        end
     end else begin
         mstatus <= mstatus_n;
         mstatush <= mstatush_n;
@@ -52,6 +71,9 @@ always_ff @(posedge clk) begin
         mepc <= mepc_n;
         mcause <= mcause_n;
         mscratch <= mscratch_n;
+        mcycle <= mcycle_n;
+        minstret <= minstret_n;
+        mhpmcounter <= mhpmcounter_n;
     end
 end
 
@@ -65,6 +87,13 @@ always_comb begin
     mcause_n = mcause;
     mscratch_n = mscratch;
 
+    // Count until halted
+    mcycle_n = mcycle + {63'd0, ~csr_if.csr_halt};
+    minstret_n = minstret + {63'd0, csr_if.csr_retire & ~csr_if.csr_halt};
+    for (int i = 0; i < HPM_EVENTS; i++) begin
+        mhpmcounter_n[i] = mhpmcounter[i] + {63'd0, csr_if.csr_hpm_event[i] & ~csr_if.csr_halt};
+    end
+
     // CSR read
     case (csr_if.csr_raddr)
         MSTATUS: csr_if.csr_rdata = mstatus;
@@ -75,9 +104,19 @@ always_comb begin
         MEPC: csr_if.csr_rdata = mepc;
         MCAUSE: csr_if.csr_rdata = mcause;
         MSCRATCH: csr_if.csr_rdata = mscratch;
+        MCYCLE, CYCLE: csr_if.csr_rdata = mcycle[31:0];
+        MCYCLEH, CYCLEH: csr_if.csr_rdata = mcycle[63:32];
+        MINSTRET, INSTRET: csr_if.csr_rdata = minstret[31:0];
+        MINSTRETH, INSTRETH: csr_if.csr_rdata = minstret[63:32];
         default: csr_if.csr_rdata = 0;
     endcase
 
+    // Event counters, the user read-only copies are 0x100 above
+    for (int i = 0; i < HPM_EVENTS; i++) begin
+        if (hpm_raddr == 12'(i) || hpm_raddr == 12'h100 + 12'(i)) csr_if.csr_rdata = mhpmcounter[i][31:0];
+        if (hpm_raddr == 12'h80 + 12'(i) || hpm_raddr == 12'h180 + 12'(i)) csr_if.csr_rdata = mhpmcounter[i][63:32];
+    end
+
     // CSR write
     if (csr_if.csr_write) begin
         case (csr_if.csr_waddr)
@@ -89,8 +128,17 @@ always_comb begin
             MEPC: mepc_n = csr_if.csr_wdata;
             MCAUSE: mcause_n = csr_if.csr_wdata;
             MSCRATCH: mscratch_n = csr_if.csr_wdata;
+            MCYCLE: mcycle_n[31:0] = csr_if.csr_wdata;
+            MCYCLEH: mcycle_n[63:32] = csr_if.csr_wdata;
+            MINSTRET: minstret_n[31:0] = csr_if.csr_wdata;
+            MINSTRETH: minstret_n[63:32] = csr_if.csr_wdata;
             default: mcause_n = mcause;
         endcase
+
+        for (int i = 0; i < HPM_EVENTS; i++) begin
+            if (hpm_waddr == 12'(i)) mhpmcounter_n[i][31:0] = csr_if.csr_wdata;
+            if (hpm_waddr == 12'h80 + 12'(i)) mhpmcounter_n[i][63:32] = csr_if.csr_wdata;
+        end
     end
 
     // Hardware overrides anything here
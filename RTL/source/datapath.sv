@@ -23,6 +23,16 @@ import common_types_pkg::*;
 `include "execute_to_memory_if.vh"
 `include "memory_to_writeback_if.vh"
 
+// Multiplier and divider implementations, other modules with the same ports
+// can be swapped in with +define+MULTIPLIER_MODULE=<name> (and
+// DIVIDER_MODULE) for parameter sweeps
+`ifndef MULTIPLIER_MODULE
+`define MULTIPLIER_MODULE multiplier
+`endif
+`ifndef DIVIDER_MODULE
+`define DIVIDER_MODULE divider
+`endif
+
 module datapath #(
   parameter PC_INIT = 0
 )(
@@ -55,8 +65,8 @@ module datapath #(
   // Module instantiation
   (* keep_hierarchy = "yes" *) control_unit ctrl0(ctrlif);
   (* keep_hierarchy = "yes" *) alu alu0(aluif);
-  (* keep_hierarchy = "yes" *) multiplier mul0(clk, nrst, mulif);
-  (* keep_hierarchy = "yes" *) divider div0(clk, nrst, divif);
+  (* keep_hierarchy = "yes" *) `MULTIPLIER_MODULE mul0(clk, nrst, mulif);
+  (* keep_hierarchy = "yes" *) `DIVIDER_MODULE div0(clk, nrst, divif);
   (* keep_hierarchy = "yes" *) register_file rf0(clk, nrst, rfif);
   (* keep_hierarchy = "yes" *) hazard_unit haz0(hazif);
   (* keep_hierarchy = "yes" *) forward_unit for0(fuif);
@@ -156,16 +166,19 @@ module datapath #(
   // STAGE 1 => STAGE 2: FETCH => DECODE
   always_ff @(posedge clk) begin
     if(~nrst) begin
+      f2dif.valid <= 0;
       f2dif.pc <= PC_INIT;
       f2dif.branch_predict <= 0;
       f2dif.branch_target <= 0;
       f2dif.inst_latch <= 0;
     end else if (f2dif.en & f2dif.flush) begin
+      f2dif.valid <= 0;
       f2dif.pc <= f2dif.pc;
       f2dif.branch_predict <= 0;
       f2dif.branch_target <= 0;
       f2dif.inst_latch <= 0;
     end else if (f2dif.en) begin
+      f2dif.valid <= 1;
       f2dif.pc <= pc;
       f2dif.branch_predict <= buif.fetch_predict;
       f2dif.branch_target <= buif.fetch_target;
@@ -213,6 +226,7 @@ module datapath #(
   logic mult_en_strobe;
   always_ff @(posedge clk) begin
     if(~nrst) begin
+      d2eif.valid <= '0;
       d2eif.pc <= PC_INIT;
       d2eif.halt <= '0;
       d2eif.alu_op <= ALU_ADD;
@@ -247,6 +261,7 @@ module datapath #(
       d2eif.illegal_inst <= '0;
       mult_en_strobe <= 1'b1;
     end else if (d2eif.en & d2eif.flush) begin
+      d2eif.valid <= '0;
       d2eif.pc <= d2eif.pc;
       d2eif.halt <= '0;
       d2eif.alu_op <= ALU_ADD;
@@ -281,6 +296,7 @@ module datapath #(
       d2eif.illegal_inst <= '0;
       mult_en_strobe <= 1'b1;
     end else if (d2eif.en) begin
+      d2eif.valid <= f2dif.valid;
       d2eif.pc <= f2dif.pc;
       d2eif.halt <= ctrlif.halt;
       d2eif.alu_op <= ctrlif.alu_op;
@@ -453,16 +469,18 @@ module datapath #(
     aluif.op = d2eif.alu_op;
 
     // Multiplier Unit
+    // Neither unit can be stopped once started, so an instruction behind a
+    // taken branch, which the hazard unit flushes, doesn't start one
     mulif.a = forwarded_rdat1;
     mulif.b = forwarded_rdat2;
-    mulif.en = d2eif.mult & mult_en_strobe;
+    mulif.en = d2eif.mult & mult_en_strobe & ~hazif.branch_flush;
     mulif.is_signed_a = d2eif.mult_signed_a;
     mulif.is_signed_b = d2eif.mult_signed_b;
 
     // Divider Unit
     divif.a = forwarded_rdat1;
     divif.b = forwarded_rdat2;
-    divif.en = d2eif.div & mult_en_strobe;
+    divif.en = d2eif.div & mult_en_strobe & ~hazif.branch_flush;
     divif.is_signed = d2eif.div_signed;
 
     execute_alu_out = aluif.out;
@@ -473,6 +491,7 @@ module datapath #(
   // STAGE 3 => STAGE 4: EXECUTE => MEMORY
   always_ff @(posedge clk) begin
     if(~nrst) begin
+      e2mif.valid <= '0;
       e2mif.pc <= PC_INIT;
       e2mif.halt <= '0;
       e2mif.rd <= '0;
@@ -497,6 +516,7 @@ module datapath #(
       e2mif.csr_wr_imm <= '0;
       e2mif.illegal_inst <= '0;
     end else if (e2mif.en & e2mif.flush) begin
+      e2mif.valid <= '0;
       e2mif.pc <= d2eif.pc;
       e2mif.halt <= '0;
       e2mif.rd <= '0;
@@ -521,6 +541,7 @@ module datapath #(
       e2mif.csr_wr_imm <= '0;
       e2mif.illegal_inst <= '0;
     end else if (e2mif.en) begin
+      e2mif.valid <= d2eif.valid;
       e2mif.pc <= d2eif.pc;
       e2mif.halt <= d2eif.halt;
       e2mif.rd <= d2eif.rd;
@@ -611,6 +632,7 @@ module datapath #(
   // STAGE 4 => STAGE 5: MEMORY => WRITEBACK
   always_ff @(posedge clk) begin
     if(~nrst) begin
+      m2wif.valid <= '0;
       m2wif.pc <= PC_INIT;
       m2wif.halt <= '0;
       m2wif.rd <= '0;
@@ -626,6 +648,7 @@ module datapath #(
       m2wif.csr_wr_op <= '0;
       m2wif.csr_wr_imm <= '0;
     end else if (m2wif.en & m2wif.flush) begin
+        m2wif.valid <= '0;
         m2wif.pc <= e2mif.pc;
         m2wif.halt <= '0;
         m2wif.rd <= '0;
@@ -641,6 +664,7 @@ module datapath #(
         m2wif.csr_wr_op <= '0;
         m2wif.csr_wr_imm <= '0;
     end else if (m2wif.en) begin
+        m2wif.valid <= e2mif.valid;
         m2wif.pc <= e2mif.pc;
         m2wif.halt <= e2mif.halt;
         m2wif.rd <= e2mif.rd;
@@ -741,6 +765,101 @@ module datapath #(
     endcase
   end
 
+  // Retire trace
+  // The instruction in writeback retires on the clock edge that moves it out
+  // of the stage. Bubbles, the halted ebreak and instructions flushed by an
+  // exception never get here. retire also counts minstret and system_tb's pc
+  // profile, the rest is only for the trace system_tb writes.
+  logic retire;
+  word_t retire_pc;
+  always_comb begin
+    retire = m2wif.en & m2wif.valid;
+    retire_pc = m2wif.pc;
+  end
+
+`ifdef SIMULATOR
+  // The instruction word and the store follow the instruction down the
+  // pipeline, under the same enables and flushes as the stage registers
+  always_ff @(posedge clk) begin
+    if(~nrst) begin
+      d2eif.inst <= NOP;
+      e2mif.inst <= NOP;
+      m2wif.inst <= NOP;
+      m2wif.dwrite <= '0;
+      m2wif.dstore <= '0;
+    end else begin
+      if (d2eif.en & d2eif.flush) begin
+        d2eif.inst <= NOP;
+      end else if (d2eif.en) begin
+        d2eif.inst <= ctrlif.inst;
+      end
+
+      if (e2mif.en & e2mif.flush) begin
+        e2mif.inst <= NOP;
+      end else if (e2mif.en) begin
+        e2mif.inst <= d2eif.inst;
+      end
+
+      if (m2wif.en & m2wif.flush) begin
+        m2wif.inst <= NOP;
+        m2wif.dwrite <= '0;
+        m2wif.dstore <= '0;
+      end else if (m2wif.en) begin
+        m2wif.inst <= e2mif.inst;
+        m2wif.dwrite <= e2mif.dwrite;
+        m2wif.dstore <= e2mif.rdat2;
+      end
+    end
+  end
+
+  word_t retire_inst;
+  reg_t retire_rd;
+  word_t retire_wdat;
+  logic [3:0] retire_wstrb;
+  word_t retire_maddr;
+  word_t retire_mdata;
+  always_comb begin
+    retire_inst = m2wif.inst;
+    retire_rd = m2wif.rd;
+    retire_wdat = (m2wif.rd != 0) ? rfif.wdat : '0;
+
+    // Byte lanes of the store, same alignment as the memory stage: the
+    // source register's low byte or halfword repeated across the word, and
+    // only the written lanes kept
+    casez(m2wif.dwrite)
+      2'b01: begin
+        retire_wstrb = 4'b0001 << m2wif.alu_out[1:0];
+        retire_mdata = {4{m2wif.dstore[7:0]}};
+      end
+      2'b10: begin
+        retire_wstrb = m2wif.alu_out[1] ? 4'b1100 : 4'b0011;
+        retire_mdata = {2{m2wif.dstore[15:0]}};
+      end
+      2'b11: begin
+        retire_wstrb = 4'b1111;
+        retire_mdata = m2wif.dstore;
+      end
+      default: begin
+        retire_wstrb = 4'b0000;
+        retire_mdata = '0;
+      end
+    endcase
+    retire_maddr = |retire_wstrb ? {m2wif.alu_out[31:2], 2'b00} : '0;
+    retire_mdata = retire_mdata & {{8{retire_wstrb[3]}}, {8{retire_wstrb[2]}}, {8{retire_wstrb[1]}}, {8{retire_wstrb[0]}}};
+  end
+`endif
+
+  // Performance counters
+  // mhpmcounter3: load-use bubbles, 4: data access stalls on the shared
+  // memory, 5: branch mispredict flushes, 6: multiplier/divider stalls,
+  // 7: instruction fetch stalls, 8: bubbles behind CSR writes
+  always_comb begin
+    csrif.csr_halt = m2wif.halt;
+    csrif.csr_retire = retire;
+    csrif.csr_hpm_event = {hazif.csr_stall_event, hazif.fetch_stall_event, hazif.muldiv_stall_event,
+                           hazif.branch_flush_event, hazif.mem_stall_event, hazif.load_use_event};
+  end
+
   // Program Counter Control
   always_comb begin
     pc_n = pc;
@@ -848,8 +967,9 @@ module datapath #(
       end
     end
 
-    // Give exception cause PC
-    euif.e2mif_pc = pc_n;
+    // Give exception cause PC: the instruction in memory, which the
+    // exception flushes, is the one that trapped or the one to resume at
+    euif.e2mif_pc = e2mif.pc;
 
     // If an exception occured, jump to the exception handler
     if(euif.exception) begin
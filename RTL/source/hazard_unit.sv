@@ -20,6 +20,14 @@ module hazard_unit (
         hazif.e2mif_flush = 0;
         hazif.m2wif_flush = 0;
 
+        // Performance counter events, set below by the hazard that applies
+        hazif.mem_stall_event = 0;
+        hazif.fetch_stall_event = 0;
+        hazif.load_use_event = 0;
+        hazif.muldiv_stall_event = 0;
+        hazif.csr_stall_event = 0;
+        hazif.branch_flush_event = 0;
+
         // Stop the pipeline when HALTed
         if(hazif.halt) begin
             hazif.f2dif_en = 0;
@@ -34,6 +42,7 @@ module hazard_unit (
             hazif.d2eif_en = 0;
             hazif.e2mif_en = 0;
             hazif.m2wif_en = 0;
+            hazif.mem_stall_event = 1;
         end
         // Stall to keep the pipeline from running away from the instruction reads
         else if(~hazif.dread & ~hazif.dwrite & ~hazif.ihit) begin
@@ -41,6 +50,7 @@ module hazard_unit (
             hazif.d2eif_en = 0;
             hazif.e2mif_en = 0;
             hazif.m2wif_en = 0;
+            hazif.fetch_stall_event = 1;
         end
         // Needed because during ld/st it has to wait for D access AND I access
         // Also gate with branch signal, if the branch signal is high
@@ -84,10 +94,14 @@ module hazard_unit (
                 // Give execute a bubble 
                 hazif.d2eif_en = 1;
                 hazif.d2eif_flush = 1;
+                hazif.load_use_event = 1;
             end
         end
         // Multiplier delay, wait to finish the multiplication
-        else if(hazif.d2eif_mult & ~hazif.mult_ready) begin
+        // Also gate with branch signal, the stalled stages would ignore the
+        // flush and the branch would be lost. datapath doesn't start the
+        // unit for an instruction that is about to be flushed.
+        else if(hazif.d2eif_mult & ~hazif.mult_ready & ~hazif.branch_flush) begin
             // Stall fetch to decode
             hazif.f2dif_en = 0;
             // Stall decode to execute
@@ -95,9 +109,10 @@ module hazard_unit (
             // Give memory a bubble
             hazif.e2mif_en = 1;
             hazif.e2mif_flush = 1;
+            hazif.muldiv_stall_event = 1;
         end
         // Divider delay, wait to finish the division
-        else if(hazif.d2eif_div & ~hazif.div_ready) begin
+        else if(hazif.d2eif_div & ~hazif.div_ready & ~hazif.branch_flush) begin
             // Stall fetch to decode
             hazif.f2dif_en = 0;
             // Stall decode to execute
@@ -105,6 +120,7 @@ module hazard_unit (
             // Give memory a bubble
             hazif.e2mif_en = 1;
             hazif.e2mif_flush = 1;
+            hazif.muldiv_stall_event = 1;
         end
         // CSR instruction should be completed before execute continues
         // Don't care on flush because execute will be flushed anyway
@@ -114,6 +130,7 @@ module hazard_unit (
             // Give execute a bubble
             hazif.d2eif_en = 1;
             hazif.d2eif_flush = 1;
+            hazif.csr_stall_event = 1;
         end
 
         /*******************/
@@ -130,6 +147,7 @@ module hazard_unit (
             hazif.f2dif_flush = 1;
             hazif.d2eif_flush = 1;
             hazif.e2mif_flush = 1;
+            hazif.branch_flush_event = 1;
         end
     end
 endmodule
@@ -14,7 +14,12 @@ module ram (
 
 // Number of words
 parameter RAM_SIZE = 32768; // 128kB
+// Latency, can be set with +define+RAM_LAT=<n> for parameter sweeps
+`ifdef RAM_LAT
+parameter LAT = `RAM_LAT;
+`else
 parameter LAT = 0;
+`endif
 
 // Counter state
 integer count;
@@ -53,6 +58,43 @@ reg [31:0] ram [0:RAM_SIZE-1];
 initial begin
     $readmemh("raminit.mem", ram);
 end
+
+// Backdoor for system_tb batch runs: clear the RAM and load the next image
+// while the system is held in reset
+task automatic load_image(input string filename);
+    for (int i = 0; i < RAM_SIZE; i++)
+        ram[i] = '0;
+    $readmemh(filename, ram);
+endtask
+
+// Backdoor dump for system_tb, much faster than reading the words over the
+// bus: every word as raw little-endian binary, or with pages set only the
+// PAGE_WORDS pages holding something nonzero, each after its byte address
+localparam PAGE_WORDS = 256;
+task automatic dump_image(input string filename, input bit pages);
+    int fd;
+    bit used;
+
+    fd = $fopen(filename, "wb");
+    if (fd == 0) begin
+        $display("Failed to open %s.", filename);
+        return;
+    end
+
+    for (int page = 0; page < RAM_SIZE; page += PAGE_WORDS) begin
+        used = ~pages;
+        for (int i = page; ~used && i < page + PAGE_WORDS; i++)
+            used = (ram[i] != 0);
+        if (used) begin
+            if (pages)
+                $fwrite(fd, "%u", page * 4);
+            for (int i = page; i < page + PAGE_WORDS; i++)
+                $fwrite(fd, "%u", ram[i]);
+        end
+    end
+
+    $fclose(fd);
+endtask
 always_ff @(posedge clk) begin
     begin
         if (|ram_if.wen) begin
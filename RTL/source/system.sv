@@ -37,6 +37,15 @@ ahb_bus_if cpu_abif();
 ahb_bus_if def_abif();
 ahb_bus_if ram_abif();
 ahb_bus_if uart_abif();
+`ifdef SIMULATOR
+ahb_bus_if console_abif();
+
+// Simulation console, read by system_tb
+logic sim_console_tx_valid;
+logic [7:0] sim_console_tx_data;
+logic sim_console_exited;
+word_t sim_console_exit_code;
+`endif
 
 ram_if ram_if();
 
@@ -101,6 +110,10 @@ ahb_multiplexor ahb_mux_inst (
     .abif_to_def(def_abif),
     .abif_to_ram(ram_abif),
     .abif_to_uart(uart_abif)
+`ifdef SIMULATOR
+    ,
+    .abif_to_console(console_abif)
+`endif
 );
 
 // AHB default satellite
@@ -128,6 +141,19 @@ ahb_uart_satellite uart_inst (
     .abif(uart_abif)
 );
 
+`ifdef SIMULATOR
+// Simulation console, bypasses the UART's bit timing
+ahb_sim_console_satellite sim_console_inst (
+    .clk(clk),
+    .nrst(nrst),
+    .tx_valid(sim_console_tx_valid),
+    .tx_data(sim_console_tx_data),
+    .exited(sim_console_exited),
+    .exit_code(sim_console_exit_code),
+    .abif(console_abif)
+);
+`endif
+
 // Shared Instruction-Data RAM
 ram ram_inst (
     .clk(clk),
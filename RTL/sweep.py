@@ -0,0 +1,294 @@
+# Parameter sweep over Verilator builds of the core: every variant of the
+# sweep is built with its own defines into its own object directory
+# (obj_dir_<variant>), in parallel, and then runs the assembly regression set
+# and the Code/ benchmarks. The table at the end shows per variant whether it
+# built, how many tests pass, the total benchmark cycles against the default
+# build and the simulation speed.
+#
+# The swept knobs are macros the RTL picks up with `ifndef defaults:
+#   BTB_BITS=<n>             branch_unit.sv, 2^n entry prediction buffers
+#   RAM_LAT=<n>              ram.sv, wait states of the simulation RAM
+#   ALWAYS_NOT_TAKEN=0|1     branch_unit.sv, static not taken prediction
+#   MULTIPLIER_MODULE=<name> datapath.sv, multiplier implementation
+#   DIVIDER_MODULE=<name>    datapath.sv, divider implementation
+# Each -p NAME=v1,v2 adds an axis and the variants are every combination of
+# them. Without -p every knob in DEFAULT_SWEEP is tried on its own.
+#
+# The multiplier and divider implementations other than multiplier.sv and
+# divider.sv are the ones in GENERATED_MODULES. They come from the generators
+# in Scripts/ and are written into the variant's object directory before it
+# is built.
+#
+# The default variant is the RTL without extra defines in obj_dir_default,
+# the obj_dir of simulate_verilator.py is left alone.
+
+import os
+import sys
+import time
+import argparse
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import simulate_verilator
+import benchmark
+import testasm
+from memcompare import compare_dumps
+from perfreport import halt_error
+from pipeline import ToolchainError, run_tool
+
+DEFAULT_TOP = "testbench/system_tb.sv"
+DEFAULT_VARIANT = "default"
+
+# Defines set without a value, 0 leaves them out
+FLAG_DEFINES = ["ALWAYS_NOT_TAKEN"]
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts")
+
+# Modules for MULTIPLIER_MODULE and DIVIDER_MODULE, by name: the generator in
+# Scripts/ and its arguments. The multipliers are single cycle 32-bit trees
+# with the signedness taken from multiplier_if.
+GENERATED_MODULES = {
+    "multiplier_wallace": ("wallace_tree_generator.py", ["-n", "32", "-s", "runtime", "-a", "wallace"]),
+    "multiplier_dadda": ("wallace_tree_generator.py", ["-n", "32", "-s", "runtime", "-a", "dadda"]),
+    "divider_nonrestoring": ("divider_generator.py", ["-a", "nonrestoring"]),
+    "divider_nonrestoring_early": ("divider_generator.py", ["-a", "nonrestoring", "-e"]),
+    "divider_srt4": ("divider_generator.py", ["-a", "srt4"]),
+    "divider_srt4_early": ("divider_generator.py", ["-a", "srt4", "-e"]),
+}
+
+# Knobs tried one at a time when no -p is given
+DEFAULT_SWEEP = [
+    ("BTB_BITS", ["3", "7"]),
+    ("RAM_LAT", ["1", "2"]),
+    ("ALWAYS_NOT_TAKEN", ["1"]),
+    ("MULTIPLIER_MODULE", ["multiplier_dadda"]),
+    ("DIVIDER_MODULE", ["divider_srt4_early"]),
+]
+
+# "NAME=v1,v2" to (NAME, [v1, v2])
+def parse_axis(text):
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError("expected NAME=value[,value...], got {}".format(text))
+    return (name, values.split(","))
+
+# Verilator defines of a variant's settings
+def variant_defines(settings):
+    defines = []
+    for name, value in settings:
+        if name in FLAG_DEFINES:
+            if value not in ("0", ""):
+                defines.append(name)
+        else:
+            defines.append("{}={}".format(name, value))
+    return defines
+
+# Name of a variant, usable as a directory and file name suffix
+def variant_name(settings):
+    if not settings:
+        return DEFAULT_VARIANT
+    return "-".join("{}{}".format(name.lower(), value) for name, value in settings)
+
+# The variants to build as (name, defines), the default build first
+def make_variants(axes):
+    if axes:
+        combinations = [list(zip([x[0] for x in axes], values)) for values in itertools.product(*[x[1] for x in axes])]
+    else:
+        combinations = [[(name, value)] for name, values in DEFAULT_SWEEP for value in values]
+
+    variants = [(DEFAULT_VARIANT, [])]
+    for settings in combinations:
+        defines = variant_defines(settings)
+        if defines and all(x[0] != variant_name(settings) for x in variants):
+            variants.append((variant_name(settings), defines))
+    return variants
+
+# Write the generated modules a variant's defines select into gen_dir
+def generate_modules(defines, gen_dir):
+    for define in defines:
+        name, _, module = define.partition("=")
+        if name in ("MULTIPLIER_MODULE", "DIVIDER_MODULE") and module in GENERATED_MODULES:
+            script, script_args = GENERATED_MODULES[module]
+            os.makedirs(gen_dir, exist_ok=True)
+            run_tool("generate", [sys.executable, script] + script_args + ["-m", module, "-o", os.path.abspath(os.path.join(gen_dir, module + ".sv"))],
+                     cwd=SCRIPTS_DIR)
+
+# Build a variant into its object directory, the Verilator output goes to
+# build.log there. Returns the error message, empty if it built.
+def build_variant(name, defines, top, threads, jobs):
+    mdir = simulate_verilator.variant_dir(name)
+    gen_dir = os.path.join(mdir, "generated")
+    os.makedirs(mdir, exist_ok=True)
+    with open(os.path.join(mdir, "build.log"), 'w') as log:
+        try:
+            generate_modules(defines, gen_dir)
+            simulate_verilator.build(top, defines, mdir, threads, jobs, [gen_dir], stdout=log, stderr=subprocess.STDOUT)
+        except ToolchainError as e:
+            log.write(e.output)
+            return "{} (see {})".format(e.message, os.path.relpath(log.name))
+    return ""
+
+# Simulate the built tests on a variant in one batch and compare the dumps.
+# The variant's dumps and counters get its name as a suffix so variants can
+# run at the same time. Returns the names of the failing tests.
+def run_tests(name, built, max_cycles):
+    entries = []
+    for file, workdir in built:
+        entries.append([os.path.join(workdir, "raminit.mem"), os.path.join(workdir, "ramcpu_{}.bin".format(name)),
+                        "-", os.path.join(workdir, "counters_{}.txt".format(name))])
+    manifest = os.path.join(testasm.WORK_DIR, "manifest.{}.txt".format(name))
+    simulate_verilator.write_manifest(entries, manifest)
+
+    try:
+        simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], simulate_verilator.variant_binary(name),
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except ToolchainError:
+        # A simulation that died still leaves the dumps of the tests before it
+        pass
+
+    # A test that didn't halt fails whatever its dump holds
+    failed = []
+    for file, workdir in built:
+        dump = os.path.join(workdir, "ramcpu_{}.bin".format(name))
+        if (not os.path.exists(dump) or halt_error(os.path.join(workdir, "counters_{}.txt".format(name)), max_cycles)
+                or not compare_dumps(os.path.join(workdir, "memsim.bin"), dump)[0]):
+            failed.append(file)
+    return failed
+
+# Run the benchmark programs on a variant. Returns their results by program
+# and the programs that couldn't be simulated or didn't halt, which are left
+# out of the results.
+def run_benchmarks(name, programs, max_cycles):
+    results = {}
+    failed = []
+    for program in programs:
+        try:
+            result = benchmark.run_program(program, max_cycles, simulate_verilator.variant_binary(name), "_" + name)
+        except (ToolchainError, OSError):
+            result = None
+        if result is not None and result["halted"]:
+            results[program] = result
+        else:
+            failed.append(program)
+    return results, failed
+
+# Build, test and benchmark one variant. Returns its row of the table.
+def sweep_variant(variant, args, built, programs):
+    name, defines = variant
+    row = {"variant": name, "defines": defines, "error": "", "failed": [], "benchmarks": {}, "failed_programs": []}
+
+    start = time.time()
+    if not args.no_build:
+        row["error"] = build_variant(name, defines, args.top, args.threads, args.build_jobs)
+    row["build_seconds"] = time.time() - start
+    if row["error"]:
+        return row
+    if not os.path.exists(simulate_verilator.variant_binary(name)):
+        row["error"] = "no simulation binary in {}".format(os.path.relpath(simulate_verilator.variant_dir(name)))
+        return row
+
+    row["failed"] = run_tests(name, built, args.max_cycles)
+    row["benchmarks"], row["failed_programs"] = run_benchmarks(name, programs, args.max_cycles)
+    return row
+
+def total_cycles(row):
+    return sum(x["cycles"] for x in row["benchmarks"].values())
+
+def cycles_per_second(row):
+    seconds = sum(x["seconds"] for x in row["benchmarks"].values())
+    return round(total_cycles(row) / seconds) if seconds else 0
+
+def format_table(rows, num_tests, num_programs):
+    base = rows[0] if rows and rows[0]["variant"] == DEFAULT_VARIANT and not rows[0]["error"] else None
+    header = "{:<32} {:<8} {:>9} {:>11} {:>14} {:>9} {:>10}".format("variant", "build", "tests", "benchmarks", "cycles", "change", "cycles/s")
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        if row["error"]:
+            lines.append("{:<32} {:<8}".format(row["variant"], "FAILED"))
+            continue
+        cycles = total_cycles(row)
+        change = ""
+        # Only comparable when the same programs halted on both
+        if base is not None and row is not base and total_cycles(base) and sorted(row["benchmarks"]) == sorted(base["benchmarks"]):
+            change = "{:+.2f}%".format(100 * (cycles - total_cycles(base)) / total_cycles(base))
+        lines.append("{:<32} {:<8} {:>9} {:>11} {:>14} {:>9} {:>10}".format(
+            row["variant"], "ok", "{}/{}".format(num_tests - len(row["failed"]), num_tests),
+            "{}/{}".format(len(row["benchmarks"]), num_programs), cycles, change, cycles_per_second(row)))
+    return '\n'.join(lines)
+
+def write_csv(path, rows, num_tests, num_programs):
+    with open(path, 'w') as file:
+        file.write("variant,defines,built,tests_passed,tests_total,benchmarks_halted,benchmarks_total,cycles,cycles_per_second\n")
+        for row in rows:
+            tests_passed = 0 if row["error"] else num_tests - len(row["failed"])
+            file.write("{},{},{},{},{},{},{},{},{}\n".format(row["variant"], " ".join(row["defines"]), 0 if row["error"] else 1,
+                                                            tests_passed, num_tests, len(row["benchmarks"]), num_programs,
+                                                            total_cycles(row), cycles_per_second(row)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build variants of the Verilator simulation with different defines and compare their tests and benchmark cycles")
+    parser.add_argument("-p", "--param", type=parse_axis, action="append", default=[], help="Sweep a define over comma separated values, e.g. BTB_BITS=3,5,7 (repeatable, the variants are every combination). MULTIPLIER_MODULE and DIVIDER_MODULE take {}".format(", ".join(GENERATED_MODULES)))
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="Variants built and run at a time (default: 2)")
+    parser.add_argument("--threads", type=int, default=4, help="Verilator --threads of every variant (default: 4)")
+    parser.add_argument("--build-jobs", type=int, default=None, help="Compiler processes of each Verilator build")
+    parser.add_argument("--top", default=DEFAULT_TOP, help="Top level to build (default: {})".format(DEFAULT_TOP))
+    parser.add_argument("-t", "--tests", default="", help="Only run the assembly tests starting with this prefix")
+    parser.add_argument("-b", "--benchmarks", nargs='*', default=None, help="Code/ programs to benchmark (default: all)")
+    parser.add_argument("--no-build", action="store_true", help="Use the variants already built in the obj_dir_* directories")
+    parser.add_argument("--no-compile", action="store_true", help="Use the benchmark images already in work/bench")
+    parser.add_argument("--max-cycles", type=int, default=benchmark.DEFAULT_MAX_CYCLES, help="Give up on a test or program that hasn't halted after this many cycles (default: {})".format(benchmark.DEFAULT_MAX_CYCLES))
+    parser.add_argument("--csv", default=None, help="Also write the table to this CSV file")
+    parser.add_argument("-l", "--list", action="store_true", help="Only list the variants and their defines")
+    args = parser.parse_args()
+
+    variants = make_variants(args.param)
+    if args.list:
+        for name, defines in variants:
+            print("{:<32} {}".format(name, " ".join("-D" + x for x in defines)))
+        sys.exit(0)
+
+    programs = benchmark.find_programs() if args.benchmarks is None else args.benchmarks
+    unknown = [x for x in programs if x not in benchmark.find_programs()]
+    if unknown:
+        print("No program {} in {}".format(', '.join(unknown), os.path.normpath(benchmark.CODE_DIR)))
+        sys.exit(1)
+
+    # The regression set and the benchmarks are the same for every variant,
+    # build and emulate them once
+    files = sorted(testasm.find_asm_files(args.tests))
+    built = []
+    for file in files:
+        file, workdir, error, _, _ = testasm.build_one(file)
+        if error:
+            print("{}: {}".format(file, error))
+            sys.exit(1)
+        built.append((file, workdir))
+    missing = [x for x in programs if args.no_compile and not os.path.exists(os.path.join(benchmark.BENCH_DIR, x, "raminit.mem"))]
+    if missing:
+        print("No image of {} in {}, run without --no-compile".format(', '.join(missing), benchmark.BENCH_DIR))
+        sys.exit(1)
+    try:
+        if not args.no_compile:
+            for name in programs:
+                print("Building {}".format(name))
+                benchmark.build_program(name)
+    except (ToolchainError, OSError) as e:
+        print(e)
+        sys.exit(1)
+
+    print("Sweeping {} variants over {} tests and {} programs".format(len(variants), len(built), len(programs)))
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        rows = list(pool.map(lambda x: sweep_variant(x, args, built, programs), variants))
+
+    for row in rows:
+        if row["error"]:
+            print("{}: {}".format(row["variant"], row["error"]))
+        elif row["failed"] or row["failed_programs"]:
+            print("{}: failed {}".format(row["variant"], ", ".join(row["failed"] + row["failed_programs"])))
+    print(format_table(rows, len(built), len(programs)))
+    if args.csv:
+        write_csv(args.csv, rows, len(built), len(programs))
+
+    if any(row["error"] or row["failed"] or row["failed_programs"] for row in rows):
+        sys.exit(1)
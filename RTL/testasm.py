@@ -2,8 +2,26 @@
 
 import os
 import sys
+import time
+import shutil
+import argparse
 import subprocess
-import difflib
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import simulate_verilator
+from memcompare import compare_dumps
+from perfreport import halt_error
+from tracecmp import compare_traces
+from testcache import TestCache, fingerprint, result_key
+from pipeline import ToolchainError, build_test, emulate
+
+# Directory holding the per-test scratch directories and the batch manifests
+WORK_DIR = "work"
+
+# Most tests one simulation process runs back to back, so results come in
+# while the rest are still building or simulating
+SHARD_SIZE = 8
 
 def find_asm_files(prompt):
     asm_dir = "Assembly"
@@ -22,75 +40,293 @@ def find_asm_files(prompt):
 
     return matching_files
 
-def diff_files(file1, file2):
-    f1 = open(file1, 'r')
-    f2 = open(file2, 'r')
+# Make the directory a test runs in. Each test gets its own directory under
+# WORK_DIR so that the fixed file names used by the scripts (raminit.mem,
+# meminit.hex, memsim.*, ramcpu.*, diff.log) don't collide.
+def prepare_workdir(file):
+    workdir = os.path.join(WORK_DIR, '.'.join(file.split('.')[:-1]))
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
 
-    f1_lines = f1.readlines()
-    f2_lines = f2.readlines()
+    # Copy the source in so the objects land in the work directory too
+    shutil.copy(os.path.join("Assembly", file), workdir)
 
-    diff = difflib.ndiff(f1_lines, f2_lines)
-    diff_str = ''.join(x for x in diff if x.startswith('- ') or x.startswith('+ '))
-    
-    f1.close()
-    f2.close()
+    return workdir
 
-    # Log diff to file
-    with open("diff.log", 'w') as file:
-        file.write(diff_str)
+# Assemble and emulate a single test case in its work directory. With trace
+# the golden model writes its retire trace as well. The key is the test's
+# result cache key, and a test whose key is in passed_keys isn't emulated.
+# Returns (file, workdir, error, seconds, key) so it can run in a worker
+# process.
+def build_one(file, trace=False, dump_ext=".bin", rtl_fingerprint="", options=(), passed_keys=frozenset()):
+    start = time.time()
 
-    if diff_str == "":
-        return True
-    
-    return False
+    workdir = prepare_workdir(file)
 
+    # Assemble the file, once, for both the RTL and the golden model
+    try:
+        image = build_test(os.path.join(workdir, file), workdir)
+    except ToolchainError as e:
+        return (file, workdir, "Error assembling file: {}".format(e), time.time() - start, None)
 
-def run_test():
-    if(len(sys.argv) < 2):
-        prompt = ""
+    key = result_key(os.path.join(workdir, "raminit.mem"), rtl_fingerprint, options)
+    if key in passed_keys:
+        return (file, workdir, "", time.time() - start, key)
+
+    # Emulate the image
+    try:
+        iss = emulate(image, os.path.join(workdir, "memsim" + dump_ext), os.path.join(workdir, "memsim.trace") if trace else None)
+    except ToolchainError as e:
+        return (file, workdir, "Error emulating file: {}".format(e), time.time() - start, key)
+
+    # What the test printed to the simulation console, the core has to print
+    # the same
+    with open(os.path.join(workdir, "memsim.console"), 'wb') as console:
+        console.write(iss.sim_console_output)
+
+    return (file, workdir, "", time.time() - start, key)
+
+# Simulate a shard of the built tests in one batch mode simulation process.
+# Every test also gets the performance counters in counters.txt for
+# perfreport.py, and its console output in ramcpu.console. Returns the
+# error message, empty if the simulation ran, and the seconds it took.
+def simulate_shard(shard_idx, workdirs, trace=False, max_cycles=0, dump_ext=".bin"):
+    entries = []
+    for workdir in workdirs:
+        entries.append([os.path.join(workdir, "raminit.mem"), os.path.join(workdir, "ramcpu" + dump_ext),
+                        os.path.join(workdir, "ramcpu.trace") if trace else "-", os.path.join(workdir, "counters.txt"),
+                        "-", os.path.join(workdir, "ramcpu.console")])
+
+    manifest = os.path.join(WORK_DIR, "manifest.{}.txt".format(shard_idx))
+    simulate_verilator.write_manifest(entries, manifest)
+
+    start = time.time()
+    try:
+        simulate_verilator.run_batch(manifest, ["+max_cycles={}".format(max_cycles)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        return ("Error simulating file: {}".format(e), time.time() - start)
+    return ("", time.time() - start)
+
+# Console output a model or simulation wrote, None without the file
+def read_console(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as file:
+        return file.read()
+
+# Compare the golden model against the simulation of a single test case.
+# Returns (file, status, message, seconds).
+def check_one(file, workdir, trace=False, dump_ext=".bin", max_cycles=0):
+    start = time.time()
+
+    if not os.path.exists(os.path.join(workdir, "ramcpu" + dump_ext)):
+        return (file, "ERROR", "Simulation produced no memory dump", 0.0)
+
+    # A core that hung or ran away fails whatever its RAM holds
+    error = halt_error(os.path.join(workdir, "counters.txt"), max_cycles)
+    if error:
+        return (file, "FAILED", error, time.time() - start)
+
+    # Compare the output, the report also lands in diff.log
+    elf = os.path.join(workdir, '.'.join(file.split('.')[:-1]) + ".elf")
+    success, message = compare_dumps(os.path.join(workdir, "memsim" + dump_ext), os.path.join(workdir, "ramcpu" + dump_ext), elf, os.path.join(workdir, "diff.log"))
+
+    # What the test printed to the simulation console, empty for most
+    expected = read_console(os.path.join(workdir, "memsim.console"))
+    actual = read_console(os.path.join(workdir, "ramcpu.console"))
+    if actual != expected:
+        success = False
+        report = "Console output {!r}, expected {!r}".format(actual, expected)
+        message = message + "\n\n" + report if message else report
+
+    # Find the first instruction where the CPU went wrong
+    if trace:
+        report = compare_traces(os.path.join(workdir, "memsim.trace"), os.path.join(workdir, "ramcpu.trace"))
+        if report is not None:
+            success = False
+            message = message + "\n\n" + report if message else report
+
+    return (file, "PASSED" if success else "FAILED", message, time.time() - start)
+
+def print_result(idx, num_files, result, cached=False):
+    file, status, message, seconds = result
+    print("Running test case ({}/{}): {}".format(idx+1, num_files, file).ljust(60), end='')
+
+    if status == "PASSED" and cached:
+        print("\x1b[32mPASSED\x1b[0m (cached)")
+    elif status == "PASSED":
+        print("\x1b[32mPASSED\x1b[0m ({:.1f}s)".format(seconds))
+    elif status == "FAILED":
+        print("\x1b[31mFAILED\x1b[0m ({:.1f}s)".format(seconds))
+        if message:
+            print(message)
     else:
-        prompt = sys.argv[1]
+        print("\x1b[31mERROR\x1b[0m  ({:.1f}s)".format(seconds))
+        print(message)
+
+    # Divider
+    print("-"*66)
+
+def print_summary(results, seconds):
+    passed = [r for r in results if r[1] == "PASSED"]
+    failed = [r for r in results if r[1] != "PASSED"]
+
+    print("{} passed, {} failed in {:.1f}s".format(len(passed), len(failed), seconds))
+    for file, status, _, _ in sorted(failed):
+        print("  {}: {}".format(status, file))
+
+# The slowest tests, to see where a sweep's time goes
+def print_timings(results, cached, count):
+    ran = sorted((r for r in results if r[0] not in cached), key=lambda r: -r[3])
+    if not ran:
+        return
+    print("Slowest test cases:")
+    for file, status, _, seconds in ran[:count]:
+        print("  {:>7.2f}s  {} ({})".format(seconds, file, status))
+
+# JUnit XML report for CI, cached tests are reported as passed in no time
+def write_junit(junit_path, results, cached, seconds):
+    suite = ET.Element("testsuite", name="testasm", tests=str(len(results)),
+                       failures=str(sum(1 for r in results if r[1] == "FAILED")),
+                       errors=str(sum(1 for r in results if r[1] == "ERROR")),
+                       time="{:.3f}".format(seconds))
+    for file, status, message, test_seconds in results:
+        case = ET.SubElement(suite, "testcase", classname="testasm", name=file,
+                             time="{:.3f}".format(0 if file in cached else test_seconds))
+        if status == "FAILED":
+            ET.SubElement(case, "failure", message=(message or "").split("\n")[0]).text = message
+        elif status == "ERROR":
+            ET.SubElement(case, "error", message=(message or "").split("\n")[0]).text = message
+        elif file in cached:
+            ET.SubElement(case, "system-out").text = "Cached result"
+    ET.ElementTree(suite).write(junit_path, encoding="utf-8", xml_declaration=True)
+
+def run_test():
+    parser = argparse.ArgumentParser(description="Simulate the CPU against the assembly test cases")
+    parser.add_argument("prompt", nargs='?', default="", help="Run test cases starting with this prefix")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Build test cases and run simulations this many at a time, 0 for all cores (default: 1)")
+    parser.add_argument("-t", "--trace", action="store_true",
+                        help="Also compare the per-instruction retire traces and report the first divergence")
+    parser.add_argument("--dump-format", choices=["bin", "pages", "hex"], default="bin",
+                        help="RAM dump format: raw binary or nonzero pages read straight from the RAM, or hex over the bus (default: bin)")
+    parser.add_argument("--max-cycles", type=int, default=1000000,
+                        help="Give up on a test that hasn't halted after this many cycles (default: 1000000, 0 for no limit)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Run every test case, even the ones with a cached pass for the same image, RTL and simulator")
+    parser.add_argument("--junit", default=None,
+                        help="Also write the results to this JUnit XML file")
+    parser.add_argument("--timings", type=int, nargs='?', const=10, default=0,
+                        help="List the slowest test cases (default: 10)")
+    args = parser.parse_args()
+
+    prompt = args.prompt
     matching_files = find_asm_files(prompt)
     if len(matching_files) == 0:
         print("No assembly files found for search term \"{}\"".format(prompt))
         sys.exit(1)
 
     num_files = len(matching_files)
+    jobs = max(1, args.jobs or os.cpu_count())
+    dump_ext = "." + args.dump_format
+    results = []
+    start = time.time()
+
+    # Tests that passed before with the same image, RTL, simulator and
+    # options aren't emulated or simulated again
+    cache = TestCache()
+    options = (args.trace, dump_ext, args.max_cycles)
+    rtl_fingerprint = fingerprint()
+    passed_keys = frozenset() if args.force else cache.passed_keys()
+
+    seconds = {}
+    keys = {}
+    cached = set()
+    build_seconds = 0.0
+    sim_seconds = 0.0
+    check_seconds = 0.0
+    num_built = 0
 
-    for idx, file in enumerate(matching_files):
-        print("Running test case ({}/{}): {}".format(idx+1, num_files, file).ljust(60), end='')
-
-        # Assemble the file
-        try:
-            subprocess.run("python assemble.py \"Assembly/{}\"".format(file), shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except Exception as e:
-            print("Error assembling file: {}".format(e))
-            sys.exit(1)
-
-        # Emulate the file
-        try:
-            subprocess.run("python emulate.py \"Assembly/{}.asm\"".format('.'.join(file.split('.')[:-1])), shell=True, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except Exception as e:
-            print("Error emulating file: {}".format(e))
-            sys.exit(1)
-
-        # Simulate the CPU
-        try:
-            subprocess.run("python simulate_verilator.py run".format('.'.join(file.split('.')[:-1])), shell=True, check=True, stdout=subprocess.DEVNULL)
-        except Exception as e:
-            print("Error simulating file: {}".format(e))
-            sys.exit(1)
-
-        # Compare the output
-        success = diff_files("memsim.hex", "ramcpu.hex")
-
-        if success:
-            print("\x1b[32mPASSED\x1b[0m")
-        else:
-            print("\x1b[31mFAILED\x1b[0m")
-        
-        # Divider
-        print("-"*66)
+    # Results are printed as they come in: cached and broken tests as soon as
+    # they are built, the others as their shard's simulation finishes
+    def report(result):
+        print_result(len(results), num_files, result, result[0] in cached)
+        results.append(result)
+
+    # Each test gets an even share of its shard's simulation time, on top of
+    # its own build and check time
+    def check_shard(shard, error, shard_seconds):
+        nonlocal check_seconds
+        for file, workdir in shard:
+            share = seconds[file] + shard_seconds / len(shard)
+            if error:
+                report((file, "ERROR", error, share))
+            else:
+                result = check_one(file, workdir, args.trace, dump_ext, args.max_cycles)
+                check_seconds += result[3]
+                report(result[:3] + (result[3] + share,))
+
+    # Fill every job's simulation process, but keep the shards small enough
+    # that even -j 1 reports as it goes
+    shard_size = max(1, min(SHARD_SIZE, -(-num_files // jobs)))
+    shards = {}
+    ready = []
+    num_shards = 0
+
+    # Simulate the built tests a shard at a time, the last one once every
+    # test is built
+    def submit_shards(sim_pool, last):
+        nonlocal ready, num_shards
+        while len(ready) >= shard_size or (last and ready):
+            shard, ready = ready[:shard_size], ready[shard_size:]
+            future = sim_pool.submit(simulate_shard, num_shards, [workdir for _, workdir in shard], args.trace, args.max_cycles, dump_ext)
+            shards[future] = shard
+            num_shards += 1
+
+    # Collect the shards whose simulation has finished
+    def collect_shards(wait):
+        nonlocal sim_seconds
+        for future in list(as_completed(shards) if wait else (f for f in shards if f.done())):
+            error, shard_seconds = future.result()
+            sim_seconds += shard_seconds
+            check_shard(shards.pop(future), error, shard_seconds)
+
+    # Assemble and emulate the tests, and simulate them as they are built
+    with ProcessPoolExecutor(max_workers=jobs) as build_pool, ThreadPoolExecutor(max_workers=jobs) as sim_pool:
+        builds = [build_pool.submit(build_one, file, args.trace, dump_ext, rtl_fingerprint, options, passed_keys)
+                  for file in matching_files]
+        for build in as_completed(builds):
+            file, workdir, error, test_seconds, key = build.result()
+            seconds[file] = test_seconds
+            keys[file] = key
+            build_seconds += test_seconds
+            if error:
+                report((file, "ERROR", error, test_seconds))
+            elif key in passed_keys:
+                cached.add(file)
+                report((file, "PASSED", "", cache.lookup(key)["seconds"]))
+            else:
+                ready.append((file, workdir))
+                num_built += 1
+            submit_shards(sim_pool, False)
+            collect_shards(False)
+        submit_shards(sim_pool, True)
+        collect_shards(True)
+
+    cache.record([(keys[r[0]], r[0], r[1], r[3]) for r in results if r[1] == "PASSED" and r[0] not in cached])
+
+    # Summed over the jobs, the phases overlap
+    print("Built in {:.1f}s, simulated {} test cases in {} shard(s) of up to {} in {:.1f}s, checked in {:.1f}s, {} cached".format(
+        build_seconds, num_built, num_shards, shard_size, sim_seconds, check_seconds, len(cached)))
+    if args.timings:
+        print_timings(results, cached, args.timings)
+    print_summary(results, time.time() - start)
+    if args.junit is not None:
+        write_junit(args.junit, results, cached, time.time() - start)
+
+    if any(r[1] != "PASSED" for r in results):
+        sys.exit(1)
 
 if __name__ == "__main__":
-    run_test()
\ No newline at end of file
+    run_test()
@@ -31,12 +31,32 @@ module system_tb;
     .cpu_ram_debug_if(cpu_ram_if)
   );
 
-  task automatic dump_memory();
-  `ifndef SIMULATOR
-    string filename = "../../../../ramcpu.hex";
-  `else
-    string filename = "ramcpu.hex";
-  `endif
+  // Simulation console (ahb_sim_console_satellite): bytes written to it go
+  // straight to stdout, or to the file given with +console=<file>, and a
+  // write to its exit register ends the program like a halt, with a status.
+`ifdef SIMULATOR
+  int consolefd = 0;
+  logic sim_exited;
+  word_t sim_exit_code;
+  assign sim_exited = system_inst.sim_console_exited;
+  assign sim_exit_code = system_inst.sim_console_exit_code;
+
+  always @(posedge clk) begin
+    if (nrst && system_inst.sim_console_tx_valid) begin
+      if (consolefd != 0)
+        $fwrite(consolefd, "%c", system_inst.sim_console_tx_data);
+      else begin
+        $write("%c", system_inst.sim_console_tx_data);
+        $fflush();
+      end
+    end
+  end
+`else
+  logic sim_exited = 1'b0;
+  word_t sim_exit_code = '0;
+`endif
+
+  task automatic dump_memory(string filename);
     int memfd;
 
     cpu_ram_if.iaddr = 0;
@@ -79,6 +99,123 @@ module system_tb;
     end
   endtask
 
+  // Dump the memory. In the simulator build a .bin name writes the whole RAM
+  // as raw little-endian words and a .pages name only its nonzero pages (see
+  // dump_image in ram.sv, ramdump.py reads both), straight from the RAM array.
+  // Anything else is walked over the bus into the .hex format Vivado runs use.
+  task automatic save_memory(string filename);
+  `ifdef SIMULATOR
+    if (filename.len() > 4 && filename.substr(filename.len() - 4, filename.len() - 1) == ".bin") begin
+      system_inst.ram_inst.dump_image(filename, 0);
+      return;
+    end
+    if (filename.len() > 6 && filename.substr(filename.len() - 6, filename.len() - 1) == ".pages") begin
+      system_inst.ram_inst.dump_image(filename, 1);
+      return;
+    end
+  `endif
+    dump_memory(filename);
+  endtask
+
+  // Retire trace, enabled with +trace=<file> (or per program in a manifest).
+  // One 24 byte record per retired instruction, six little-endian words: pc,
+  // instruction, rd | wstrb << 8, value written to rd, word address of the
+  // store, store data (masked to the written lanes). tracecmp.py compares it
+  // against the golden model.
+  int tracefd = 0;
+
+`ifdef SIMULATOR
+  always @(posedge clk) begin
+    if (tracefd != 0 && nrst && system_inst.cpu_inst.datapath_inst.retire) begin
+      $fwrite(tracefd, "%u%u%u%u%u%u",
+        system_inst.cpu_inst.datapath_inst.retire_pc,
+        system_inst.cpu_inst.datapath_inst.retire_inst,
+        {20'd0, system_inst.cpu_inst.datapath_inst.retire_wstrb, 3'd0, system_inst.cpu_inst.datapath_inst.retire_rd},
+        system_inst.cpu_inst.datapath_inst.retire_wdat,
+        system_inst.cpu_inst.datapath_inst.retire_maddr,
+        system_inst.cpu_inst.datapath_inst.retire_mdata);
+    end
+  end
+`endif
+
+  task automatic open_trace(string filename);
+  `ifdef SIMULATOR
+    tracefd = $fopen(filename, "wb");
+    if (tracefd == 0)
+      begin $display("Failed to open %s.", filename); $finish; end
+  `else
+    $display("+trace needs the retire trace of the SIMULATOR build.");
+  `endif
+  endtask
+
+  task automatic close_trace();
+    if (tracefd != 0)
+      $fclose(tracefd);
+    tracefd = 0;
+  endtask
+
+  // Cycles the current program has run for
+  integer num_cycles = 0;
+
+  // Performance counter dump, enabled with +counters=<file> (or per program
+  // in a manifest). One "<name> <value>" line per counter of csr.sv, read at
+  // halt, plus the cycles counted here. perfreport.py prints CPI and the
+  // stall breakdown from it.
+  task automatic save_counters(string filename, logic halted);
+    int fd;
+
+    fd = $fopen(filename, "w");
+    if (fd == 0)
+      begin $display("Failed to open %s.", filename); return; end
+
+    $fdisplay(fd, "halted %0d", halted);
+    if (sim_exited)
+      $fdisplay(fd, "exit_code %0d", $signed(sim_exit_code));
+    $fdisplay(fd, "cycles %0d", num_cycles);
+    $fdisplay(fd, "mcycle %0d", system_inst.cpu_inst.datapath_inst.csr0.mcycle);
+    $fdisplay(fd, "minstret %0d", system_inst.cpu_inst.datapath_inst.csr0.minstret);
+    for (int i = 0; i < HPM_EVENTS; i++)
+      $fdisplay(fd, "mhpmcounter%0d %0d", i + 3, system_inst.cpu_inst.datapath_inst.csr0.mhpmcounter[i]);
+    $fclose(fd);
+  endtask
+
+  // PC profile, enabled with +profile=<file> (or per program in a manifest).
+  // For every pc, the times it retired and the cycles spent on it: a cycle in
+  // which nothing retires (a stall, or the refill after a flush) counts
+  // against the next instruction to retire. Written at halt as
+  // "<pc> <retired> <cycles>" lines for pcprofile.py.
+  bit profiling = 0;
+  longint unsigned profile_retired [int unsigned];
+  longint unsigned profile_cycles [int unsigned];
+  longint unsigned profile_pending;
+
+  always @(posedge clk) begin
+    if (profiling && nrst && !halt) begin
+      profile_pending++;
+      if (system_inst.cpu_inst.datapath_inst.retire) begin
+        if (!profile_retired.exists(system_inst.cpu_inst.datapath_inst.retire_pc)) begin
+          profile_retired[system_inst.cpu_inst.datapath_inst.retire_pc] = 0;
+          profile_cycles[system_inst.cpu_inst.datapath_inst.retire_pc] = 0;
+        end
+        profile_retired[system_inst.cpu_inst.datapath_inst.retire_pc] += 1;
+        profile_cycles[system_inst.cpu_inst.datapath_inst.retire_pc] += profile_pending;
+        profile_pending = 0;
+      end
+    end
+  end
+
+  task automatic save_profile(string filename);
+    int fd;
+
+    fd = $fopen(filename, "w");
+    if (fd == 0)
+      begin $display("Failed to open %s.", filename); return; end
+
+    foreach (profile_retired[pc])
+      $fdisplay(fd, "%08x %0d %0d", pc, profile_retired[pc], profile_cycles[pc]);
+    $fclose(fd);
+  endtask
+
   // Clock generation
   initial begin
     clk = 0;
@@ -86,19 +223,33 @@ module system_tb;
   end
 
   // Run CPU
-  integer num_cycles = 0;
-  initial begin
+  // Resets the whole system, loads imagefile into the RAM while in reset (an
+  // empty name keeps what is there, raminit.mem on the first run), runs until
+  // halt and dumps the memory (and the counters and the profile, when given a
+  // file for them).
+  // +max_cycles=<n> gives up on programs that don't halt so a batch can carry
+  // on.
+  longint max_cycles = 0;
+  task automatic run_program(string imagefile, string dumpfile, string countersfile = "", string profilefile = "");
     rxd = 1;
     cpu_ram_if.override_ctrl = 0;
     nrst = 1;
     #10;
     nrst = 0;
+  `ifdef SIMULATOR
+    if (imagefile != "")
+      system_inst.ram_inst.load_image(imagefile);
+  `endif
     #10;
     nrst = 1;
 
     num_cycles = 0;
+    profile_retired.delete();
+    profile_cycles.delete();
+    profile_pending = 0;
+    profiling = (profilefile != "" && profilefile != "-");
   
-    while(!halt) begin
+    while(!halt && !sim_exited && (max_cycles == 0 || longint'(num_cycles) < max_cycles)) begin
       // if(num_cycles == 1000) begin
       //   rxd = 0; // Send start bit to trigger interrupt
       // end else begin
@@ -121,11 +272,129 @@ module system_tb;
     cpu_ram_if.override_ctrl = 1;
 
     // Print cycles and time
-    $display("CPU halted after %d cycles, %.2f ns",num_cycles, $realtime());
+    if (sim_exited)
+      $display("Program exited with status %0d after %d cycles, %.2f ns", $signed(sim_exit_code), num_cycles, $realtime());
+    else if (halt)
+      $display("CPU halted after %d cycles, %.2f ns",num_cycles, $realtime());
+    else
+      $display("CPU did not halt within %d cycles, %.2f ns",num_cycles, $realtime());
+
+    save_memory(dumpfile);
+    if (countersfile != "" && countersfile != "-")
+      save_counters(countersfile, halt || sim_exited);
+    if (profiling)
+      save_profile(profilefile);
+    profiling = 0;
+  endtask
+
+  // Batch mode, +manifest=<file>: one program per line,
+  //   <raminit.mem> <dump.hex|.bin|.pages> [<trace> [<counters> [<profile> [<console>]]]]
+  // all run in this one process. A file of "-" isn't written. A program with
+  // a console file writes its console output there instead of +console.
+  // Blank lines and lines starting with # are skipped.
+  task automatic run_manifest(string filename);
+    int fd;
+    int num_programs = 0;
+  `ifdef SIMULATOR
+    int savedfd;
+  `endif
+    string line, imagefile, dumpfile, tracefile, countersfile, profilefile, consolefile;
+
+    fd = $fopen(filename, "r");
+    if (fd == 0)
+      begin $display("Failed to open %s.", filename); $finish; end
+
+    while ($fgets(line, fd) != 0) begin
+      imagefile = "";
+      dumpfile = "";
+      tracefile = "";
+      countersfile = "";
+      profilefile = "";
+      consolefile = "";
+      // Not the count $sscanf returns: Verilator's is -1 when a line has
+      // fewer fields than the format
+      void'($sscanf(line, "%s %s %s %s %s %s", imagefile, dumpfile, tracefile, countersfile, profilefile, consolefile));
+      // No continue here, Verilator loses the count across the suspension
+      // in run_program when the loop has one
+      if (imagefile != "" && dumpfile != "" && imagefile.substr(0, 0) != "#") begin
+        $display("Running %s.", imagefile);
+        if (tracefile != "" && tracefile != "-")
+          open_trace(tracefile);
+      `ifdef SIMULATOR
+        savedfd = consolefd;
+        if (consolefile != "" && consolefile != "-") begin
+          consolefd = $fopen(consolefile, "w");
+          if (consolefd == 0)
+            begin $display("Failed to open %s.", consolefile); $finish; end
+        end
+      `endif
+        run_program(imagefile, dumpfile, countersfile, profilefile);
+        close_trace();
+      `ifdef SIMULATOR
+        if (consolefd != savedfd) begin
+          $fclose(consolefd);
+          consolefd = savedfd;
+        end
+      `endif
+        num_programs++;
+      end
+    end
+
+    $fclose(fd);
+    $display("Finished %0d programs.", num_programs);
+  endtask
+
+  initial begin
+    string manifest, tracefile, countersfile, profilefile, wavefile, consolefile;
+  `ifndef SIMULATOR
+    static string dumpfile = "../../../../ramcpu.hex";
+  `else
+    static string dumpfile = "ramcpu.hex";
+  `endif
 
-    dump_memory();
+    void'($value$plusargs("max_cycles=%d", max_cycles));
+    void'($value$plusargs("dump=%s", dumpfile));
+    if (!$value$plusargs("counters=%s", countersfile))
+      countersfile = "";
+    if (!$value$plusargs("profile=%s", profilefile))
+      profilefile = "";
 
+  `ifdef SIMULATOR
+    if ($value$plusargs("console=%s", consolefile)) begin
+      consolefd = $fopen(consolefile, "w");
+      if (consolefd == 0)
+        begin $display("Failed to open %s.", consolefile); $finish; end
+    end
+  `endif
+
+    // Waveform of the whole run with +wave=<file> (VCD, or FST when built
+    // with --trace-fst), for pipestats.py
+    if ($value$plusargs("wave=%s", wavefile)) begin
+      $dumpfile(wavefile);
+      $dumpvars(0, system_tb);
+    end
+
+    if ($value$plusargs("manifest=%s", manifest)) begin
+    `ifdef SIMULATOR
+      run_manifest(manifest);
+    `else
+      $display("+manifest needs the RAM backdoor of the SIMULATOR build.");
+    `endif
+    end else begin
+      if ($value$plusargs("trace=%s", tracefile))
+        open_trace(tracefile);
+      run_program("", dumpfile, countersfile, profilefile);
+      close_trace();
+    end
+
+  `ifdef SIMULATOR
+    if (consolefd != 0)
+      $fclose(consolefd);
+    // The simulation's exit status follows the program's when it ran alone
+    if (manifest == "" && sim_exited && sim_exit_code != 0)
+      $fatal(1, "Program exited with status %0d.", $signed(sim_exit_code));
+  `endif
     $finish;
   end
 
-endmodule
\ No newline at end of file
+endmodule
@@ -0,0 +1,87 @@
+# Cache of passing test results for testasm.py, so a sweep only simulates
+# the tests whose outcome could have changed.
+#
+# A result is keyed on a hash of the assembled image, the options it was run
+# with and a fingerprint of everything else that decides the outcome: the
+# RTL and testbench sources, the simulation binary and the golden model.
+# Results are appended to a JSON lines file, the last line for a key wins.
+
+import os
+import json
+import time
+import hashlib
+
+import simulate_verilator
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(SCRIPT_DIR, ".testcache", "results.jsonl")
+
+# Directories of the RTL and the scripts making and checking the expected
+# results
+RTL_DIRS = ["source", "include", "testbench"]
+GOLDEN_FILES = ["iss.py", "elf32.py", "memimage.py", "memcompare.py", "tracecmp.py", "pipeline.py", "linkerscript.ld"]
+
+def hash_file(hasher, path):
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(chunk)
+
+# Hash of the RTL, the simulation binary and the golden model
+def fingerprint():
+    hasher = hashlib.sha256()
+    paths = []
+    for directory in RTL_DIRS:
+        for root, _, files in os.walk(os.path.join(SCRIPT_DIR, directory)):
+            paths += [os.path.join(root, x) for x in files]
+    paths += [os.path.join(SCRIPT_DIR, x) for x in GOLDEN_FILES]
+    paths.append(simulate_verilator.SIM_BINARY)
+
+    for path in sorted(paths):
+        hasher.update(os.path.relpath(path, SCRIPT_DIR).replace("\\", "/").encode() + b"\0")
+        if os.path.exists(path):
+            hash_file(hasher, path)
+        else:
+            hasher.update(b"missing")
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+# Key of a test: its image, the fingerprint and the options of the run
+def result_key(image_path, rtl_fingerprint, options):
+    hasher = hashlib.sha256()
+    hash_file(hasher, image_path)
+    hasher.update(rtl_fingerprint.encode())
+    hasher.update(repr(options).encode())
+    return hasher.hexdigest()
+
+class TestCache:
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        self.results[entry["key"]] = entry
+                    except (ValueError, KeyError):
+                        # A line cut short by an interrupted run
+                        continue
+
+    # Keys of the results that passed
+    def passed_keys(self):
+        return frozenset(key for key, entry in self.results.items() if entry["status"] == "PASSED")
+
+    def lookup(self, key):
+        return self.results.get(key)
+
+    def record(self, entries):
+        # A forced rerun with the same outcome adds nothing
+        entries = [x for x in entries if self.results.get(x[0], {}).get("status") != x[2]]
+        if not entries:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a') as file:
+            for key, test, status, seconds in entries:
+                entry = {"key": key, "test": test, "status": status, "seconds": round(seconds, 3), "time": int(time.time())}
+                self.results[key] = entry
+                file.write(json.dumps(entry) + "\n")
@@ -0,0 +1,103 @@
+# Compare the retire trace of the golden model (iss.py --trace) against the one
+# system_tb writes with +trace=<file>, stopping at the first instruction where
+# they disagree.
+#
+# Both traces are streamed in chunks so long C programs don't have to fit in
+# memory. A record is six little-endian words:
+#   pc, instruction, rd | wstrb << 8, value written to rd,
+#   word address of the store, store data masked to the written byte lanes
+# rd is 0 for instructions that don't write a register, wstrb is 0 for
+# instructions that don't store.
+
+import sys
+import argparse
+from struct import Struct
+from collections import deque
+from itertools import islice, zip_longest
+
+RECORD = Struct('<6I')
+
+# Records read per chunk
+CHUNK_RECORDS = 4096
+
+FIELDS = ("pc", "instruction", "rd/wstrb", "rd value", "store address", "store data")
+
+def read_records(file_path):
+    with open(file_path, 'rb') as file:
+        while True:
+            chunk = file.read(RECORD.size * CHUNK_RECORDS)
+            if not chunk:
+                break
+            extra = len(chunk) % RECORD.size
+            if extra:
+                # Truncated last record, the simulation was probably killed
+                chunk = chunk[:-extra]
+            yield from RECORD.iter_unpack(chunk)
+
+def format_record(idx, record):
+    if record is None:
+        return "#{:<8} <end of trace>".format(idx)
+
+    pc, inst, rd_wstrb, wdata, maddr, mdata = record
+    rd = rd_wstrb & 0x1F
+    wstrb = (rd_wstrb >> 8) & 0xF
+
+    text = "#{:<8} pc={:08X} inst={:08X}".format(idx, pc, inst)
+    # Zero fields are left out unless they hold something they shouldn't
+    if rd or wdata:
+        text += "  x{:<2}<= {:08X}".format(rd, wdata)
+    if wstrb or maddr or mdata:
+        text += "  mem[{:08X}]/{:04b} <= {:08X}".format(maddr, wstrb, mdata)
+    return text
+
+# Returns None when the traces match, otherwise a report of the first
+# divergence with `context` instructions either side
+def compare_traces(golden_path, dut_path, context=8, golden_name="golden", dut_name="rtl"):
+    history = deque(maxlen=context)
+    width = max(len(golden_name), len(dut_name))
+
+    golden = read_records(golden_path)
+    dut = read_records(dut_path)
+
+    for idx, (expected, actual) in enumerate(zip_longest(golden, dut)):
+        if expected == actual:
+            history.append((idx, expected))
+            continue
+
+        lines = ["Traces diverge at instruction {}".format(idx)]
+        if expected is not None and actual is not None:
+            differs = [FIELDS[i] for i in range(len(FIELDS)) if expected[i] != actual[i]]
+            lines[0] += " ({} differs)".format(", ".join(differs))
+        lines.append("")
+
+        for hist_idx, record in history:
+            lines.append("  {}  {}".format(" " * width, format_record(hist_idx, record)))
+        lines.append("  {}  {}".format(golden_name.ljust(width), format_record(idx, expected)))
+        lines.append("  {}  {}".format(dut_name.ljust(width), format_record(idx, actual)))
+
+        # What each side did next
+        for name, records in ((golden_name, golden), (dut_name, dut)):
+            following = list(islice(records, context))
+            if following:
+                lines.append("")
+                lines.append("  Then {}:".format(name))
+                for offset, record in enumerate(following, 1):
+                    lines.append("  {}  {}".format(" " * width, format_record(idx + offset, record)))
+
+        return '\n'.join(lines)
+
+    return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two retire traces and report the first divergence")
+    parser.add_argument("golden", help="Trace from the golden model")
+    parser.add_argument("dut", help="Trace from the RTL simulation")
+    parser.add_argument("-c", "--context", type=int, default=8, help="Instructions to show around the divergence (default: 8)")
+    args = parser.parse_args()
+
+    report = compare_traces(args.golden, args.dut, args.context)
+    if report is None:
+        print("Traces match.")
+    else:
+        print(report)
+        sys.exit(1)
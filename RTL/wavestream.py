@@ -0,0 +1,186 @@
+# Stream the value changes of selected signals out of a VCD or FST waveform
+# without loading it, so the multi-GB dumps of a --trace build of long
+# programs can be processed in constant memory.
+#
+# VCD is parsed line by line. FST is binary and compressed, so it is decoded
+# by GTKWave's fst2vcd and its VCD output streamed through the same parser.
+#
+# Signals are selected by hierarchical name: a requested name matches every
+# signal whose full dotted name ends with it, e.g. "f2dif.valid" matches
+# "TOP.system_tb.system_inst.cpu_inst.datapath_inst.f2dif.valid". Values are
+# integers, or None while any bit is x or z.
+
+import os
+import sys
+import argparse
+import subprocess
+
+# Tool decoding FST to VCD on stdout (GTKWave)
+FST2VCD = "fst2vcd"
+
+class WaveError(Exception):
+    pass
+
+# Lines of a waveform, decoding FST on the fly
+def read_lines(file_path):
+    if os.path.splitext(file_path)[1].lower() == ".fst":
+        try:
+            process = subprocess.Popen([FST2VCD, "-f", file_path], stdout=subprocess.PIPE, text=True, bufsize=1 << 20)
+        except FileNotFoundError:
+            raise WaveError("{} is needed to read FST files (it comes with GTKWave)".format(FST2VCD))
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+    else:
+        with open(file_path, 'r', buffering=1 << 20) as file:
+            yield from file
+
+def parse_value(text):
+    try:
+        return int(text, 2)
+    except ValueError:
+        # x or z in any bit
+        return None
+
+def name_matches(full_name, name):
+    return full_name == name or full_name.endswith("." + name)
+
+# Parse the header. Returns {identifier code: [requested names]} for the
+# signals that match one of names, and the line iterator positioned after
+# $enddefinitions. Raises WaveError when a name matches no signal, or more
+# than one unrelated signal.
+def read_header(lines, names):
+    scopes = []
+    codes = {}
+    matched = {name: set() for name in names}
+    tokens = []
+
+    for line in lines:
+        tokens += line.split()
+        if not tokens or tokens[-1] != "$end":
+            continue
+
+        keyword = tokens[0]
+        if keyword == "$scope":
+            scopes.append(tokens[2])
+        elif keyword == "$upscope":
+            scopes.pop()
+        elif keyword == "$var":
+            # $var <type> <width> <code> <reference> [<bit range>] $end
+            code = tokens[3]
+            full_name = '.'.join(scopes + [tokens[4]])
+            for name in names:
+                if name_matches(full_name, name):
+                    matched[name].add(full_name)
+                    codes.setdefault(code, []).append(name)
+        elif keyword == "$enddefinitions":
+            break
+        tokens = []
+
+    for name, full_names in matched.items():
+        if not full_names:
+            raise WaveError("No signal matches {}".format(name))
+        # Aliases of one net (a port and what it connects to) share a code
+        if len({code for code, requested in codes.items() if name in requested}) > 1:
+            raise WaveError("{} is ambiguous: {}".format(name, ", ".join(sorted(full_names))))
+
+    return codes
+
+# Yield (time, {name: value}) at the end of every time step in which a
+# selected signal changed. The dict is the one being updated, so copy it to
+# keep it.
+def stream_changes(file_path, names):
+    lines = read_lines(file_path)
+    codes = read_header(lines, names)
+    values = {name: None for name in names}
+    time = None
+    changed = False
+
+    for line in lines:
+        char = line[:1]
+        if char == '#':
+            if changed:
+                yield time, values
+                changed = False
+            time = int(line[1:])
+        elif char in '01xzXZ':
+            code = line[1:].rstrip()
+            if code in codes:
+                value = int(char) if char in '01' else None
+                for name in codes[code]:
+                    values[name] = value
+                changed = True
+        elif char in 'bB':
+            text, code = line[1:].split()
+            if code in codes:
+                value = parse_value(text)
+                for name in codes[code]:
+                    values[name] = value
+                changed = True
+        # $dumpvars/$end and real values (r...) need nothing
+
+    if changed:
+        yield time, values
+
+# Yield the values of the selected signals as they were just before every
+# rising edge of clock, which is what the flip-flops clocked by it see, so
+# each item is one clock cycle. The dict is reused between cycles.
+def stream_cycles(file_path, clock, names):
+    names = list(names)
+    all_names = names + ([clock] if clock not in names else [])
+    lines = read_lines(file_path)
+    codes = read_header(lines, all_names)
+    clock_codes = {code for code, requested in codes.items() if clock in requested}
+
+    values = {name: None for name in all_names}
+    sample = {name: None for name in names}
+    pending = []
+    rising = False
+
+    # Changes are held until the end of their time step: if the clock rose
+    # in it, the cycle is sampled before they are applied
+    for line in lines:
+        char = line[:1]
+        if char == '#':
+            if rising:
+                for name in names:
+                    sample[name] = values[name]
+                yield sample
+                rising = False
+            for code, value in pending:
+                for name in codes[code]:
+                    values[name] = value
+            pending = []
+        elif char in '01xzXZ':
+            code = line[1:].rstrip()
+            if code in codes:
+                value = int(char) if char in '01' else None
+                if code in clock_codes and value == 1 and values[clock] == 0:
+                    rising = True
+                pending.append((code, value))
+        elif char in 'bB':
+            text, code = line[1:].split()
+            if code in codes:
+                pending.append((code, parse_value(text)))
+
+    if rising:
+        for name in names:
+            sample[name] = values[name]
+        yield sample
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the value changes of selected signals of a VCD or FST waveform")
+    parser.add_argument("wave", help="Waveform (.vcd or .fst)")
+    parser.add_argument("signals", nargs='+', help="Signals, by the end of their hierarchical name (e.g. f2dif.valid)")
+    args = parser.parse_args()
+
+    try:
+        print("time," + ','.join(args.signals))
+        for time, values in stream_changes(args.wave, args.signals):
+            print("{},{}".format(time, ','.join("x" if values[x] is None else "{:X}".format(values[x]) for x in args.signals)))
+    except WaveError as e:
+        print(e)
+        sys.exit(1)
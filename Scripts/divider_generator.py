@@ -0,0 +1,747 @@
+# Generate divider variants with the same interface as RTL/source/divider.sv
+# (divider_if), check them and estimate how many cycles they take.
+#
+# Algorithms:
+#   nonrestoring  radix-2 non-restoring, one quotient bit per cycle
+#   srt4          radix-4 SRT with quotient digits -2..2 and a normalized
+#                 divisor, two quotient bits per cycle
+#
+# With early-out the number of iterations comes from the leading zero counts
+# of the operands, so only the quotient bits that can be nonzero are
+# computed (none at all when |a| < |b|).
+#
+# Every variant has a NumPy model of its registers, cycle by cycle, which is
+# what the Verilog is written from. The model is run over large batches of
+# operands and compared against Python's integer division (with RISC-V's
+# division by zero and overflow results), and gives the cycles each division
+# holds the execute stage for. The Verilog is then simulated in Verilator on
+# the same operands and checked against the model, cycles included.
+
+import os
+import sys
+import argparse
+import itertools
+import tempfile
+import subprocess
+import numpy as np
+from math import ceil
+from fractions import Fraction
+
+# divider_if.vh and the headers it includes
+RTL_INCLUDE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "RTL", "include")
+
+XLEN = 32
+MASK = (1 << XLEN) - 1
+INT_MIN = 1 << (XLEN-1)
+
+ALGORITHMS = ["nonrestoring", "srt4"]
+
+# Width of the SRT partial remainder and of the remainder shifted by one digit
+SRT_W_BITS = 35
+SRT_Y_BITS = 37
+# Largest quotient digit and the redundancy factor a / (r - 1) of the SRT
+# digit set
+SRT_MAX_DIGIT = 2
+SRT_RHO = Fraction(2, 3)
+
+# Lowest shifted partial remainder estimate (in units of 2^-y_frac_bits) at
+# which each digit -1..2 is chosen, for every divisor interval given by the
+# top d_bits of the normalized divisor (the leading one included). None when
+# that precision can not always pick a digit that keeps the remainder in
+# range. The estimate is the shifted remainder truncated, so it is at most
+# one unit below the real value.
+def srt_thresholds(d_bits, y_frac_bits):
+    table = []
+    for d_top in range(1 << (d_bits-1), 1 << d_bits):
+        d_lo = Fraction(d_top, 1 << d_bits)
+        d_hi = Fraction(d_top + 1, 1 << d_bits)
+        row = []
+        for k in range(1 - SRT_MAX_DIGIT, SRT_MAX_DIGIT + 1):
+            # k is allowed for (k - rho) d <= y <= (k + rho) d, for every d of
+            # the interval, and the estimates just below must still allow k-1
+            lowest = max((k - SRT_RHO) * d_lo, (k - SRT_RHO) * d_hi)
+            highest_below = min((k - 1 + SRT_RHO) * d_lo, (k - 1 + SRT_RHO) * d_hi)
+            threshold = ceil(lowest * (1 << y_frac_bits))
+            if Fraction(threshold, 1 << y_frac_bits) > highest_below:
+                return None
+            row.append(threshold)
+        table.append(row)
+    return table
+
+# The smallest precision that works, as (d_bits, y_frac_bits, table)
+def find_srt_table():
+    for total in range(2, 16):
+        for d_bits in range(2, total):
+            table = srt_thresholds(d_bits, total - d_bits)
+            if table is not None:
+                return d_bits, total - d_bits, table
+    raise ValueError("No SRT digit selection table found")
+
+SRT_D_BITS, SRT_Y_FRAC_BITS, SRT_TABLE = find_srt_table()
+
+# Leading zeros of XLEN-bit values (XLEN for zero)
+def clz(x):
+    return XLEN - np.frexp(x.astype(np.float64))[1].astype(np.int64)
+
+# Number of iterations of a division of magnitudes n by d. Without early-out
+# all the quotient bits are computed. For SRT the first digit has to leave a
+# partial remainder within 2/3 of the divisor, which takes one more bit than
+# the quotient has.
+def iterations(algorithm, early_out, n, d):
+    if algorithm == "nonrestoring":
+        if not early_out:
+            return np.full(len(n), XLEN, dtype=np.int64)
+        return np.maximum(clz(d) - clz(n) + 1, 0)
+
+    if not early_out:
+        return np.full(len(n), XLEN // 2 + 1, dtype=np.int64)
+    bits = clz(d) - clz(n) + 1
+    return np.where(bits > 0, bits // 2 + 1, 0)
+
+def model_nonrestoring(early_out, n, d):
+    k = iterations("nonrestoring", early_out, n, d)
+    n = n.astype(np.uint64)
+    # Partial remainder, the dividend bits still to shift in (from the top)
+    # and the quotient
+    r = (n >> k.astype(np.uint64)).astype(np.int64)
+    bits = (n << (XLEN - k).astype(np.uint64)) & np.uint64(MASK)
+    q = np.zeros(len(n), dtype=np.uint64)
+    d = d.astype(np.int64)
+
+    for step in range(int(k.max(initial=0))):
+        active = step < k
+        r2 = 2*r + (bits >> np.uint64(XLEN-1)).astype(np.int64)
+        r_next = np.where(r < 0, r2 + d, r2 - d)
+        q_next = ((q << np.uint64(1)) | (r_next >= 0).astype(np.uint64)) & np.uint64(MASK)
+        r = np.where(active, r_next, r)
+        q = np.where(active, q_next, q)
+        bits = np.where(active, (bits << np.uint64(1)) & np.uint64(MASK), bits)
+
+    rem = np.where(r < 0, r + d, r)
+    return q, rem.astype(np.uint64), k
+
+def model_srt4(early_out, n, d):
+    digits = iterations("srt4", early_out, n, d)
+    shift = np.where(d > 0, clz(d), 0).astype(np.uint64)
+    dn = (d.astype(np.uint64) << shift) & np.uint64(MASK)
+    nd = n.astype(np.uint64) << shift
+    # Partial remainder, the dividend bits still to shift in (from the top)
+    # and the quotient with its value minus one (on-the-fly conversion)
+    w = (nd >> (2*digits).astype(np.uint64)).astype(np.int64)
+    x = np.where(digits > 0, nd << (64 - 2*digits).astype(np.uint64), np.uint64(0))
+    q = np.zeros(len(n), dtype=np.uint64)
+    qm = np.full(len(n), MASK, dtype=np.uint64)
+
+    table = np.array(SRT_TABLE, dtype=np.int64)
+    thresholds = table[(dn >> np.uint64(XLEN - SRT_D_BITS)).astype(np.int64) & ((1 << (SRT_D_BITS-1)) - 1)]
+    dn_signed = dn.astype(np.int64)
+    mask = np.uint64(MASK)
+
+    for step in range(int(digits.max(initial=0))):
+        active = step < digits
+        # The digit selection relies on |w| <= 2/3 dn, which also bounds w
+        # by 2^32 and is why the Verilog can keep w in SRT_W_BITS while y,
+        # four times as large, takes SRT_Y_BITS: the bits of y - digit dn
+        # above w are copies of its sign
+        assert np.all(~active | (3 * np.abs(w) <= 2 * dn_signed)), "SRT partial remainder out of range"
+        y = 4*w + (x >> np.uint64(62)).astype(np.int64)
+        estimate = y >> (XLEN - SRT_Y_FRAC_BITS)
+        digit = (estimate[:, None] >= thresholds).sum(axis=1) - (SRT_MAX_DIGIT - 1) - 1
+        w_next = y - digit * dn_signed
+        assert np.all(~active | ((w_next >= -(1 << (SRT_W_BITS-1))) & (w_next < 1 << (SRT_W_BITS-1)))), "SRT partial remainder wider than w"
+
+        low = (digit & 3).astype(np.uint64)
+        q_shift = (q << np.uint64(2)) & mask
+        qm_shift = (qm << np.uint64(2)) & mask
+        q_next = np.where(digit >= 0, q_shift | low, qm_shift | low)
+        qm_next = np.where(digit > 0, q_shift | ((digit - 1) & 3).astype(np.uint64), qm_shift | ((digit + 3) & 3).astype(np.uint64))
+
+        w = np.where(active, w_next, w)
+        q = np.where(active, q_next, q)
+        qm = np.where(active, qm_next, qm)
+        x = np.where(active, x << np.uint64(2), x)
+
+    negative = w < 0
+    quotient = np.where(negative, qm, q)
+    rem = (np.where(negative, w + dn_signed, w).astype(np.uint64) & mask) >> shift
+    return quotient, rem, digits
+
+MODELS = {"nonrestoring": model_nonrestoring, "srt4": model_srt4}
+
+# q, r, div_by_zero, overflow and the cycles in execute (en up to and
+# including the cycle ready is high) of every division of a by b
+def divide(algorithm, early_out, a, b, is_signed):
+    a = a.astype(np.uint64)
+    b = b.astype(np.uint64)
+    div_by_zero = b == 0
+    overflow = is_signed & (a == INT_MIN) & (b == MASK)
+    special = div_by_zero | overflow
+
+    neg_a = is_signed & (a >> np.uint64(XLEN-1) == 1)
+    neg_b = is_signed & (b >> np.uint64(XLEN-1) == 1)
+    n = np.where(neg_a, (~a + np.uint64(1)) & np.uint64(MASK), a)
+    d = np.where(neg_b, (~b + np.uint64(1)) & np.uint64(MASK), b)
+    # The special cases skip the division (and the model must not divide by 0)
+    n = np.where(special, 0, n)
+    d = np.where(special, 1, d)
+
+    quotient, rem, steps = MODELS[algorithm](early_out, n, d)
+
+    q = np.where(neg_a ^ neg_b, (~quotient + np.uint64(1)) & np.uint64(MASK), quotient)
+    r = np.where(neg_a, (~rem + np.uint64(1)) & np.uint64(MASK), rem)
+    q = np.where(div_by_zero, np.uint64(MASK), np.where(overflow, np.uint64(INT_MIN), q))
+    r = np.where(div_by_zero, a, np.where(overflow, np.uint64(0), r))
+
+    # en (IDLE), PRECHECK, the iterations and DONE
+    cycles = np.where(special, 3, steps + 3)
+    return q, r, div_by_zero, overflow, cycles
+
+# Cycles of RTL/source/divider.sv: en, PRECHECK, 32 iterations and DONE, or
+# straight to its DONE_DIV_BY_ZERO/DONE_OVERFLOW states
+def baseline_cycles(a, b, is_signed):
+    special = (b == 0) | (is_signed & (a == INT_MIN) & (b == MASK))
+    return np.where(special, 3, XLEN + 3)
+
+# RISC-V division by Python's integer division, which rounds towards minus
+# infinity where RISC-V truncates
+def expected_results(a, b, is_signed):
+    results = []
+    for x, y, signed in zip(a.tolist(), b.tolist(), is_signed.tolist()):
+        if signed:
+            x = x - (1 << XLEN) if x & INT_MIN else x
+            y = y - (1 << XLEN) if y & INT_MIN else y
+        if y == 0:
+            results.append((MASK, x & MASK))
+            continue
+        q = abs(x) // abs(y)
+        if (x < 0) != (y < 0):
+            q = -q
+        results.append((q & MASK, (x - q*y) & MASK))
+    return results
+
+# Operands every variant is checked with: powers of two and their neighbours,
+# both extremes of each signedness and alternating bits
+def corner_operands():
+    values = {0, MASK, INT_MIN, INT_MIN - 1, 0x55555555, 0xAAAAAAAA, 3, 7, 10}
+    for bit in range(XLEN):
+        values |= {1 << bit, (1 << bit) - 1, ((1 << bit) + 1) & MASK, (-(1 << bit)) & MASK}
+    values = sorted(values)
+    return [(a, b, signed) for a, b in itertools.product(values, values) for signed in (False, True)]
+
+# Operand distributions for the cycle report, each a function of the random
+# generator and a count giving (a, b, is_signed)
+def uniform_operands(rng, count):
+    return (rng.integers(0, 1 << XLEN, count, dtype=np.uint64), rng.integers(0, 1 << XLEN, count, dtype=np.uint64),
+            rng.integers(0, 2, count).astype(bool))
+
+def log_uniform(rng, count, max_bits=XLEN):
+    bits = rng.integers(1, max_bits + 1, count).astype(np.uint64)
+    return rng.integers(0, 1 << XLEN, count, dtype=np.uint64) >> (np.uint64(XLEN) - bits)
+
+def log_uniform_operands(rng, count):
+    return log_uniform(rng, count), log_uniform(rng, count), rng.integers(0, 2, count).astype(bool)
+
+def small_operands(rng, count):
+    return (rng.integers(0, 1 << 16, count, dtype=np.uint64), rng.integers(0, 1 << 16, count, dtype=np.uint64),
+            np.zeros(count, dtype=bool))
+
+def small_quotient_operands(rng, count):
+    b = np.maximum(log_uniform(rng, count, XLEN - 4), np.uint64(1))
+    a = b * rng.integers(0, 16, count, dtype=np.uint64) + rng.integers(0, 1 << XLEN, count, dtype=np.uint64) % b
+    return a, b, np.zeros(count, dtype=bool)
+
+def mantissa_operands(rng, count):
+    mantissa = lambda: rng.integers(1 << 23, 1 << 24, count, dtype=np.uint64)
+    return mantissa() << np.uint64(8), mantissa(), np.zeros(count, dtype=bool)
+
+DISTRIBUTIONS = {
+    "uniform": uniform_operands,
+    "log-uniform": log_uniform_operands,
+    "16-bit": small_operands,
+    "quotient<16": small_quotient_operands,
+    "mantissa": mantissa_operands,
+}
+
+# The corner operands and num_random random ones of every distribution, as
+# batches of (a, b, is_signed)
+def verification_batches(num_random, seed=0):
+    rng = np.random.default_rng(seed)
+    a, b, signed = (np.array(x) for x in zip(*corner_operands()))
+    batches = [(a.astype(np.uint64), b.astype(np.uint64), signed.astype(bool))]
+    for distribution in DISTRIBUTIONS.values():
+        batches.append(distribution(rng, num_random))
+    return batches
+
+# Check a variant's model on the corner operands and num_random random ones
+# of every distribution. Returns (divisions checked, first mismatch or None)
+def verify(algorithm, early_out, num_random, seed=0):
+    checked = 0
+    for a, b, is_signed in verification_batches(num_random, seed):
+        q, r, div_by_zero, overflow, _ = divide(algorithm, early_out, a, b, is_signed)
+        actual = list(zip(q.tolist(), r.tolist()))
+        for idx, expected in enumerate(expected_results(a, b, is_signed)):
+            if actual[idx] != expected or bool(div_by_zero[idx]) != (int(b[idx]) == 0):
+                return checked + idx, (int(a[idx]), int(b[idx]), bool(is_signed[idx]), actual[idx], expected)
+        checked += len(a)
+    return checked, None
+
+def format_mismatch(mismatch):
+    a, b, is_signed, actual, expected = mismatch
+    return "{} 0x{:08X} / 0x{:08X}: q=0x{:08X} r=0x{:08X}, expected q=0x{:08X} r=0x{:08X}".format(
+        "signed" if is_signed else "unsigned", a, b, actual[0], actual[1], expected[0], expected[1])
+
+# Mean and worst cycles per division of each distribution
+def cycle_report(algorithm, early_out, count, seed=0):
+    rng = np.random.default_rng(seed)
+    report = []
+    for name, distribution in DISTRIBUTIONS.items():
+        a, b, is_signed = distribution(rng, count)
+        if algorithm is None:
+            cycles = baseline_cycles(a, b, is_signed)
+        else:
+            cycles = divide(algorithm, early_out, a, b, is_signed)[4]
+        report.append((name, cycles.mean(), int(cycles.max())))
+    return report
+
+def variant_name(algorithm, early_out):
+    if algorithm is None:
+        return "divider.sv"
+    return algorithm + (" early-out" if early_out else "")
+
+def format_cycle_table(variants, count, seed=0):
+    lines = ["{:<24}".format("cycles (mean/max)") + "".join("{:>14}".format(name) for name in DISTRIBUTIONS)]
+    for algorithm, early_out in variants:
+        report = cycle_report(algorithm, early_out, count, seed)
+        lines.append("{:<24}".format(variant_name(algorithm, early_out)) + "".join("{:>14}".format("{:.1f}/{}".format(mean, worst)) for _, mean, worst in report))
+    return '\n'.join(lines)
+
+class DividerWriter:
+    def __init__(self, algorithm, early_out, out=sys.stdout):
+        self.algorithm = algorithm
+        self.early_out = early_out
+        self.out = out
+
+    def write(self, text):
+        self.out.write(text + "\n")
+
+    def write_header(self, name):
+        description = {"nonrestoring": "Radix-2 Non-Restoring Divider", "srt4": "Radix-4 SRT Divider"}[self.algorithm]
+        if self.early_out:
+            description += " with Leading Zero Early-Out"
+        self.write("`timescale 1ns/1ns")
+        self.write("")
+        self.write("`include \"common_types.vh\"")
+        self.write("import common_types_pkg::*;")
+        self.write("`include \"divider_if.vh\"")
+        self.write("")
+        self.write("// {}, generated by Scripts/divider_generator.py".format(description))
+        self.write("")
+        self.write("module {} (".format(name))
+        self.write("    input logic clk, nrst,")
+        self.write("    divider_if.div divider_if")
+        self.write(");")
+        self.write("")
+        self.write("typedef enum logic [1:0] {")
+        self.write("    IDLE = 2'b00,")
+        self.write("    PRECHECK = 2'b01,")
+        self.write("    DIVIDE = 2'b10,")
+        self.write("    DONE = 2'b11")
+        self.write("} divider_state_t;")
+        self.write("")
+        self.write("divider_state_t state, next_state;")
+        self.write("")
+        self.write("// Magnitudes of the operands, the signs of the results and the special")
+        self.write("// cases, taken when en is high")
+        self.write("logic [31:0] n, d, a_in;")
+        self.write("logic neg_q, neg_r, div_by_zero, overflow;")
+        self.write("")
+        self.write("function automatic logic [5:0] lzc(input logic [31:0] x);")
+        self.write("    lzc = 6'd32;")
+        self.write("    for (int i = 0; i < 32; i++) begin")
+        self.write("        if (x[i]) lzc = 6'(31 - i);")
+        self.write("    end")
+        self.write("endfunction")
+        self.write("")
+
+    # Latching the operands in IDLE and the next state are the same for every
+    # algorithm, only the counter differs
+    def write_control(self, count_bits):
+        self.write("always_ff @(posedge clk) begin")
+        self.write("    if (!nrst) begin")
+        self.write("        state <= IDLE;")
+        self.write("        n <= 32'd0;")
+        self.write("        d <= 32'd0;")
+        self.write("        a_in <= 32'd0;")
+        self.write("        neg_q <= 1'b0;")
+        self.write("        neg_r <= 1'b0;")
+        self.write("        div_by_zero <= 1'b0;")
+        self.write("        overflow <= 1'b0;")
+        self.write("    end else begin")
+        self.write("        state <= next_state;")
+        self.write("        if (state == IDLE && divider_if.en) begin")
+        self.write("            // Magnitudes of signed operands")
+        self.write("            n <= (divider_if.is_signed && divider_if.a[31]) ? ~divider_if.a + 32'd1 : divider_if.a;")
+        self.write("            d <= (divider_if.is_signed && divider_if.b[31]) ? ~divider_if.b + 32'd1 : divider_if.b;")
+        self.write("            a_in <= divider_if.a;")
+        self.write("            neg_q <= divider_if.is_signed && (divider_if.a[31] ^ divider_if.b[31]);")
+        self.write("            neg_r <= divider_if.is_signed && divider_if.a[31];")
+        self.write("            div_by_zero <= divider_if.b == 32'd0;")
+        self.write("            overflow <= divider_if.is_signed && divider_if.a == 32'h80000000 && divider_if.b == 32'hFFFFFFFF;")
+        self.write("        end")
+        self.write("    end")
+        self.write("end")
+        self.write("")
+        self.write("// Next state")
+        self.write("always_comb begin")
+        self.write("    next_state = state;")
+        self.write("")
+        self.write("    case (state)")
+        self.write("        IDLE: begin")
+        self.write("            if (divider_if.en) begin")
+        self.write("                next_state = PRECHECK;")
+        self.write("            end")
+        self.write("        end")
+        self.write("")
+        self.write("        PRECHECK: begin")
+        self.write("            if (div_by_zero || overflow || iterations == {}'d0) begin".format(count_bits))
+        self.write("                next_state = DONE;      // Special case or nothing to divide")
+        self.write("            end else begin")
+        self.write("                next_state = DIVIDE;")
+        self.write("            end")
+        self.write("        end")
+        self.write("")
+        self.write("        DIVIDE: begin")
+        self.write("            if (count == {}'d1) begin".format(count_bits))
+        self.write("                next_state = DONE;      // Last iteration")
+        self.write("            end")
+        self.write("        end")
+        self.write("")
+        self.write("        DONE: begin")
+        self.write("            next_state = IDLE;")
+        self.write("        end")
+        self.write("    endcase")
+        self.write("end")
+        self.write("")
+
+    # Outputs from the quotient and remainder magnitudes, held until the next
+    # division so they stay valid while the pipeline is stalled
+    def write_outputs(self):
+        self.write("// Outputs")
+        self.write("always_comb begin")
+        self.write("    divider_if.ready = (state == IDLE && !divider_if.en) || state == DONE;")
+        self.write("    divider_if.div_by_zero = div_by_zero;")
+        self.write("    divider_if.overflow = overflow;")
+        self.write("")
+        self.write("    divider_if.q = neg_q ? ~quotient + 32'd1 : quotient;  // Correct sign")
+        self.write("    divider_if.r = neg_r ? ~remainder + 32'd1 : remainder;    // Correct sign")
+        self.write("")
+        self.write("    if (div_by_zero) begin")
+        self.write("        // Set the quotient to all ones and remainder to dividend")
+        self.write("        divider_if.q = 32'hFFFFFFFF;")
+        self.write("        divider_if.r = a_in;")
+        self.write("    end else if (overflow) begin")
+        self.write("        // Set the quotient to dividend and remainder to 0")
+        self.write("        divider_if.q = 32'h80000000;")
+        self.write("        divider_if.r = 32'd0;")
+        self.write("    end")
+        self.write("end")
+        self.write("")
+
+    def write_nonrestoring(self):
+        self.write("// Partial remainder (within -d..d), the dividend bits still to shift in")
+        self.write("// and the quotient")
+        self.write("logic signed [33:0] r, r_shift, r_next;")
+        self.write("logic [31:0] bits, q;")
+        self.write("logic [5:0] count, iterations;")
+        self.write("")
+        if self.early_out:
+            self.write("// Only the quotient bits below the leading one of n / d can be nonzero")
+            self.write("logic signed [6:0] quotient_bits;")
+            self.write("assign quotient_bits = $signed({1'b0, lzc(d)}) - $signed({1'b0, lzc(n)}) + 7'sd1;")
+            self.write("assign iterations = quotient_bits[6] ? 6'd0 : quotient_bits[5:0];")
+        else:
+            self.write("assign iterations = 6'd32;")
+        self.write("")
+        self.write_control(6)
+        self.write("always_comb begin")
+        self.write("    r_shift = {r[32:0], bits[31]};             // Shift in the next bit of the dividend")
+        self.write("    r_next = r[33] ? r_shift + $signed({2'b00, d}) : r_shift - $signed({2'b00, d});")
+        self.write("end")
+        self.write("")
+        self.write("always_ff @(posedge clk) begin")
+        self.write("    if (!nrst) begin")
+        self.write("        r <= '0;")
+        self.write("        bits <= 32'd0;")
+        self.write("        q <= 32'd0;")
+        self.write("        count <= 6'd0;")
+        self.write("    end else if (state == PRECHECK) begin")
+        self.write("        r <= $signed({2'b00, n >> iterations});  // Dividend bits above the quotient")
+        self.write("        bits <= iterations == 6'd0 ? 32'd0 : n << (6'd32 - iterations);")
+        self.write("        q <= 32'd0;")
+        self.write("        count <= iterations;")
+        self.write("    end else if (state == DIVIDE) begin")
+        self.write("        r <= r_next;")
+        self.write("        bits <= {bits[30:0], 1'b0};")
+        self.write("        q <= {q[30:0], ~r_next[33]};               // 1 when the remainder stays positive")
+        self.write("        count <= count - 6'd1;")
+        self.write("    end")
+        self.write("end")
+        self.write("")
+        self.write("logic [31:0] quotient, remainder;")
+        self.write("logic signed [33:0] r_corrected;")
+        self.write("always_comb begin")
+        self.write("    quotient = q;")
+        self.write("    r_corrected = r[33] ? r + $signed({2'b00, d}) : r;  // Restore a negative remainder")
+        self.write("    remainder = r_corrected[31:0];")
+        self.write("end")
+        self.write("")
+
+    def write_srt4(self):
+        w_top = SRT_W_BITS - 1
+        y_top = SRT_Y_BITS - 1
+        est_low = XLEN - SRT_Y_FRAC_BITS
+        row_bits = SRT_D_BITS - 1
+
+        self.write("// Divisor normalized to have its top bit set and how far it was shifted")
+        self.write("logic [31:0] dn;")
+        self.write("logic [4:0] shift;")
+        self.write("")
+        self.write("// Partial remainder (within 2/3 of dn), the dividend bits still to shift in")
+        self.write("// (from the top) and the quotient and quotient minus one, converted from")
+        self.write("// the digits on the fly")
+        self.write("logic signed [{}:0] w, w_next;".format(w_top))
+        self.write("logic signed [{}:0] y;".format(y_top))
+        self.write("logic [63:0] x, nd;")
+        self.write("logic [31:0] q, qm;")
+        self.write("logic [4:0] count, iterations;")
+        self.write("")
+        self.write("assign nd = {32'd0, n} << lzc(d);")
+        if self.early_out:
+            self.write("// A digit for every two quotient bits below the leading one of n / d, plus")
+            self.write("// one so the first partial remainder is small enough")
+            self.write("logic signed [6:0] quotient_bits;")
+            self.write("assign quotient_bits = $signed({1'b0, lzc(d)}) - $signed({1'b0, lzc(n)}) + 7'sd1;")
+            self.write("assign iterations = quotient_bits > 7'sd0 ? 5'(quotient_bits[5:1] + 6'd1) : 5'd0;")
+        else:
+            self.write("assign iterations = 5'd{};".format(XLEN // 2 + 1))
+        self.write("")
+        self.write_control(5)
+        self.write("// Quotient digit from the shifted partial remainder truncated to {} fraction".format(SRT_Y_FRAC_BITS))
+        self.write("// bits and the top {} bits of the divisor".format(SRT_D_BITS))
+        self.write("logic signed [{}:0] estimate;".format(y_top - est_low))
+        self.write("logic signed [{}:0] t_m1, t_0, t_1, t_2;".format(y_top - est_low))
+        self.write("logic signed [2:0] digit;")
+        self.write("always_comb begin")
+        self.write("    y = {w, x[63:62]};                 // Shift in the next two bits of the dividend")
+        self.write("    estimate = y[{}:{}];".format(y_top, est_low))
+        self.write("")
+        self.write("    case (dn[{}:{}])".format(XLEN-2, XLEN - SRT_D_BITS))
+        width = y_top - est_low + 1
+        for idx, row in enumerate(SRT_TABLE):
+            values = ", ".join("{}{}'sd{}".format("-" if t < 0 else "", width, abs(t)) for t in row)
+            self.write("        {}'d{}: {{t_m1, t_0, t_1, t_2}} = {{{}}};".format(row_bits, idx, values))
+        self.write("    endcase")
+        self.write("")
+        self.write("    if (estimate >= t_2) digit = 3'sd2;")
+        self.write("    else if (estimate >= t_1) digit = 3'sd1;")
+        self.write("    else if (estimate >= t_0) digit = 3'sd0;")
+        self.write("    else if (estimate >= t_m1) digit = -3'sd1;")
+        self.write("    else digit = -3'sd2;")
+        self.write("")
+        twice = "$signed({{{}'d0, dn, 1'b0}})".format(SRT_Y_BITS - XLEN - 1)
+        once = "$signed({{{}'d0, dn}})".format(SRT_Y_BITS - XLEN)
+        self.write("    // |w_next| <= 2/3 dn, the bits above w are copies of the sign (asserted")
+        self.write("    // in model_srt4 of divider_generator.py)")
+        self.write("    case (digit)")
+        self.write("        3'sd2: w_next = {}'(y - {});".format(SRT_W_BITS, twice))
+        self.write("        3'sd1: w_next = {}'(y - {});".format(SRT_W_BITS, once))
+        self.write("        -3'sd1: w_next = {}'(y + {});".format(SRT_W_BITS, once))
+        self.write("        -3'sd2: w_next = {}'(y + {});".format(SRT_W_BITS, twice))
+        self.write("        default: w_next = {}'(y);".format(SRT_W_BITS))
+        self.write("    endcase")
+        self.write("end")
+        self.write("")
+        self.write("always_ff @(posedge clk) begin")
+        self.write("    if (!nrst) begin")
+        self.write("        w <= '0;")
+        self.write("        x <= 64'd0;")
+        self.write("        q <= 32'd0;")
+        self.write("        qm <= 32'd0;")
+        self.write("        dn <= 32'd0;")
+        self.write("        shift <= 5'd0;")
+        self.write("        count <= 5'd0;")
+        self.write("    end else if (state == PRECHECK) begin")
+        self.write("        dn <= d << lzc(d);")
+        self.write("        shift <= 5'(lzc(d));                  // d is only 0 when dividing by zero")
+        self.write("        w <= {}'($signed(nd >> {{iterations, 1'b0}}));  // Dividend bits above the first digit, < dn".format(SRT_W_BITS))
+        self.write("        x <= iterations == 5'd0 ? 64'd0 : nd << (7'd64 - {iterations, 1'b0});")
+        self.write("        q <= 32'd0;")
+        self.write("        qm <= 32'hFFFFFFFF;")
+        self.write("        count <= iterations;")
+        self.write("    end else if (state == DIVIDE) begin")
+        self.write("        w <= w_next;")
+        self.write("        x <= {x[61:0], 2'b00};")
+        self.write("        case (digit)")
+        self.write("            3'sd2: begin q <= {q[29:0], 2'd2}; qm <= {q[29:0], 2'd1}; end")
+        self.write("            3'sd1: begin q <= {q[29:0], 2'd1}; qm <= {q[29:0], 2'd0}; end")
+        self.write("            3'sd0: begin q <= {q[29:0], 2'd0}; qm <= {qm[29:0], 2'd3}; end")
+        self.write("            -3'sd1: begin q <= {qm[29:0], 2'd3}; qm <= {qm[29:0], 2'd2}; end")
+        self.write("            default: begin q <= {qm[29:0], 2'd2}; qm <= {qm[29:0], 2'd1}; end")
+        self.write("        endcase")
+        self.write("        count <= count - 5'd1;")
+        self.write("    end")
+        self.write("end")
+        self.write("")
+        self.write("logic [31:0] quotient, remainder;")
+        self.write("logic signed [{}:0] w_corrected;".format(w_top))
+        self.write("always_comb begin")
+        self.write("    // A negative final remainder takes one off the quotient")
+        self.write("    quotient = w[{}] ? qm : q;".format(w_top))
+        self.write("    w_corrected = w[{0}] ? w + $signed({{{1}'d0, dn}}) : w;".format(w_top, SRT_W_BITS - XLEN))
+        self.write("    remainder = w_corrected[31:0] >> shift;  // Undo the normalization")
+        self.write("end")
+        self.write("")
+
+    def write_module(self, name="divider"):
+        self.write_header(name)
+        if self.algorithm == "nonrestoring":
+            self.write_nonrestoring()
+        else:
+            self.write_srt4()
+        self.write_outputs()
+        self.write("endmodule")
+
+VARIANTS = [(algorithm, early_out) for algorithm in ALGORITHMS for early_out in (False, True)]
+
+# Testbench for verify_verilog: every "a b is_signed" line of vectors.txt is
+# one division, started with en for a cycle like the datapath does, and its
+# outputs and cycles (en up to and including ready) go to results.txt
+VERILOG_TESTBENCH = """`timescale 1ns/1ns
+
+`include "divider_if.vh"
+
+module divider_tb;
+    logic clk = 1'b0, nrst = 1'b0;
+    logic [31:0] a, b, is_signed;
+    int vectors, results, cycles;
+
+    divider_if dif();
+    divider_dut dut(clk, nrst, dif);
+
+    always #5 clk = ~clk;
+
+    initial begin
+        vectors = $fopen("vectors.txt", "r");
+        results = $fopen("results.txt", "w");
+        dif.en = 1'b0;
+        dif.a = 32'd0;
+        dif.b = 32'd0;
+        dif.is_signed = 1'b0;
+        @(negedge clk);
+        nrst = 1'b1;
+        while ($fscanf(vectors, "%h %h %h", a, b, is_signed) == 3) begin
+            @(negedge clk);
+            dif.a = a;
+            dif.b = b;
+            dif.is_signed = is_signed[0];
+            dif.en = 1'b1;
+            @(negedge clk);
+            dif.en = 1'b0;
+            cycles = 2;
+            while (!dif.ready) begin
+                @(negedge clk);
+                cycles++;
+            end
+            $fdisplay(results, "%h %h %0d %0d %0d", dif.q, dif.r, dif.div_by_zero, dif.overflow, cycles);
+        end
+        $fclose(results);
+        $finish;
+    end
+endmodule
+"""
+
+# Check the Verilog of a variant on the same divisions as verify, simulated
+# with Verilator, against the model: quotient, remainder, flags and cycles.
+# Returns (divisions checked, first mismatch or None)
+def verify_verilog(algorithm, early_out, num_random, seed=0, verilator="verilator"):
+    batches = verification_batches(num_random, seed)
+    a, b, is_signed = (np.concatenate(x) for x in zip(*batches))
+    q, r, div_by_zero, overflow, cycles = divide(algorithm, early_out, a, b, is_signed)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "divider_dut.sv"), 'w') as out:
+            DividerWriter(algorithm, early_out, out).write_module("divider_dut")
+        with open(os.path.join(workdir, "divider_tb.sv"), 'w') as out:
+            out.write(VERILOG_TESTBENCH)
+        with open(os.path.join(workdir, "vectors.txt"), 'w') as out:
+            out.writelines("{:08x} {:08x} {:x}\n".format(x, y, z) for x, y, z in zip(a.tolist(), b.tolist(), is_signed.tolist()))
+
+        build = [verilator, "--binary", "-sv", "--top-module", "divider_tb", "-I" + RTL_INCLUDE_DIR,
+                 "divider_tb.sv", "divider_dut.sv", "-o", "sim"]
+        subprocess.run(build, cwd=workdir, check=True, capture_output=True)
+        subprocess.run([os.path.join(workdir, "obj_dir", "sim")], cwd=workdir, check=True, capture_output=True)
+
+        with open(os.path.join(workdir, "results.txt"), 'r') as file:
+            results = [line.split() for line in file]
+
+    for idx, fields in enumerate(results):
+        actual = (int(fields[0], 16), int(fields[1], 16), int(fields[2]), int(fields[3]), int(fields[4]))
+        expected = (int(q[idx]), int(r[idx]), int(div_by_zero[idx]), int(overflow[idx]), int(cycles[idx]))
+        if actual != expected:
+            return idx, (int(a[idx]), int(b[idx]), bool(is_signed[idx]), actual, expected)
+    if len(results) != len(a):
+        return len(results), (int(a[len(results)]), int(b[len(results)]), bool(is_signed[len(results)]), None, None)
+    return len(results), None
+
+def format_verilog_mismatch(mismatch):
+    a, b, is_signed, actual, expected = mismatch
+    operands = "{} 0x{:08X} / 0x{:08X}".format("signed" if is_signed else "unsigned", a, b)
+    if actual is None:
+        return operands + ": no result from the simulation"
+    fields = "q=0x{:08X} r=0x{:08X} div_by_zero={} overflow={} cycles={}"
+    return "{}: {}, expected {}".format(operands, fields.format(*actual), fields.format(*expected))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a divider for divider_if, check it and report its cycles per division")
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="srt4", help="Division algorithm (default: srt4)")
+    parser.add_argument("-e", "--early-out", action="store_true", help="Skip the quotient bits above the leading one of a / b")
+    parser.add_argument("-m", "--module", default="divider", help="Module name (default: divider)")
+    parser.add_argument("-o", "--output", default=None, help="File to write the Verilog to (default: standard output)")
+    parser.add_argument("--verify", type=int, default=0, metavar="N", help="Check the model on the corner cases and N random divisions per distribution, then the Verilog against the model in Verilator")
+    parser.add_argument("--verilator", default="verilator", help="Verilator executable for --verify (default: verilator)")
+    parser.add_argument("--compare", action="store_true", help="Only report the cycles per division of every variant")
+    parser.add_argument("--samples", type=int, default=100000, help="Divisions per distribution for the cycle report (default: 100000)")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(format_cycle_table([(None, False)] + VARIANTS, args.samples))
+        sys.exit(0)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        DividerWriter(args.algorithm, args.early_out, out).write_module(args.module)
+    finally:
+        if args.output:
+            out.close()
+
+    print(format_cycle_table([(None, False), (args.algorithm, args.early_out)], args.samples), file=sys.stderr)
+
+    if args.verify:
+        checked, mismatch = verify(args.algorithm, args.early_out, args.verify)
+        if mismatch is not None:
+            print("Verification FAILED: " + format_mismatch(mismatch), file=sys.stderr)
+            sys.exit(1)
+        print("Verified {} divisions of the model".format(checked), file=sys.stderr)
+
+        try:
+            checked, mismatch = verify_verilog(args.algorithm, args.early_out, args.verify, verilator=args.verilator)
+        except OSError as e:
+            print("Verilog not verified, could not run Verilator: {}".format(e), file=sys.stderr)
+            sys.exit(1)
+        except subprocess.CalledProcessError as e:
+            print("Verilog not verified, {} exited with code {}:\n{}".format(e.cmd[0], e.returncode, (e.stdout + e.stderr).decode().strip()), file=sys.stderr)
+            sys.exit(1)
+        if mismatch is not None:
+            print("Verilog verification FAILED: " + format_verilog_mismatch(mismatch), file=sys.stderr)
+            sys.exit(1)
+        print("Verified {} divisions of the Verilog".format(checked), file=sys.stderr)
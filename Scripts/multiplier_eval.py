@@ -0,0 +1,201 @@
+# Check multiplier trees from wallace_tree_generator.py without an HDL
+# simulator, by evaluating the netlist the generator keeps (the function of
+# the tree only, not the latency of pipelined ones).
+#
+# The evaluation is bit-sliced: every wire is an array of 64-bit words where
+# bit k of word w is the wire's value for operand pair 64*w + k, so one NumPy
+# operation per gate evaluates a whole batch of multiplications. The products
+# are compared against Python's exact product of the same operands, which is
+# computed in uint64 (wrapping, so exact modulo 2^64) while the product fits
+# and with Python integers in object arrays beyond that.
+
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+
+from wallace_tree_generator import ALGORITHMS, SIGNEDNESS, TreeGenerator, NullWriter
+
+# Operand pairs evaluated at once, a multiple of 64
+BATCH_SIZE = 1 << 16
+
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Bit slices of the given integers, one array of lanes//64 words per bit
+def slices_from_ints(values, n, lanes):
+    bits = np.zeros((n, lanes), dtype=np.uint8)
+    for lane, value in enumerate(values):
+        bits[:, lane] = [(value >> i) & 1 for i in range(n)]
+    return np.packbits(bits, axis=1, bitorder='little').view('<u8')
+
+# Integers of each lane of the given bit slices, uint64 when they fit and an
+# object array of Python integers otherwise
+def ints_from_slices(slices):
+    bits = np.unpackbits(np.ascontiguousarray(slices).view(np.uint8), axis=1, bitorder='little')
+    num_bits = bits.shape[0]
+    padded = np.zeros((bits.shape[1], -(-num_bits // 64) * 64), dtype=np.uint8)
+    padded[:, :num_bits] = bits.T
+    limbs = np.packbits(padded, axis=1, bitorder='little').view('<u8')
+    if limbs.shape[1] == 1:
+        return limbs[:, 0]
+
+    values = np.zeros(limbs.shape[0], dtype=object)
+    for idx in range(limbs.shape[1]):
+        values += limbs[:, idx].astype(object) << (64 * idx)
+    return values
+
+# Values a, b and the signedness of both of operand pairs that hit the edges
+# of every partial product row: zero, one, all ones, the sign bit alone, the
+# largest positive value and alternating bits
+def corner_operands(n):
+    mask = (1 << n) - 1
+    alternating = mask // 3
+    values = sorted({0, 1, 2, mask, mask - 1, 1 << (n-1), mask >> 1, alternating, mask ^ alternating})
+    return list(itertools.product(values, values, (0, 1), (0, 1)))
+
+# Evaluate the netlist on bit slices of a and b (operand_width slices each)
+# and return the bit slices of multiplier_if.out
+def evaluate(generator, a, b):
+    words = a.shape[1]
+    wires = {}
+
+    for cell in generator.netlist:
+        kind = cell[0]
+        if kind == "pp":
+            _, dest, op, i, j = cell
+            if op == "one":
+                wires[dest] = np.full(words, ALL_ONES)
+            elif op == "and":
+                wires[dest] = a[i] & b[j]
+            else:
+                wires[dest] = ~(a[i] & b[j])
+        elif kind == "buf" or kind == "reg":
+            # Every wire of the tree has a single load, so it can be dropped
+            # as soon as it is read to keep the working set small. Pipeline
+            # registers only delay the result, so they are wires here.
+            wires[cell[1]] = wires.pop(cell[2])
+        elif kind == "fa":
+            _, x, y, cin, s, cout = cell
+            x, y, cin = wires.pop(x), wires.pop(y), wires.pop(cin)
+            t = x ^ y
+            wires[s] = t ^ cin
+            if cout is not None:
+                wires[cout] = (x & y) | (t & cin)
+        else:
+            _, x, y, s, cout = cell
+            x, y = wires.pop(x), wires.pop(y)
+            wires[s] = x ^ y
+            if cout is not None:
+                wires[cout] = x & y
+
+    # final_sum_a + final_sum_b, rippled through the columns
+    zero = np.zeros(words, dtype=np.uint64)
+    carry = zero
+    out = np.empty((generator.width, words), dtype=np.uint64)
+    for col in range(generator.width):
+        x = wires[generator.final_a[col]] if generator.final_a[col] is not None else zero
+        y = wires[generator.final_b[col]] if generator.final_b[col] is not None else zero
+        t = x ^ y
+        out[col] = t ^ carry
+        carry = (x & y) | (t & carry)
+    return out
+
+# Operand slices as the tree sees them: sign-extended by one bit when the
+# signedness is selected at run time
+def operand_slices(generator, value, is_signed):
+    if generator.operand_width == generator.n:
+        return value
+    return np.vstack((value, value[-1] & is_signed))
+
+# Exact product of every lane, modulo 2^2n
+def expected_products(generator, a, b, is_signed_a, is_signed_b):
+    n = generator.n
+    if generator.signedness == "unsigned":
+        is_signed_a = is_signed_b = np.zeros(len(a), dtype=bool)
+    elif generator.signedness == "signed":
+        is_signed_a = is_signed_b = np.ones(len(a), dtype=bool)
+
+    if 2*n <= 64:
+        # Sign-extending to 64 bits gives the same product modulo 2^64
+        a = np.where(is_signed_a & (a >> np.uint64(n-1) == 1), a | ~np.uint64((1 << n) - 1), a)
+        b = np.where(is_signed_b & (b >> np.uint64(n-1) == 1), b | ~np.uint64((1 << n) - 1), b)
+        product = a * b
+        return product if 2*n == 64 else product & np.uint64((1 << (2*n)) - 1)
+
+    a = a.astype(object)
+    b = b.astype(object)
+    a_value = np.where(is_signed_a & (a >> (n-1) == 1), a - (1 << n), a)
+    b_value = np.where(is_signed_b & (b >> (n-1) == 1), b - (1 << n), b)
+    return (a_value * b_value) % (1 << (2*n))
+
+# Evaluate one batch and return (lanes, first mismatch or None)
+def check_batch(generator, a, b, is_signed_a, is_signed_b):
+    out = evaluate(generator, operand_slices(generator, a, is_signed_a), operand_slices(generator, b, is_signed_b))
+
+    a_ints = ints_from_slices(a)
+    b_ints = ints_from_slices(b)
+    signed_a = ints_from_slices(is_signed_a[None, :]).astype(bool)
+    signed_b = ints_from_slices(is_signed_b[None, :]).astype(bool)
+    expected = expected_products(generator, a_ints, b_ints, signed_a, signed_b)
+    actual = ints_from_slices(out)
+
+    wrong = np.flatnonzero(expected != actual)
+    if wrong.size > 0:
+        idx = wrong[0]
+        return len(actual), (int(a_ints[idx]), int(b_ints[idx]), bool(signed_a[idx]), bool(signed_b[idx]), int(actual[idx]), int(expected[idx]))
+    return len(actual), None
+
+# Check the corner cases and num_random random operand pairs. Returns
+# (lanes checked, first mismatch or None, seconds)
+def verify(generator, num_random, seed=0):
+    n = generator.n
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    corners = corner_operands(n)
+    lanes = -(-len(corners) // 64) * 64
+    corners += [(0, 0, 0, 0)] * (lanes - len(corners))
+    a, b, signed_a, signed_b = zip(*corners)
+    checked, mismatch = check_batch(generator, slices_from_ints(a, n, lanes), slices_from_ints(b, n, lanes),
+                                    slices_from_ints(signed_a, 1, lanes)[0], slices_from_ints(signed_b, 1, lanes)[0])
+
+    remaining = -(-num_random // 64) * 64
+    while remaining > 0 and mismatch is None:
+        words = min(remaining, BATCH_SIZE) // 64
+        random_slices = lambda rows: rng.integers(0, 1 << 64, size=(rows, words), dtype=np.uint64)
+        lanes, mismatch = check_batch(generator, random_slices(n), random_slices(n), random_slices(1)[0], random_slices(1)[0])
+        checked += lanes
+        remaining -= lanes
+
+    return checked, mismatch, time.perf_counter() - start
+
+def format_mismatch(generator, mismatch):
+    a, b, signed_a, signed_b, actual, expected = mismatch
+    digits = -(-2 * generator.n // 4)
+    return "a=0x{:X} b=0x{:X} is_signed_a={:d} is_signed_b={:d}: out=0x{:0{}X}, expected 0x{:0{}X}".format(
+        a, b, signed_a, signed_b, actual, digits, expected, digits)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check generated tree multipliers against Python's exact product")
+    parser.add_argument("-n", "--width", type=int, nargs='+', default=[8, 16, 32, 64], help="Operand widths to check (default: 8 16 32 64)")
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, nargs='+', default=ALGORITHMS, help="Algorithms to check (default: all)")
+    parser.add_argument("-s", "--signedness", choices=SIGNEDNESS, nargs='+', default=SIGNEDNESS, help="Signedness to check (default: all)")
+    parser.add_argument("-v", "--vectors", type=int, default=1 << 20, help="Random operand pairs per variant (default: 1048576)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    failed = 0
+    for n, algorithm, signedness in itertools.product(args.width, args.algorithm, args.signedness):
+        generator = TreeGenerator(n, algorithm, signedness, NullWriter())
+        generator.generate()
+        checked, mismatch, secs = verify(generator, args.vectors, args.seed)
+
+        name = "{}-bit {} {}".format(n, signedness, algorithm)
+        if mismatch is None:
+            print("{:<28} passed {} vectors in {:.2f}s ({:.1f}M/s)".format(name, checked, secs, checked / secs / 1e6))
+        else:
+            print("{:<28} FAILED {}".format(name, format_mismatch(generator, mismatch)))
+            failed += 1
+
+    sys.exit(1 if failed else 0)
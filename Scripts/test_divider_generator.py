@@ -0,0 +1,26 @@
+# Every divider variant of divider_generator.py: the NumPy model against
+# Python's integer division, and the Verilog it writes against the model in
+# Verilator when there is one (run with pytest from Scripts/)
+
+import shutil
+import pytest
+
+from divider_generator import VARIANTS, verify, verify_verilog, format_mismatch, format_verilog_mismatch
+
+# Random divisions per operand distribution on top of the corner cases
+VECTORS = 1 << 12
+
+IDS = [algorithm + ("-early-out" if early_out else "") for algorithm, early_out in VARIANTS]
+
+@pytest.mark.parametrize("algorithm, early_out", VARIANTS, ids=IDS)
+def test_model(algorithm, early_out):
+    checked, mismatch = verify(algorithm, early_out, VECTORS)
+    assert mismatch is None, format_mismatch(mismatch)
+    assert checked > VECTORS
+
+@pytest.mark.skipif(shutil.which("verilator") is None, reason="needs verilator")
+@pytest.mark.parametrize("algorithm, early_out", VARIANTS, ids=IDS)
+def test_verilog(algorithm, early_out):
+    checked, mismatch = verify_verilog(algorithm, early_out, VECTORS)
+    assert mismatch is None, format_verilog_mismatch(mismatch)
+    assert checked > VECTORS
@@ -0,0 +1,29 @@
+# Every multiplier tree wallace_tree_generator.py can make, checked with the
+# bit-sliced NumPy evaluation of multiplier_eval.py (run with pytest from
+# Scripts/)
+
+import itertools
+import pytest
+
+from wallace_tree_generator import ALGORITHMS, SIGNEDNESS, TreeGenerator, NullWriter
+from multiplier_eval import verify, format_mismatch
+
+WIDTHS = [8, 16, 32, 64]
+
+# Random operand pairs per tree on top of the corner cases
+VECTORS = 1 << 12
+
+def check(generator):
+    generator.generate()
+    checked, mismatch, _ = verify(generator, VECTORS)
+    assert mismatch is None, format_mismatch(generator, mismatch)
+    assert checked >= VECTORS
+
+@pytest.mark.parametrize("n, algorithm, signedness", list(itertools.product(WIDTHS, ALGORITHMS, SIGNEDNESS)))
+def test_tree(n, algorithm, signedness):
+    check(TreeGenerator(n, algorithm, signedness, NullWriter()))
+
+# Pipeline registers only delay the result, the function must not change
+@pytest.mark.parametrize("algorithm, signedness", list(itertools.product(ALGORITHMS, SIGNEDNESS)))
+def test_pipelined_tree(algorithm, signedness):
+    check(TreeGenerator(32, algorithm, signedness, NullWriter(), register_after=[0], register_every=4))
@@ -1,360 +1,434 @@
-import numpy as np
-
-verilog = ""
-
-# Total number of full adders and half adders
-num_fa = 0
-num_ha = 0
-
-# The matrix should consist of the partial products in their proper places
-# To fill in the blank spots, we can use empty tuples
-def generate_initial_matrix(n):
-    # Generate the initial matrix
-    matrix = np.empty((n, 2*n), dtype=object)
-
-    # Fill with none
-    matrix = fill_matrix_with_none(matrix)
-
-    for i in range(n):
-        for j in range(n):
-            matrix[i, i+j] = (i, j)
-    return matrix
-
-def print_matrix(matrix):
-    for i in range(matrix.shape[0]):
-        for j in range(matrix.shape[1]):
-            element = matrix[i, j]
-            print(format_element(element) if element != (None, None) else "", end=",")
-        print()
-
-def format_element(element):
-    if(type(element) == str):
-        return element
-    else:
-        return str(element[0]) + "_" + str(element[1])
-
-def fill_matrix_with_none(matrix):
-    for i in range(matrix.shape[0]):
-        for j in range(matrix.shape[1]):
-            matrix[i, j] = (None, None)
-    return matrix
-
-def find_first_none_row(matrix, j):
-    for i in range(matrix.shape[0]):
-        if (None, None) == matrix[i, j]:
-            return i
-    return -1
-
-def find_last_filled_row_at_or_above(matrix, i_above, j):
-    for i in range(i_above, -1, -1):
-        if (None, None) != matrix[i, j]:
-            return i
-    return -1
-
-def find_longest_column(matrix):
-    longest = 0
-    longest_idx = 0
-    for j in range(matrix.shape[1]):
-        length = 0
-        for i in range(matrix.shape[0]):
-            if matrix[i, j] != (None, None):
-                length += 1
-        if length > longest:
-            longest = length
-            longest_idx = j
-
-    return longest_idx
-
-def verilog_add_variables(reduction, matrix):
-    global verilog
-    # Create a hint vector stating whether the weight is more than 1 bit long
-    variable_len_hint = np.zeros(matrix.shape[1])
-
-    # For each column
-    for j in range(matrix.shape[1]):
-        # Find the length of the column
-        length = 0
-        for i in range(matrix.shape[0]):
-            if matrix[i, j] != (None, None):
-                length += 1
-        # And create a variable for that # of lines in the weight
-        if length == 1:
-            verilog += "logic weight_{}_{};\n".format(reduction, j)
-        elif length > 1:
-            verilog += "logic [{}:0] weight_{}_{};\n".format(length-1, reduction, j)
-            variable_len_hint[j] = 1
-    return verilog, variable_len_hint
-
-# Connect the multiplier inputs to the first partial products
-def verilog_add_input_connections(matrix, variable_len_hint):
-    global verilog
-
-    verilog += "logic [{:.0f}:0] a, b;\n".format(matrix.shape[0]-1)
-    verilog += "assign a = multiplier_if.a;\n"
-    verilog += "assign b = multiplier_if.b;\n"
-
-    connections = verilog_generate_connections_vector(matrix)
-    for j in range(matrix.shape[1]):
-        for i in range(matrix.shape[0]):
-            if matrix[i, j] != (None, None):
-                verilog += "assign weight_{:.0f}_{:.0f}{} = a[{:.0f}] & b[{:.0f}];\n".format(0, j, "[{:.0f}]".format(connections[j]) if variable_len_hint[j] > 0 else "", matrix[i, j][0], matrix[i, j][1])
-                connections[j] += 1
-    return verilog
-
-# Connect the output connections to the final sum
-def verilog_add_output_connections(matrix, reduction, variable_len_hint_input):
-    global verilog
-    verilog += "logic [{:.0f}:0] final_sum_a;\n".format(matrix.shape[1]-1)
-    verilog += "logic [{:.0f}:0] final_sum_b;\n".format(matrix.shape[1]-1)
-    
-    # Top row connections
-    verilog += "assign final_sum_a = {"
-    top_row = ["weight_{:.0f}_{:.0f}{}".format(reduction, j, "[0]" if variable_len_hint_input[j] else "") for j in range(matrix.shape[1]-1, -1, -1)]
-    verilog += ", ".join(top_row)
-    verilog += "};\n"
-
-    # Top row connections
-    verilog += "assign final_sum_b = {"
-    bottom_row = [("weight_{:.0f}_{:.0f}{}".format(reduction, j, "[1]") if variable_len_hint_input[j] else "1'b0") for j in range(matrix.shape[1]-1, -1, -1)]
-    verilog += ", ".join(bottom_row)
-    verilog += "};\n"
-
-    verilog += "assign multiplier_if.out = final_sum_a + final_sum_b;\n"
-
-    return verilog
-
-# Creates a vector where each element counts the number of
-# connections that have been made to that weight bus
-def verilog_generate_connections_vector(matrix):
-    return np.zeros(matrix.shape[1], dtype=int)
-
-# Adds a 1, 2, or 3 input adder to the verilog code
-# connections is the connections vector
-# connections_next is the connections vector for the next stage
-# variable_len_hint_input is the hint vector for the length of the input wires
-# variable_len_hint_output is the hint vector for the length of the output wires
-# reduction is the current reduction stage
-# n_inputs is the number of inputs to the adder
-# src1, src2, src3 are the source indexes of the matrix in the form (i, j)
-# dest is the destination index of the matrix in the form (i, j)
-def verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction, n_inputs, src1, src2, src3):
-    global verilog
-    global num_fa
-    global num_ha
-    if n_inputs == 3:
-        verilog += "full_adder fa{}(.a(weight_{:.0f}_{:.0f}{}), .b(weight_{:.0f}_{:.0f}{}), .cin(weight_{:.0f}_{:.0f}{}), .sum(weight_{:.0f}_{:.0f}{}), .cout(weight_{:.0f}_{:.0f}{}));\n".format(num_fa, \
-                    reduction, src1[1], "[" + str(connections[src1[1]]) + "]" if variable_len_hint_input[src1[1]] else "", \
-                    reduction, src2[1], "[" + str(connections[src2[1]]+1) + "]" if variable_len_hint_input[src2[1]] else "", \
-                    reduction, src3[1], "[" + str(connections[src3[1]]+2) + "]" if variable_len_hint_input[src3[1]] else "", \
-                    reduction+1, src1[1], "[" + str(connections_next[src1[1]]) + "]" if variable_len_hint_output[src1[1]] else "", \
-                    reduction+1, src1[1]+1, "[" + str(connections_next[src1[1]+1]) + "]" if variable_len_hint_output[src1[1]+1] else "")
-        # Count connections to the source (actually all the same column)
-        connections[src1[1]] += 1
-        connections[src2[1]] += 1
-        connections[src3[1]] += 1
-        # Count connections to the destination (source column and next column)
-        connections_next[src1[1]] += 1
-        connections_next[src1[1]+1] += 1
-        # Number of full adders
-        num_fa += 1
-    elif n_inputs == 2:
-        verilog += "half_adder ha{}(.a(weight_{:.0f}_{:.0f}{}), .b(weight_{:.0f}_{:.0f}{}), .sum(weight_{:.0f}_{:.0f}{}), .cout(weight_{:.0f}_{:.0f}{}));\n".format(num_ha, \
-                    reduction, src1[1], "[" + str(connections[src1[1]]) + "]" if variable_len_hint_input[src1[1]] else "", \
-                    reduction, src2[1], "[" + str(connections[src2[1]]+1) + "]" if variable_len_hint_input[src2[1]] else "", \
-                    reduction+1, src1[1], "[" + str(connections_next[src1[1]]) + "]" if variable_len_hint_output[src1[1]] else "", \
-                    reduction+1, src1[1]+1, "[" + str(connections_next[src1[1]+1]) + "]" if variable_len_hint_output[src1[1]+1] else "")
-        # Count connections to the source (actually all the same column)
-        connections[src1[1]] += 1
-        connections[src2[1]] += 1
-        # Count connections to the destination (source column and next column)
-        connections_next[src1[1]] += 1
-        connections_next[src1[1]+1] += 1
-        # Number of half adders
-        num_ha += 1
-    elif n_inputs == 1:
-        verilog += "assign weight_{:.0f}_{:.0f}{} = weight_{:.0f}_{:.0f}{};\n".format(reduction+1, src1[1], "[" + str(connections_next[src1[1]]) + "]" if variable_len_hint_output[src1[1]] else "", reduction, src1[1], "[" + str(connections[src1[1]]) + "]" if variable_len_hint_input[src1[1]] else "")
-        # Count connections to the source
-        connections[src1[1]] += 1
-        # Count connections to the destination (next column)
-        connections_next[src1[1]] += 1
-
-    return (connections, connections_next)
-
-def reduce_matrix(matrix):
-    out_matrix = np.empty((n, 2*n), dtype=object)
-    # Fill with none
-    out_matrix = fill_matrix_with_none(out_matrix)
-
-    # Reduce the matrix
-    i = 0
-    while True:
-        # For each row, reduce vertical groups up to 3 by either:
-        #   if 1, just pass through
-        #   if 2, use a half adder
-        #   if 3, use a full adder
-        if i+2 >= matrix.shape[0]:
-            break
-
-        for j in range(out_matrix.shape[1]):
-            if matrix[i, j] != (None, None) and matrix[i+1, j] != (None, None) and matrix[i+2, j] != (None, None):
-                # Use a full adder
-                first_avail_j = find_first_none_row(out_matrix, j)
-                first_avail_j_next = find_first_none_row(out_matrix, j+1)
-                out_matrix[first_avail_j, j] = "S(" + format_element(matrix[i, j]) + "+" + format_element(matrix[i+1, j]) + "+" + format_element(matrix[i+2, j]) + ")"
-                out_matrix[first_avail_j_next, j+1] = "C(" + format_element(matrix[i, j]) + "+" + format_element(matrix[i+1, j]) + "+" + format_element(matrix[i+2, j]) + ")"
-            elif matrix[i, j] != (None, None) and matrix[i+1, j] != (None, None):
-                # Skip if the next column is >= 2n
-                if j+1 >= out_matrix.shape[1]:
-                    continue
-                # Use a half adder (top aligned)
-                first_avail_j = find_first_none_row(out_matrix, j)
-                first_avail_j_next = find_first_none_row(out_matrix, j+1)
-                out_matrix[first_avail_j, j] = "S(" + format_element(matrix[i, j]) + "+" + format_element(matrix[i+1, j]) + ")"
-                out_matrix[first_avail_j_next, j+1] = "C(" + format_element(matrix[i, j]) + "+" + format_element(matrix[i+1, j]) + ")"
-            elif matrix[i+1, j] != (None, None) and matrix[i+2, j] != (None, None):
-                # Skip if the next column is >= 2n
-                if j+1 >= out_matrix.shape[1]:
-                    continue
-                # Use a half adder (bottom aligned)
-                first_avail_j = find_first_none_row(out_matrix, j)
-                first_avail_j_next = find_first_none_row(out_matrix, j+1)
-                out_matrix[first_avail_j, j] = "S(" + format_element(matrix[i+1, j]) + "+" + format_element(matrix[i+2, j]) + ")"
-                out_matrix[first_avail_j_next, j+1] = "C(" + format_element(matrix[i+1, j]) + "+" + format_element(matrix[i+2, j]) + ")"
+# Generate the partial product reduction tree of a tree multiplier, to be
+# pasted into a module with a multiplier_if (see RTL/source/multiplier.sv).
+#
+# The partial product matrix is kept as one list of bits per column (bit
+# weight), each bit being the name of the wire holding it and its depth in
+# adder levels. A reduction stage only needs the height of every column to
+# decide how many full and half adders it uses, so each stage is linear in
+# the number of bits and the Verilog is written out as it is generated.
+#
+# Wires are named weight_<stage>_<column>, a vector when the column holds more
+# than one bit. The last stage holds at most two bits per column, which go to
+# final_sum_a and final_sum_b and are added with a single carry-propagate
+# adder.
+#
+# Everything written is also kept as a netlist (see TreeGenerator.netlist),
+# which multiplier_eval.py evaluates to check the tree without a simulator.
+#
+# Pipeline registers can be put after any stage (stage 0 being the partial
+# products, the last stage feeding the final adder), in which case the
+# stage's wires are registered into weight_<stage>_<column>_r and the tree
+# gets a fixed latency multiplier_if handshake: the operands are taken in the
+# cycle en is high, ready is low from then until out holds the product, and
+# the registers only load while a multiplication is in flight so out holds
+# while the pipeline is stalled. With --module the tree is wrapped in a
+# module that can replace RTL/source/multiplier.sv.
+
+import sys
+import argparse
+
+ALGORITHMS = ["wallace", "dadda"]
+
+# unsigned  a and b are unsigned
+# signed    a and b are two's complement (Baugh-Wooley)
+# runtime   a and b are sign-extended by one bit from multiplier_if.is_signed_a
+#           and is_signed_b, then multiplied as two's complement (Baugh-Wooley)
+SIGNEDNESS = ["unsigned", "signed", "runtime"]
+
+# Depth of the sum and carry of each adder in adder levels (a full adder is
+# two half adders in series, see RTL/source/full_adder.sv)
+FA_DEPTH = 2
+HA_DEPTH = 1
+
+# Partial product bits are ("and", i, j) for a[i] & b[j], ("nand", i, j) for
+# its inverse and ("one", 0, 0) for a constant one
+def format_partial_product(op, i, j):
+    if op == "one":
+        return "1'b1"
+    expr = "a[{}] & b[{}]".format(i, j)
+    return expr if op == "and" else "~({})".format(expr)
+
+# Partial product bits per column, and the width of the operands the matrix is
+# built from
+def generate_initial_columns(n, signedness):
+    width = 2*n
+    columns = [[] for _ in range(width)]
+
+    def add(col, op, i=0, j=0):
+        if col < width:
+            columns[col].append((op, i, j))
+
+    if signedness == "unsigned":
+        for i in range(n):
+            for j in range(n):
+                add(i+j, "and", i, j)
+        return columns, n
+
+    # Baugh-Wooley: the partial products with exactly one sign bit are
+    # inverted and a one is added at columns m and 2m-1, which turns the
+    # subtraction of the sign rows into an addition (mod 2^2m)
+    m = n if signedness == "signed" else n+1
+    for i in range(m-1):
+        for j in range(m-1):
+            add(i+j, "and", i, j)
+    for k in range(m-1):
+        add(m-1+k, "nand", m-1, k)
+        add(m-1+k, "nand", k, m-1)
+    add(2*m-2, "and", m-1, m-1)
+    add(m, "one")
+    add(2*m-1, "one")
+    return columns, m
+
+# Number of full and half adders for each column of a Wallace stage: every
+# group of three bits goes to a full adder and a leftover pair to a half adder
+def wallace_stage(heights):
+    return [(h // 3, 1 if h % 3 == 2 else 0) for h in heights]
+
+# Dadda's sequence of maximum column heights (2, 3, 4, 6, 9, 13, ...)
+def dadda_heights(max_height):
+    seq = [2]
+    while seq[-1] < max_height:
+        seq.append(seq[-1] * 3 // 2)
+    return seq
+
+# Number of full and half adders for each column of a Dadda stage: only as
+# many as needed to bring every column down to the next height of the
+# sequence, counting the carries coming in from the column below
+def dadda_stage(heights):
+    target = [d for d in dadda_heights(max(heights)) if d < max(heights)][-1]
+    adders = []
+    carries = 0
+    for h in heights:
+        fa = ha = 0
+        excess = h + carries - target
+        while excess > 0:
+            if excess == 1:
+                ha += 1
+                excess -= 1
             else:
-                # Pass through any non-none row
-                for k in range(i, i+3):
-                    if matrix[k, j] != (None, None):
-                        first_avail_j = find_first_none_row(out_matrix, j)
-                        out_matrix[first_avail_j, j] = format_element(matrix[k, j])
-        
-        i += 3
-
-    # Next, pass through any remaining rows
-    while i < matrix.shape[0]:
-        for j in range(out_matrix.shape[1]):
-            if matrix[i, j] != (None, None):
-                first_avail_j = find_first_none_row(out_matrix, j)
-                out_matrix[first_avail_j, j] = format_element(matrix[i, j])
-        i += 1
-
-    # Next, strip out remaining empty rows
-    i = 0
-    while i < out_matrix.shape[0]:
-        for j in range(out_matrix.shape[1]):
-            if out_matrix[i, j] != (None, None):
-                break
+                fa += 1
+                excess -= 2
+        if 3*fa + 2*ha > h:
+            raise ValueError("Column of height {} can not be reduced to {}".format(h, target))
+        adders.append((fa, ha))
+        carries = fa + ha
+    return adders
+
+STAGE_FUNCTIONS = {"wallace": wallace_stage, "dadda": dadda_stage}
+
+# Name of bit idx of a wire of the given height
+def bit_name(stage, col, idx, height):
+    if height == 1:
+        return "weight_{}_{}".format(stage, col)
+    return "weight_{}_{}[{}]".format(stage, col, idx)
+
+class TreeGenerator:
+    # register_after is the stages to put pipeline registers after, and
+    # register_every adds one whenever this many full adder levels have gone
+    # by since the last register
+    def __init__(self, n, algorithm="wallace", signedness="unsigned", out=sys.stdout, register_after=(), register_every=None):
+        self.n = n
+        self.width = 2*n
+        self.algorithm = algorithm
+        self.signedness = signedness
+        self.out = out
+        self.register_after = set(register_after)
+        self.register_every = register_every
+
+        self.num_fa = 0
+        self.num_ha = 0
+        # Width of a and b, one more than n when the sign is selected at run time
+        self.operand_width = n
+        # Cells in the order they are written, each reading only wires written
+        # before it:
+        #   ("pp", dest, op, i, j)           partial product
+        #   ("buf", dest, src)               pass-through
+        #   ("fa", a, b, cin, sum, cout)     full adder
+        #   ("ha", a, b, sum, cout)          half adder
+        #   ("reg", dest, src)               pipeline register
+        # cout is None for the carry out of the top column
+        self.netlist = []
+        # Wires of final_sum_a and final_sum_b from bit 0 up, None for 1'b0
+        self.final_a = []
+        self.final_b = []
+        # (max height, full adders, half adders, max depth) after each stage,
+        # the depth counted from the last pipeline register
+        self.stages = []
+        # (first stage, last stage, depth) of the logic between pipeline
+        # registers, the last one ending in the final adder
+        self.cycles = []
+        self.latency = 0
+
+    def write(self, line):
+        self.out.write(line + "\n")
+
+    # Declare the wires of a stage, from the height of every column
+    def add_wires(self, stage, heights):
+        for col, height in enumerate(heights):
+            if height == 1:
+                self.write("logic weight_{}_{};".format(stage, col))
+            elif height > 1:
+                self.write("logic [{}:0] weight_{}_{};".format(height-1, stage, col))
+
+    def add_inputs(self, m):
+        self.write("logic [{}:0] a, b;".format(m-1))
+        if m > self.n:
+            self.write("assign a = {{multiplier_if.is_signed_a & multiplier_if.a[{0}], multiplier_if.a}};".format(self.n-1))
+            self.write("assign b = {{multiplier_if.is_signed_b & multiplier_if.b[{0}], multiplier_if.b}};".format(self.n-1))
         else:
-            out_matrix = np.delete(out_matrix, i, axis=0)
-            i-=1
-        i+=1
-
-    # Finally, it is necessary to move any columns that are to the right of the longest column down so that
-    # the bottom of the matrix is flat past this point
-    flat_start_j = find_longest_column(out_matrix) + 1
-    for j in range(flat_start_j, out_matrix.shape[1]):
-        for i in range(out_matrix.shape[0]-1, -1, -1):
-            # If the cell is empty...
-            if out_matrix[i, j] == (None, None):
-                # Find the last filled row
-                last_filled_i = find_last_filled_row_at_or_above(out_matrix, i, j)
-                if(last_filled_i == -1):
-                    break
-                # Move the last filled row down to the empty cell
-                out_matrix[i, j] = out_matrix[last_filled_i, j]
-                out_matrix[last_filled_i, j] = (None, None)
-
-    return out_matrix
-
-# Must be done after a pass of reduce_matrix so that the output variables are known
-def reduce_matrix_adding_verilog(matrix, variable_len_hint_input, variable_len_hint_output):
-    # Connections vector
-    connections = verilog_generate_connections_vector(matrix)
-    connections_next = verilog_generate_connections_vector(matrix)
-
-    # Reduce the matrix
-    i = 0
-    while True:
-        # For each row, reduce vertical groups up to 3 by either:
-        #   if 1, just pass through
-        #   if 2, use a half adder
-        #   if 3, use a full adder
-        if i+2 >= matrix.shape[0]:
-            break
-
-        for j in range(matrix.shape[1]):
-            if matrix[i, j] != (None, None) and matrix[i+1, j] != (None, None) and matrix[i+2, j] != (None, None):
-                # Use a full adder
-                # Add verilog
-                connections, connections_next = verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction-1, 3, (i, j), (i+1, j), (i+2, j))
-            elif matrix[i, j] != (None, None) and matrix[i+1, j] != (None, None):
-                # Skip if the next column is >= 2n
-                if j+1 >= matrix.shape[1]:
-                    continue
-                # Use a half adder (top aligned)
-                # Add verilog
-                connections, connections_next = verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction-1, 2, (i, j), (i+1, j), (None, None))
-                pass
-            elif matrix[i+1, j] != (None, None) and matrix[i+2, j] != (None, None):
-                # Skip if the next column is >= 2n
-                if j+1 >= matrix.shape[1]:
+            self.write("assign a = multiplier_if.a;")
+            self.write("assign b = multiplier_if.b;")
+
+    def assign(self, dest, src):
+        self.write("assign {} = {};".format(dest, src))
+
+    def partial_product(self, dest, op, i, j):
+        self.assign(dest, format_partial_product(op, i, j))
+        self.netlist.append(("pp", dest, op, i, j))
+
+    def buffer(self, dest, src):
+        self.assign(dest, src)
+        self.netlist.append(("buf", dest, src))
+
+    def full_adder(self, a, b, cin, s, cout):
+        self.netlist.append(("fa", a, b, cin, s, cout))
+        self.write("full_adder fa{}(.a({}), .b({}), .cin({}), .sum({}), .cout({}));".format(self.num_fa, a, b, cin, s, cout or ""))
+        self.num_fa += 1
+
+    def half_adder(self, a, b, s, cout):
+        self.netlist.append(("ha", a, b, s, cout))
+        self.write("half_adder ha{}(.a({}), .b({}), .sum({}), .cout({}));".format(self.num_ha, a, b, s, cout or ""))
+        self.num_ha += 1
+
+    # Stage 0: a wire per column holding its partial products
+    def initial_stage(self):
+        bits, self.operand_width = generate_initial_columns(self.n, self.signedness)
+        heights = [len(col) for col in bits]
+        self.add_wires(0, heights)
+        self.add_inputs(self.operand_width)
+
+        columns = []
+        for col, col_bits in enumerate(bits):
+            wires = []
+            for idx, (op, i, j) in enumerate(col_bits):
+                name = bit_name(0, col, idx, heights[col])
+                self.partial_product(name, op, i, j)
+                wires.append((name, 0 if op == "one" else 1))
+            columns.append(wires)
+        return columns
+
+    # Reduce the columns of one stage into the next
+    def reduce_stage(self, stage, columns, adders):
+        # Heights of the next stage: the sums and pass-through bits of each
+        # column plus the carries of the column below (carries out of the top
+        # column are dropped)
+        heights = []
+        for col, (fa, ha) in enumerate(adders):
+            carries = sum(adders[col-1]) if col > 0 else 0
+            heights.append(len(columns[col]) - 2*fa - ha + carries)
+        self.add_wires(stage+1, heights)
+
+        next_columns = [[] for _ in columns]
+        for col, (fa, ha) in enumerate(adders):
+            top = col+1 >= self.width
+            # The earliest bits go through the adders so that the latest ones
+            # do not gain any depth in this stage
+            col_bits = sorted(columns[col], key=lambda x: x[1])
+            pos = 0
+            for _ in range(fa):
+                (a, da), (b, db), (c, dc) = col_bits[pos:pos+3]
+                pos += 3
+                depth = max(da, db, dc) + FA_DEPTH
+                s = self.next_bit(stage+1, next_columns, heights, col, depth)
+                cout = None if top else self.next_bit(stage+1, next_columns, heights, col+1, depth)
+                self.full_adder(a, b, c, s, cout)
+            for _ in range(ha):
+                (a, da), (b, db) = col_bits[pos:pos+2]
+                pos += 2
+                depth = max(da, db) + HA_DEPTH
+                s = self.next_bit(stage+1, next_columns, heights, col, depth)
+                cout = None if top else self.next_bit(stage+1, next_columns, heights, col+1, depth)
+                self.half_adder(a, b, s, cout)
+            for src, depth in col_bits[pos:]:
+                self.buffer(self.next_bit(stage+1, next_columns, heights, col, depth), src)
+        return next_columns
+
+    # Register the wires of a stage if a pipeline register goes after it
+    def register_stage(self, stage, columns, first_stage):
+        depth = max(depth for col in columns for _, depth in col)
+        if stage not in self.register_after and (self.register_every is None or depth < self.register_every * FA_DEPTH):
+            return columns, first_stage
+
+        for col, col_bits in enumerate(columns):
+            if len(col_bits) == 1:
+                self.write("logic weight_{}_{}_r;".format(stage, col))
+            elif len(col_bits) > 1:
+                self.write("logic [{}:0] weight_{}_{}_r;".format(len(col_bits)-1, stage, col))
+
+        self.write("always_ff @(posedge clk) begin")
+        self.write("    if (advance) begin")
+        for col, col_bits in enumerate(columns):
+            if col_bits:
+                self.write("        weight_{0}_{1}_r <= weight_{0}_{1};".format(stage, col))
+        self.write("    end")
+        self.write("end")
+
+        registered = []
+        for col_bits in columns:
+            wires = []
+            for name, _ in col_bits:
+                dest = name + "_r" if "[" not in name else name.replace("[", "_r[", 1)
+                self.netlist.append(("reg", dest, name))
+                wires.append((dest, 0))
+            registered.append(wires)
+
+        self.cycles.append((first_stage, stage, depth))
+        self.latency += 1
+        return registered, stage+1
+
+    # Take the next free bit of a column of the next stage
+    def next_bit(self, stage, next_columns, heights, col, depth):
+        name = bit_name(stage, col, len(next_columns[col]), heights[col])
+        next_columns[col].append((name, depth))
+        return name
+
+    def add_outputs(self, columns):
+        self.write("logic [{}:0] final_sum_a;".format(self.width-1))
+        self.write("logic [{}:0] final_sum_b;".format(self.width-1))
+        self.final_a = [col[0][0] if len(col) > 0 else None for col in columns]
+        self.final_b = [col[1][0] if len(col) > 1 else None for col in columns]
+        self.assign("final_sum_a", "{" + ", ".join(x or "1'b0" for x in reversed(self.final_a)) + "}")
+        self.assign("final_sum_b", "{" + ", ".join(x or "1'b0" for x in reversed(self.final_b)) + "}")
+        self.assign("multiplier_if.out", "final_sum_a + final_sum_b")
+
+    def pipelined(self):
+        return bool(self.register_after) or self.register_every is not None
+
+    # Count the cycles of a multiplication and hold the pipeline registers
+    # once it is done
+    def add_handshake(self):
+        if self.latency == 0:
+            if self.pipelined():
+                self.assign("advance", "1'b0")
+            self.assign("multiplier_if.ready", "1'b1")
+            return
+
+        self.write("// Fixed latency of {} cycle(s) after en".format(self.latency))
+        self.write("logic [{}:0] remaining;".format(max(1, (self.latency-1).bit_length()) - 1))
+        self.assign("advance", "multiplier_if.en | (remaining != '0)")
+        self.write("always_ff @(posedge clk) begin")
+        self.write("    if (!nrst) begin")
+        self.write("        remaining <= '0;")
+        self.write("    end else if (multiplier_if.en) begin")
+        self.write("        remaining <= {};".format(self.latency-1))
+        self.write("    end else if (remaining != '0) begin")
+        self.write("        remaining <= remaining - 1;")
+        self.write("    end")
+        self.write("end")
+        self.assign("multiplier_if.ready", "~multiplier_if.en & (remaining == '0)")
+
+    def generate(self):
+        stage_function = STAGE_FUNCTIONS[self.algorithm]
+        if self.pipelined():
+            self.write("logic advance;")
+        columns = self.initial_stage()
+        stage = 0
+        columns, first_stage = self.register_stage(stage, columns, 0)
+        while max(len(col) for col in columns) > 2:
+            fa, ha = self.num_fa, self.num_ha
+            columns = self.reduce_stage(stage, columns, stage_function([len(col) for col in columns]))
+            stage += 1
+            self.stages.append((max(len(col) for col in columns), self.num_fa - fa, self.num_ha - ha,
+                                max(depth for col in columns for _, depth in col)))
+            columns, first_stage = self.register_stage(stage, columns, first_stage)
+        self.cycles.append((first_stage, stage, max([depth for col in columns for _, depth in col] + [0])))
+        self.add_outputs(columns)
+        self.add_handshake()
+        return columns
+
+    def depth(self):
+        return max(depth for _, _, depth in self.cycles)
+
+    def format_report(self):
+        lines = ["{}-bit {} {} tree: {} stage(s), {} full adder(s), {} half adder(s), depth {} (full adder = {} levels)".format(
+            self.n, self.signedness, self.algorithm, len(self.stages), self.num_fa, self.num_ha, self.depth(), FA_DEPTH)]
+        for idx, (height, fa, ha, depth) in enumerate(self.stages):
+            lines.append("  stage {}: height {}, {} FA, {} HA, depth {}".format(idx+1, height, fa, ha, depth))
+        if self.pipelined():
+            lines.append("latency {} cycle(s), a multiplication holds execute for {} cycle(s)".format(self.latency, self.latency+1))
+            for idx, (first, last, depth) in enumerate(self.cycles):
+                if first > last:
+                    lines.append("  cycle {}: the {}-bit final adder".format(idx, self.width))
                     continue
-                # Use a half adder (bottom aligned)
-                # Add verilog
-                connections, connections_next = verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction-1, 2, (i+1, j), (i+2, j), (None, None))
-                pass
-            else:
-                # Pass through any non-none row
-                for k in range(i, i+3):
-                    if matrix[k, j] != (None, None):
-                        # Add verilog
-                        connections, connections_next = verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction-1, 1, (k, j), (None, None), (None, None))
-                pass
-        
-        i += 3
-
-    # Next, pass through any remaining rows
-    while i < matrix.shape[0]:
-        for j in range(matrix.shape[1]):
-            if matrix[i, j] != (None, None):
-                # Add verilog
-                connections, connections_next = verilog_add_adder(connections, connections_next, variable_len_hint_input, variable_len_hint_output, reduction-1, 1, (i, j), (None, None), (None, None))
-        i += 1
+                final = ", then the {}-bit final adder".format(self.width) if idx == len(self.cycles)-1 else ""
+                lines.append("  cycle {}: stages {}-{}, depth {}{}".format(idx, first, last, depth, final))
+        return '\n'.join(lines)
+
+# Wrap the tree in a module that can replace RTL/source/multiplier.sv
+def write_module(generator, name):
+    generator.write("`timescale 1ns/1ns")
+    generator.write("")
+    generator.write("`include \"common_types.vh\"")
+    generator.write("import common_types_pkg::*;")
+    generator.write("`include \"multiplier_if.vh\"")
+    generator.write("")
+    generator.write("// {}-bit {} {} tree multiplier, generated by Scripts/wallace_tree_generator.py".format(
+        generator.n, generator.signedness, generator.algorithm))
+    generator.write("")
+    generator.write("module {} (".format(name))
+    generator.write("    input logic clk, nrst,")
+    generator.write("    multiplier_if.mult multiplier_if")
+    generator.write(");")
+    generator.write("")
+    generator.generate()
+    generator.write("")
+    generator.write("endmodule")
+
+class NullWriter:
+    def write(self, _):
+        pass
 
 if __name__ == "__main__":
-    n = 32
-    reduction = 0
-
-    # Generate the initial matrix
-    matrix = generate_initial_matrix(n)
-
-    # Add variables for the initial matrix
-    _, variable_len_hint_input = verilog_add_variables(reduction, matrix)
-
-    # Add input connections for the initial matrix
-    verilog_add_input_connections(matrix, variable_len_hint_input)
-
-    # print_matrix(matrix)
-
-    while matrix.shape[0] > 2:
-        # print()
-
-        reduction += 1
-
-        # First reduce the matrix
-        new_matrix = reduce_matrix(matrix)
-
-        # Add variables for the new matrix
-        _, variable_len_hint_output = verilog_add_variables(reduction, new_matrix)
-
-        # Add verilog for the new matrix
-        reduce_matrix_adding_verilog(matrix, variable_len_hint_input, variable_len_hint_output)
-
-        # Update the matrix
-        matrix = new_matrix
-        variable_len_hint_input = variable_len_hint_output
-        
-        # print_matrix(matrix)
-
-    verilog_add_output_connections(matrix, reduction, variable_len_hint_input)
-
-    print(verilog)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate a Wallace or Dadda tree multiplier in SystemVerilog")
+    parser.add_argument("-n", "--width", type=int, default=32, help="Operand width in bits (default: 32)")
+    parser.add_argument("-a", "--algorithm", choices=ALGORITHMS, default="wallace", help="Reduction algorithm (default: wallace)")
+    parser.add_argument("-s", "--signedness", choices=SIGNEDNESS, default="unsigned",
+                        help="unsigned, two's complement (Baugh-Wooley) or selected by multiplier_if.is_signed_a/b (default: unsigned)")
+    parser.add_argument("-o", "--output", default=None, help="File to write the Verilog to (default: standard output)")
+    parser.add_argument("-r", "--register-after", type=int, nargs='+', default=[], metavar="STAGE",
+                        help="Put pipeline registers after these stages (0 is the partial products)")
+    parser.add_argument("-k", "--register-every", type=int, default=None, metavar="K",
+                        help="Put a pipeline register after the stage that reaches K full adder levels since the last one")
+    parser.add_argument("-m", "--module", nargs='?', const="multiplier", default=None, metavar="NAME",
+                        help="Write a complete module (default name: multiplier) instead of the body to paste in")
+    parser.add_argument("--compare", action="store_true", help="Only report the adder counts and depth of every algorithm")
+    parser.add_argument("--verify", type=int, default=0, metavar="N", help="Check the tree on the corner cases and N random operand pairs (see multiplier_eval.py)")
+    args = parser.parse_args()
+
+    if args.compare:
+        for algorithm in ALGORITHMS:
+            generator = TreeGenerator(args.width, algorithm, args.signedness, NullWriter(), args.register_after, args.register_every)
+            generator.generate()
+            print(generator.format_report())
+        sys.exit(0)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        generator = TreeGenerator(args.width, args.algorithm, args.signedness, out, args.register_after, args.register_every)
+        if args.module:
+            write_module(generator, args.module)
+        else:
+            generator.generate()
+    finally:
+        if args.output:
+            out.close()
+
+    print(generator.format_report(), file=sys.stderr)
+
+    if args.verify:
+        from multiplier_eval import verify, format_mismatch
+        checked, mismatch, secs = verify(generator, args.verify)
+        if mismatch is not None:
+            print("Verification FAILED: " + format_mismatch(generator, mismatch), file=sys.stderr)
+            sys.exit(1)
+        print("Verified {} operand pairs in {:.2f}s".format(checked, secs), file=sys.stderr)